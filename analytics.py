@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+咨询数据的列式分析快照（需要 pip install pyarrow numpy）
+- 快照：把 consultations 中用于统计的列（不含姓名、联系方式、邮箱、咨询内容）按提交月份分区写成
+  zstd 压缩的 Parquet 文件（SNAPSHOT_DIR/month=YYYY-MM/data.parquet）；
+  再次生成时按变更日志只重写有变化的月份，有删除或日志已被清理时全部重写
+- 查询：报表接口只读快照，按类型/城市/年龄段/状态等维度按日、周、月计数，计算填写时长、浏览时长的分位数，
+  计算由 pyarrow 与 NumPy 向量化完成，不访问线上数据库
+
+用法:
+    python analytics.py           # 生成或更新快照（可放入 cron 定期执行）
+    python analytics.py --full    # 全部重写
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    np = pa = None
+
+import changes
+from stats import beijing_tz
+from query import EQUALITY_FILTERS
+
+# 导入配置
+try:
+    from config import SNAPSHOT_DIR
+except ImportError:
+    SNAPSHOT_DIR = 'snapshots'  # 快照目录（与线上数据库分开，可以复制到其他机器分析）
+
+# 快照状态文件；以下划线开头，读取数据集时会被忽略
+MANIFEST_FILE = '_manifest.json'
+
+# 每次从游标读取的行数
+CHUNK_ROWS = 50000
+
+# 快照中的字符串维度列
+DIMENSIONS = (
+    'consultation_type', 'city', 'age_group', 'status',
+    'device_type', 'os_name', 'browser_name', 'geo_country', 'geo_region', 'geo_city',
+)
+
+# 时长列（整数秒，见 engagement.parse_duration）
+DURATIONS = ('fill_duration', 'browse_duration')
+
+PERIODS = ('day', 'week', 'month')
+DEFAULT_PERCENTILES = (50, 90, 99)
+
+# 分位数按维度分组时最多返回的组数（按记录数从多到少）
+MAX_GROUPS = 100
+
+_build_lock = threading.Lock()
+_table_cache = {'mtime': None, 'table': None}
+
+
+def available():
+    return pa is not None
+
+
+def _select_sql(where=''):
+    columns = ['id', 'timestamp', 'created_date', "COALESCE(substr(created_date, 1, 7), 'unknown') AS month"]
+    columns += [f"COALESCE({column}, '')" for column in DIMENSIONS]
+    columns += list(DURATIONS)
+    return f"SELECT {', '.join(columns)} FROM consultations {where}"
+
+
+def _schema():
+    fields = [('id', pa.int64()), ('timestamp', pa.string()), ('created_date', pa.string()), ('month', pa.string())]
+    fields += [(column, pa.string()) for column in DIMENSIONS]
+    fields += [(column, pa.float64()) for column in DURATIONS]
+    return pa.schema(fields)
+
+
+def _read_table(cursor, where='', params=()):
+    """分块读取并转换为 Arrow 表，字符串维度做字典编码"""
+    schema = _schema()
+    cursor.execute(_select_sql(where), params)
+    batches = []
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        batches.append(pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)], schema=schema))
+    table = pa.Table.from_batches(batches, schema=schema)
+    for column in DIMENSIONS:
+        position = table.schema.get_field_index(column)
+        table = table.set_column(position, column, pc.dictionary_encode(table[column]))
+    return table
+
+
+def _month_dir(month):
+    return os.path.join(SNAPSHOT_DIR, f'month={month}')
+
+
+def _write_month(month, table):
+    """写入一个月份分区（先写临时文件再替换，读取方不会读到写了一半的文件）"""
+    directory = _month_dir(month)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'data.parquet')
+    # 以点开头的文件读取数据集时会被忽略
+    temp_path = os.path.join(directory, f'.data.{os.getpid()}.tmp')
+    pq.write_table(table.drop_columns(['month']), temp_path, compression='zstd')
+    os.replace(temp_path, path)
+
+
+def load_manifest():
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _changed_months(cursor, manifest):
+    """上次快照之后有变化的月份；需要全部重写时返回 None"""
+    since = manifest['cursor']
+    # 快照之后的变更已被清理（包括日志已清空）时无法得知改了哪些月份
+    if changes.is_stale(cursor, since):
+        return None
+    cursor.execute("SELECT 1 FROM consultation_changes WHERE id > ? AND operation = 'delete' LIMIT 1", (since,))
+    if cursor.fetchone():
+        return None
+    cursor.execute('''
+        SELECT DISTINCT COALESCE(substr(created_date, 1, 7), 'unknown') FROM consultations
+        WHERE id IN (SELECT consultation_id FROM consultation_changes WHERE id > ?)
+    ''', (since,))
+    return sorted(month for month, in cursor.fetchall())
+
+
+def build_snapshot(conn, full=False):
+    """生成或更新快照，返回 {'full', 'months', 'rows', 'seconds'}
+
+    在一个读事务中读取数据与变更游标，快照与游标一致（WAL 模式下不阻塞写入）
+    """
+    if not available():
+        raise RuntimeError('未安装pyarrow/numpy，无法生成分析快照')
+    started = time.monotonic()
+    with _build_lock:
+        previous = load_manifest()
+        manifest = None if full else previous
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        try:
+            cursor_id = changes.latest_cursor(cursor)
+            months = _changed_months(cursor, manifest) if manifest else None
+            if months is None:
+                table = _read_table(cursor)
+            elif months:
+                placeholders = ', '.join('?' * len(months))
+                table = _read_table(cursor, f"WHERE COALESCE(substr(created_date, 1, 7), 'unknown') IN ({placeholders})",
+                                    months)
+            else:
+                table = None
+        finally:
+            conn.rollback()
+
+        rebuilt = months is None
+        row_counts = {} if rebuilt else dict(manifest['months'])
+        written = []
+        if table is not None:
+            written = sorted(pc.unique(table['month']).to_pylist())
+            for month in written:
+                month_table = table.filter(pc.equal(table['month'], month))
+                _write_month(month, month_table)
+                row_counts[month] = month_table.num_rows
+        # 全部重写时删除已经没有记录的月份
+        if rebuilt and previous:
+            for month in previous['months']:
+                if month not in row_counts:
+                    shutil.rmtree(_month_dir(month), ignore_errors=True)
+
+        manifest = {
+            'cursor': cursor_id,
+            # 与咨询的提交时间一样使用北京时间
+            'created_at': datetime.now(beijing_tz).strftime('%Y-%m-%d %H:%M:%S'),
+            'months': row_counts,
+        }
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        manifest_path = os.path.join(SNAPSHOT_DIR, MANIFEST_FILE)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    return {
+        'full': rebuilt,
+        'months': written,
+        'rows': sum(row_counts.values()),
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+# ---- 查询 ----
+
+def load_table():
+    """读取快照（快照更新后自动重新加载），返回 (表, 快照时间)"""
+    if not available():
+        raise RuntimeError('未安装pyarrow/numpy，无法查询分析快照')
+    manifest_path = os.path.join(SNAPSHOT_DIR, MANIFEST_FILE)
+    try:
+        mtime = os.path.getmtime(manifest_path)
+    except OSError:
+        raise RuntimeError('还没有分析快照，请先运行 python analytics.py')
+    if mtime != _table_cache['mtime']:
+        partitioning = ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+        table = ds.dataset(SNAPSHOT_DIR, format='parquet', partitioning=partitioning).to_table()
+        _table_cache.update(mtime=mtime, table=table, created_at=load_manifest()['created_at'])
+    return _table_cache['table'], _table_cache['created_at']
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'无效的日期: {value}')
+
+
+def _parse_dimension(args, name='by', required=True):
+    value = args.get(name)
+    if not value and not required:
+        return None
+    if value not in DIMENSIONS:
+        raise ValueError(f"无效的{name}参数，可选: {', '.join(DIMENSIONS)}")
+    return value
+
+
+def filter_table(table, args):
+    """按 start_date / end_date（含当天）与 status / consultation_type / city / age_group 筛选"""
+    mask = None
+    conditions = []
+    if args.get('start_date'):
+        conditions.append(pc.greater_equal(table['created_date'], _parse_date(args['start_date'])))
+    if args.get('end_date'):
+        conditions.append(pc.less_equal(table['created_date'], _parse_date(args['end_date'])))
+    for field in EQUALITY_FILTERS:
+        if args.get(field):
+            conditions.append(pc.equal(table[field], args[field]))
+    for condition in conditions:
+        mask = condition if mask is None else pc.and_(mask, condition)
+    return table if mask is None else table.filter(mask)
+
+
+def period_keys(table, period):
+    """每行所属的日期（day）、周一日期（week）或月份（month）"""
+    if period == 'month':
+        return table['month']
+    if period == 'day':
+        return table['created_date']
+    # 1970-01-01 是星期四，天数加 3 后对 7 取余即为距离周一的天数
+    days = pc.cast(pc.strptime(table['created_date'], format='%Y-%m-%d', unit='s', error_is_null=True),
+                   pa.date32()).combine_chunks()
+    offsets = days.cast(pa.int32()).to_numpy(zero_copy_only=False)
+    mondays = pa.array(offsets - (offsets + 3) % 7, type=pa.int32()).cast(pa.date32())
+    return pc.strftime(mondays, format='%Y-%m-%d')
+
+
+def count_by(args):
+    """按时间段和维度计数：by 为维度，period 为 day / week / month（默认 month）"""
+    by = _parse_dimension(args)
+    period = args.get('period') or 'month'
+    if period not in PERIODS:
+        raise ValueError(f"无效的period参数，可选: {', '.join(PERIODS)}")
+
+    table, created_at = load_table()
+    table = filter_table(table, args)
+    grouped = pa.table({'period': period_keys(table, period), by: pc.cast(table[by], pa.string())})
+    grouped = grouped.group_by(['period', by]).aggregate([([], 'count_all')])
+    rows = sorted(grouped.rename_columns(['period', by, 'count']).to_pylist(),
+                  key=lambda row: (row['period'] or '', -row['count']))
+    return {'by': by, 'period': period, 'rows': rows, 'total': table.num_rows, 'snapshot_at': created_at}
+
+
+def _parse_percentiles(args):
+    text = args.get('percentiles')
+    if not text:
+        return list(DEFAULT_PERCENTILES)
+    try:
+        values = [float(value) for value in text.split(',')]
+    except ValueError:
+        raise ValueError('无效的percentiles参数')
+    if not values or any(value < 0 or value > 100 for value in values):
+        raise ValueError('percentiles必须在0到100之间')
+    return values
+
+
+def _summary(values, percentiles):
+    result = {'count': int(values.size), 'mean': round(float(values.mean()), 2)}
+    for percentile, value in zip(percentiles, np.percentile(values, percentiles)):
+        result[f'p{percentile:g}'] = round(float(value), 2)
+    return result
+
+
+def duration_percentiles(args):
+    """填写时长 / 浏览时长（秒）的均值与分位数，可用 by 按维度分组"""
+    column = args.get('column') or 'fill_duration'
+    if column not in DURATIONS:
+        raise ValueError(f"无效的column参数，可选: {', '.join(DURATIONS)}")
+    by = _parse_dimension(args, required=False)
+    percentiles = _parse_percentiles(args)
+
+    table, created_at = load_table()
+    table = filter_table(table, args)
+    values = table[column].to_numpy()
+    valid = ~np.isnan(values)
+    result = {'column': column, 'percentiles': percentiles, 'snapshot_at': created_at, 'groups': []}
+    if not valid.any():
+        return result
+    if by is None:
+        result['groups'].append(_summary(values[valid], percentiles))
+        return result
+
+    # 按维度编码排序后切分为各组，每组一次 np.percentile
+    encoded = pc.dictionary_encode(pc.cast(table[by], pa.string())).combine_chunks()
+    codes = encoded.indices.fill_null(-1).to_numpy()[valid]
+    values = values[valid]
+    order = np.argsort(codes, kind='stable')
+    codes, values = codes[order], values[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    names = encoded.dictionary.to_pylist()
+    groups = []
+    for group_values, code in zip(np.split(values, starts[1:]), codes[starts]):
+        groups.append(dict({by: names[code] if code >= 0 else None}, **_summary(group_values, percentiles)))
+    groups.sort(key=lambda group: -group['count'])
+    result['groups'] = groups[:MAX_GROUPS]
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='生成咨询数据的列式分析快照')
+    parser.add_argument('--full', action='store_true', help='全部重写，不按变更日志增量更新')
+    options = parser.parse_args()
+
+    from server import database, init_db
+    init_db()
+    result = build_snapshot(database.connect(), full=options.full)
+    print(f"✅ 快照已更新: {len(result['months'])} 个月份，共 {result['rows']} 条，用时 {result['seconds']} 秒")
@@ -1,12 +1,14 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify
 from flask_cors import CORS
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import json
 import os
-from datetime import datetime
-import sqlite3
+from datetime import datetime, timedelta
+from db import Database
+from smtp_pool import SMTPPool
+from stats import StatsCache
+import pages
 
 # 导入配置
 try:
@@ -26,9 +28,19 @@ except ImportError:
 app = Flask(__name__)
 CORS(app)
 
+# 每个线程复用一个已配置好的连接
+database = Database(DATABASE_FILE)
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    database.release()
+
+# 保持已登录的SMTP会话，避免每封邮件都重新握手
+smtp_pool = SMTPPool(SMTP_SERVER, SMTP_PORT, SENDER_EMAIL, SENDER_PASSWORD)
+
 # 数据库初始化
 def init_db():
-    conn = sqlite3.connect(DATABASE_FILE)
+    conn = database.connect()
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS consultations (
@@ -73,14 +85,7 @@ def send_email_notification(form_data):
         msg.attach(MIMEText(body, 'html'))
         
         # 发送邮件
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        text = msg.as_string()
-        server.sendmail(SENDER_EMAIL, RECIPIENT_EMAIL, text)
-        server.quit()
-        
-        return True
+        return smtp_pool.send(SENDER_EMAIL, RECIPIENT_EMAIL, msg)
     except Exception as e:
         print(f"邮件发送失败: {e}")
         return False
@@ -98,7 +103,7 @@ def submit_consultation():
                 return jsonify({'success': False, 'message': f'请填写{field}字段'}), 400
         
         # 保存到数据库
-        conn = sqlite3.connect(DATABASE_FILE)
+        conn = database.connection()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO consultations (name, city, contact, consultation_type, age_group, description)
@@ -106,7 +111,7 @@ def submit_consultation():
         ''', (data['name'], data['city'], data['contact'], data['consultation_type'], 
               data['age_group'], data['description']))
         conn.commit()
-        conn.close()
+        stats_cache.invalidate()
         
         # 发送邮件通知
         send_email_notification(data)
@@ -116,120 +121,101 @@ def submit_consultation():
     except Exception as e:
         return jsonify({'success': False, 'message': f'提交失败: {str(e)}'}), 500
 
+# 接口返回的咨询字段
+CONSULTATION_COLUMNS = ('id', 'name', 'city', 'contact', 'consultation_type', 'age_group', 'description', 'submitted_at')
+COLUMNS_SQL = ', '.join(CONSULTATION_COLUMNS)
+
+# 一次最多返回的新记录数
+MAX_CHANGES = 100
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """获取 since（上次看到的最大 id）之后新提交的咨询；本应用只新增不修改，id 即可作为游标"""
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            return jsonify({'success': False, 'message': '无效的since参数'}), 400
+        
+        cursor = database.connection().cursor()
+        cursor.execute(f'SELECT {COLUMNS_SQL} FROM consultations WHERE id > ? ORDER BY id LIMIT ?',
+                       (since, MAX_CHANGES + 1))
+        rows = cursor.fetchall()
+        has_more = len(rows) > MAX_CHANGES
+        rows = rows[:MAX_CHANGES]
+        
+        return jsonify({
+            'success': True,
+            'cursor': rows[-1][0] if rows else since,
+            'consultations': [dict(zip(CONSULTATION_COLUMNS, row)) for row in rows],
+            'has_more': has_more,
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'}), 500
+
+# 后台记录每页条数
+PAGE_SIZE = 50
+
+@app.route('/api/consultations', methods=['GET'])
+def get_consultations():
+    """按 id 倒序分页获取咨询，before 为上一页最后一条的 id；第一页的 cursor 为当前最大 id（供 /api/changes 使用）"""
+    try:
+        try:
+            before = int(request.args['before']) if request.args.get('before') else None
+        except ValueError:
+            return jsonify({'success': False, 'message': '无效的before参数'}), 400
+        
+        cursor = database.connection().cursor()
+        if before is None:
+            cursor.execute(f'SELECT {COLUMNS_SQL} FROM consultations ORDER BY id DESC LIMIT ?', (PAGE_SIZE + 1,))
+        else:
+            cursor.execute(f'SELECT {COLUMNS_SQL} FROM consultations WHERE id < ? ORDER BY id DESC LIMIT ?',
+                           (before, PAGE_SIZE + 1))
+        rows = cursor.fetchall()
+        has_more = len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+        
+        return jsonify({
+            'success': True,
+            'consultations': [dict(zip(CONSULTATION_COLUMNS, row)) for row in rows],
+            'cursor': rows[0][0] if rows else 0,
+            'next_before': rows[-1][0] if has_more else None,
+            'has_more': has_more,
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'}), 500
+
+def compute_admin_stats(cursor):
+    """总数、今日、近 7 天的咨询数，由 SQL 一次扫描算出"""
+    now = datetime.now()
+    cursor.execute('''
+        SELECT COUNT(*), SUM(submitted_at >= ?), SUM(submitted_at > ?) FROM consultations
+    ''', (now.strftime('%Y-%m-%d'), (now - timedelta(days=8)).strftime('%Y-%m-%d %H:%M:%S')))
+    total, today, this_week = cursor.fetchone()
+    return {'total': total, 'today': today or 0, 'this_week': this_week or 0}
+
+# 统计结果短时间缓存，有新提交时失效
+stats_cache = StatsCache(compute=compute_admin_stats)
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """获取统计数据"""
+    try:
+        result, _ = stats_cache.get(database.connection().cursor())
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取统计数据失败: {str(e)}'}), 500
+
 @app.route('/admin')
 def admin_panel():
-    """后台管理面板"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM consultations ORDER BY submitted_at DESC')
-    consultations = cursor.fetchall()
-    conn.close()
-    
-    # 后台管理页面HTML
-    admin_html = '''
-    <!DOCTYPE html>
-    <html lang="zh-CN">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>生命力教育咨询 - 后台管理</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { font-family: 'Arial', sans-serif; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); min-height: 100vh; }
-            .container { max-width: 1200px; margin: 0 auto; padding: 20px; }
-            .header { background: rgba(255,255,255,0.1); backdrop-filter: blur(10px); padding: 20px; border-radius: 10px; margin-bottom: 20px; }
-            .header h1 { color: white; text-align: center; }
-            .stats { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px; margin-bottom: 30px; }
-            .stat-card { background: rgba(255,255,255,0.1); backdrop-filter: blur(10px); padding: 20px; border-radius: 10px; text-align: center; color: white; }
-            .stat-number { font-size: 2rem; font-weight: bold; margin-bottom: 10px; }
-            .consultations { background: rgba(255,255,255,0.1); backdrop-filter: blur(10px); border-radius: 10px; padding: 20px; }
-            .consultation-item { background: rgba(255,255,255,0.05); margin: 10px 0; padding: 15px; border-radius: 8px; color: white; }
-            .consultation-header { display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px; }
-            .consultation-name { font-weight: bold; font-size: 1.1rem; }
-            .consultation-time { font-size: 0.9rem; opacity: 0.8; }
-            .consultation-details { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 10px; }
-            .detail-item { background: rgba(255,255,255,0.1); padding: 8px; border-radius: 5px; }
-            .detail-label { font-weight: bold; margin-bottom: 5px; }
-            .refresh-btn { background: linear-gradient(45deg, #667eea, #764ba2); color: white; border: none; padding: 10px 20px; border-radius: 5px; cursor: pointer; margin-bottom: 20px; }
-            .refresh-btn:hover { transform: translateY(-2px); }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>生命力教育咨询 - 后台管理</h1>
-            </div>
-            
-            <button class="refresh-btn" onclick="location.reload()">刷新数据</button>
-            
-            <div class="stats">
-                <div class="stat-card">
-                    <div class="stat-number">{{ total_count }}</div>
-                    <div>总咨询数</div>
-                </div>
-                <div class="stat-card">
-                    <div class="stat-number">{{ today_count }}</div>
-                    <div>今日咨询</div>
-                </div>
-                <div class="stat-card">
-                    <div class="stat-number">{{ this_week_count }}</div>
-                    <div>本周咨询</div>
-                </div>
-            </div>
-            
-            <div class="consultations">
-                <h2 style="color: white; margin-bottom: 20px;">咨询记录</h2>
-                {% for consultation in consultations %}
-                <div class="consultation-item">
-                    <div class="consultation-header">
-                        <div class="consultation-name">{{ consultation[1] }}</div>
-                        <div class="consultation-time">{{ consultation[7] }}</div>
-                    </div>
-                    <div class="consultation-details">
-                        <div class="detail-item">
-                            <div class="detail-label">城市</div>
-                            <div>{{ consultation[2] }}</div>
-                        </div>
-                        <div class="detail-item">
-                            <div class="detail-label">联系方式</div>
-                            <div>{{ consultation[3] }}</div>
-                        </div>
-                        <div class="detail-item">
-                            <div class="detail-label">咨询类型</div>
-                            <div>{{ consultation[4] }}</div>
-                        </div>
-                        <div class="detail-item">
-                            <div class="detail-label">年龄段</div>
-                            <div>{{ consultation[5] }}</div>
-                        </div>
-                        <div class="detail-item" style="grid-column: 1 / -1;">
-                            <div class="detail-label">具体需求</div>
-                            <div>{{ consultation[6] }}</div>
-                        </div>
-                    </div>
-                </div>
-                {% endfor %}
-            </div>
-        </div>
-    </body>
-    </html>
-    '''
-    
-    # 计算统计数据
-    total_count = len(consultations)
-    today_count = len([c for c in consultations if c[7].startswith(datetime.now().strftime('%Y-%m-%d'))])
-    this_week_count = len([c for c in consultations if (datetime.now() - datetime.strptime(c[7], '%Y-%m-%d %H:%M:%S')).days <= 7])
-    
-    return render_template_string(admin_html, 
-                                consultations=consultations,
-                                total_count=total_count,
-                                today_count=today_count,
-                                this_week_count=this_week_count)
+    """后台管理面板（只有页面外壳，统计数据与记录由页面脚本分页加载）"""
+    return pages.render_page('app_admin.html')
 
 if __name__ == '__main__':
     init_db()
     print("后台管理系统启动中...")
     print("访问地址: http://localhost:5000/admin")
     print("请确保已配置正确的邮箱信息")
-    app.run(debug=DEBUG, host=HOST, port=PORT) 
-    app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
+    app.run(debug=DEBUG, host=HOST, port=PORT) 
\ No newline at end of file
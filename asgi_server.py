@@ -0,0 +1,500 @@
+"""
+咨询接口的 asyncio（ASGI）版本
+提供与 server.py 相同的 /submit_consultation、/api/consultations、/api/export、/api/changes、按 id 及批量修改/删除，
+返回的 JSON 与 Flask 版本完全一致（读写逻辑都在 consultations.py 中）。
+
+- 慢速客户端只占用协程，不占用线程；请求体读取与响应发送都在事件循环中完成
+- SQLite 调用在固定大小的数据库线程池中执行（ASGI_DB_THREADS 个线程，每个线程复用一个连接）
+- 导出接口的游标绑定在一个专用线程上，按块读取，客户端断开后立即停止查询
+- 变更推送（/api/changes/stream）的等待在事件循环中进行，大量后台页面同时订阅也不占用线程
+- 邮件通知仍经过发件箱；安装了 aiosmtplib 时在事件循环中异步发送，否则使用 smtp_pool 的同步连接池
+- 其余路由（后台页面、静态文件、统计接口）在安装了 a2wsgi 时转交给 Flask 应用
+- 响应按 Accept-Encoding 压缩（responses.ASGICompressor，规则与 Flask 版本相同）
+
+启动: uvicorn asgi_server:app --host 0.0.0.0 --port 5002
+"""
+
+import asyncio
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+import changes
+import consultations
+import export
+import ingest
+import ratelimit
+import metrics
+import outbox
+import proxy
+import responses
+import server
+from smtp_pool import AsyncSMTPClient, aiosmtplib
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    WSGIMiddleware = None
+
+# 导入配置
+try:
+    from config import ASGI_DB_THREADS
+except ImportError:
+    ASGI_DB_THREADS = 4  # 执行 SQLite 调用的线程数（SQLite 同一时间只允许一个写入，读取可以并发）
+
+CONSULTATION_PATH = re.compile(r'^/api/consultations/(\d+)$')
+
+# 与 Flask-CORS 默认配置相同的跨域响应头
+CORS_HEADERS = [(b'access-control-allow-origin', b'*')]
+CORS_ALLOW_METHODS = b'DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT'
+
+# 与 server.py 共用数据库文件、统计缓存和邮件内容
+database = server.database
+stats_cache = server.stats_cache
+db_executor = ThreadPoolExecutor(max_workers=ASGI_DB_THREADS, thread_name_prefix='asgi-db')
+
+# 安装了 aiosmtplib 时使用异步 SMTP 客户端，否则由发件箱线程通过同步连接池发送
+async_smtp = AsyncSMTPClient('smtp.163.com', 25, server.SENDER_EMAIL, server.SENDER_PASSWORD,
+                             observer=metrics.observe_smtp) if aiosmtplib else None
+event_loop = None
+
+
+def _in_connection(func, *args):
+    """在数据库线程中执行，使用该线程的连接，结束后回滚未提交的事务"""
+    try:
+        return func(database.connection(), *args)
+    finally:
+        database.release()
+
+
+async def run_db(func, *args):
+    """在数据库线程池中执行 func(连接, *args)"""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, partial(_in_connection, func, *args))
+
+
+async def _send_email_batch_async(consultation_list):
+    try:
+        if outbox_dispatcher.digest_interval and len(consultation_list) > 1:
+            ok = await async_smtp.send(server.SENDER_EMAIL, server.RECEIVER_EMAIL,
+                                       server.build_digest_email(consultation_list))
+            return [ok] * len(consultation_list)
+        messages = [server.build_email(consultation_data) for consultation_data in consultation_list]
+        return await async_smtp.send_many(server.SENDER_EMAIL, server.RECEIVER_EMAIL, messages)
+    except Exception as e:
+        print(f"发送邮件失败: {e}")
+        return [False] * len(consultation_list)
+
+
+def send_email_batch(consultation_list):
+    """发件箱线程调用：把发送交给事件循环中的异步 SMTP 客户端，等待结果"""
+    if async_smtp is None or event_loop is None:
+        return server.send_email_batch(consultation_list)
+    return asyncio.run_coroutine_threadsafe(_send_email_batch_async(consultation_list), event_loop).result()
+
+
+outbox_dispatcher = outbox.OutboxDispatcher(database, send_email_batch)
+# 转交给 Flask 的路由（before_request 钩子、提交后的唤醒）也使用这个投递线程，每个进程只有一个发件箱轮询
+server.outbox_dispatcher = outbox_dispatcher
+
+
+# ---- 请求与响应 ----
+
+class Request:
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        self.args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        self.remote_addr = proxy.client_address(scope['client'][0] if scope.get('client') else None,
+                                                self.headers.get('x-forwarded-for'))
+
+    async def body(self):
+        chunks = []
+        while True:
+            message = await self.receive()
+            if message['type'] == 'http.disconnect':
+                raise ConnectionError('客户端已断开')
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def get_json(self):
+        """与 Flask 的 request.get_json() 一致：要求 JSON 内容类型，解析失败时抛出异常"""
+        content_type = self.headers.get('content-type', '').split(';')[0].strip().lower()
+        if content_type != 'application/json' and not content_type.endswith('+json'):
+            raise ValueError('415 Unsupported Media Type: 请求内容类型不是 application/json')
+        try:
+            return json.loads(await self.body())
+        except ValueError as e:
+            raise ValueError(f'400 Bad Request: 无法解析JSON: {e}')
+
+
+def json_body(data):
+    """与 Flask jsonify 相同的序列化方式（responses.encode_json，末尾换行）"""
+    return responses.encode_json(data) + b'\n'
+
+
+async def send_json(send, data, status=200, headers=None):
+    body = json_body(data)
+    extra = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in (headers or {}).items()]
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + extra + CORS_HEADERS,
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_preflight(request, send):
+    """CORS 预检请求"""
+    headers = [(b'access-control-allow-methods', CORS_ALLOW_METHODS), (b'content-length', b'0')] + CORS_HEADERS
+    requested = request.headers.get('access-control-request-headers')
+    if requested:
+        headers.append((b'access-control-allow-headers', requested.encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+# ---- 接口 ----
+
+async def submit_consultation(request, send):
+    """处理咨询表单提交"""
+    idempotency_key = request.headers.get('idempotency-key')
+    try:
+        data = await request.get_json()
+    except ValueError:
+        data = None
+    except ConnectionError:
+        # 读取请求体时客户端已断开，不需要响应
+        return
+    if not isinstance(data, dict):
+        return await send_json(send, {'success': False, 'message': '请求内容必须是JSON对象'}, 400)
+
+    # 只有 admit() 占用了幂等键之后，失败时才释放；否则会删掉其他请求保存的结果
+    claimed = False
+    try:
+        # 验证必填字段（与前端表单一致）
+        field = consultations.missing_field(data)
+        if field:
+            return await send_json(send, {'success': False, 'message': f'缺少必填字段: {field}'}, 400)
+
+        # 限流与重复提交检查（Redis 存储时有网络往返，放到线程池）
+        rejected = await asyncio.to_thread(ratelimit.admit, request.remote_addr, data, idempotency_key)
+        if rejected:
+            status, body, headers = rejected
+            return await send_json(send, body, status, headers)
+        claimed = True
+
+        browser = request.headers.get('user-agent', '')
+        if server.ingest_writer is not None:
+            # 组提交：等待所在批次提交，等待期间不占用线程；队列满时 submit 会阻塞等待，放到线程池
+            future = await asyncio.to_thread(server.ingest_writer.submit, data, request.remote_addr, browser)
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(future), ingest.INGEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise RuntimeError('等待写入超时')
+        else:
+            await run_db(consultations.create, data, request.remote_addr, browser)
+        stats_cache.invalidate()
+        changes.notify_changed()
+        outbox_dispatcher.notify()
+
+        body = {'success': True, 'message': '咨询表单提交成功！'}
+        await asyncio.to_thread(ratelimit.remember, idempotency_key, body)
+        await send_json(send, body)
+
+    except Exception as e:
+        if claimed:
+            await asyncio.to_thread(ratelimit.forget, idempotency_key)
+        await send_json(send, {'success': False, 'message': f'提交失败: {str(e)}'}, 500)
+
+
+def _page_with_stats(conn, args):
+    page = consultations.fetch_page(conn, args)
+    stats, _ = stats_cache.get(conn.cursor())
+    return {'success': True, **page, **stats}
+
+
+async def get_consultations(request, send):
+    """分页获取咨询数据（支持筛选与游标翻页）"""
+    try:
+        try:
+            result = await run_db(_page_with_stats, request.args)
+        except ValueError as e:
+            return await send_json(send, {'success': False, 'message': str(e)}, 400)
+        await send_json(send, result)
+
+    except Exception as e:
+        await send_json(send, {'success': False, 'message': f'获取数据失败: {str(e)}'}, 500)
+
+
+async def update_consultation_status(request, send, consultation_id):
+    """更新咨询状态"""
+    try:
+        data = await request.get_json()
+        new_status = data.get('status')
+
+        if not new_status:
+            return await send_json(send, {'success': False, 'message': '缺少状态参数'}, 400)
+
+        await run_db(consultations.update_status, consultation_id, new_status)
+        stats_cache.invalidate()
+        changes.notify_changed()
+
+        await send_json(send, {'success': True, 'message': '状态更新成功'})
+
+    except Exception as e:
+        await send_json(send, {'success': False, 'message': f'更新失败: {str(e)}'}, 500)
+
+
+async def delete_consultation(request, send, consultation_id):
+    """删除咨询记录"""
+    try:
+        await run_db(consultations.delete, consultation_id)
+        stats_cache.invalidate()
+        changes.notify_changed()
+
+        await send_json(send, {'success': True, 'message': '删除成功'})
+
+    except Exception as e:
+        await send_json(send, {'success': False, 'message': f'删除失败: {str(e)}'}, 500)
+
+
+async def bulk_update_consultation_status(request, send):
+    """批量更新咨询状态"""
+    try:
+        data = await request.get_json()
+        new_status = data.get('status')
+
+        if not new_status:
+            return await send_json(send, {'success': False, 'message': '缺少状态参数'}, 400)
+
+        try:
+            result = await run_db(consultations.bulk_update_status, data, new_status)
+        except ValueError as e:
+            return await send_json(send, {'success': False, 'message': str(e)}, 400)
+        stats_cache.invalidate()
+        changes.notify_changed()
+
+        await send_json(send, {'success': True, 'message': f"已更新{result['succeeded']}条记录", **result})
+
+    except Exception as e:
+        await send_json(send, {'success': False, 'message': f'更新失败: {str(e)}'}, 500)
+
+
+async def bulk_delete_consultations(request, send):
+    """批量删除咨询记录"""
+    try:
+        data = await request.get_json()
+
+        try:
+            result = await run_db(consultations.bulk_delete, data)
+        except ValueError as e:
+            return await send_json(send, {'success': False, 'message': str(e)}, 400)
+        stats_cache.invalidate()
+        changes.notify_changed()
+
+        await send_json(send, {'success': True, 'message': f"已删除{result['succeeded']}条记录", **result})
+
+    except Exception as e:
+        await send_json(send, {'success': False, 'message': f'删除失败: {str(e)}'}, 500)
+
+
+def _fetch_changes(conn, since):
+    changes.prune(conn)
+    return {'success': True, **changes.fetch_changes(conn, since)}
+
+
+async def get_changes(request, send):
+    """增量获取咨询变更（since=上次返回的 cursor；不带 since 时只返回当前 cursor）"""
+    try:
+        try:
+            since = changes.parse_since(request.args.get('since'))
+        except ValueError as e:
+            return await send_json(send, {'success': False, 'message': str(e)}, 400)
+        await send_json(send, await run_db(_fetch_changes, since))
+
+    except Exception as e:
+        await send_json(send, {'success': False, 'message': f'获取数据失败: {str(e)}'}, 500)
+
+
+async def stream_changes(request, send):
+    """以 Server-Sent Events 推送咨询变更，与 Flask 版本的事件格式相同；
+    每隔 CHANGE_FEED_POLL_INTERVAL 秒在数据库线程中查一次增量，等待期间不占用线程"""
+    try:
+        since = changes.parse_since(request.headers.get('last-event-id') or request.args.get('since'))
+    except ValueError as e:
+        return await send_json(send, {'success': False, 'message': str(e)}, 400)
+
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await request.receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        if since is None:
+            since = await run_db(lambda conn: changes.latest_cursor(conn.cursor()))
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ] + CORS_HEADERS,
+        })
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+
+        started = last_sent = time.monotonic()
+        while not disconnected.is_set() and time.monotonic() - started < changes.CHANGE_STREAM_MAX_SECONDS:
+            result = await run_db(changes.fetch_changes, since)
+            now = time.monotonic()
+            if result['cursor'] != since or result['reset']:
+                since = result['cursor']
+                last_sent = now
+                await send({'type': 'http.response.body', 'body': changes.format_event(result).encode('utf-8'), 'more_body': True})
+                if result['has_more']:
+                    continue
+            elif now - last_sent >= changes.CHANGE_STREAM_HEARTBEAT:
+                last_sent = now
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+            try:
+                await asyncio.wait_for(disconnected.wait(), changes.CHANGE_FEED_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        await send({'type': 'http.response.body', 'body': b''})
+
+    except Exception as e:
+        print(f"变更推送中断: {e}")
+    finally:
+        watcher.cancel()
+
+
+async def export_consultations(request, send):
+    """流式导出咨询数据（format=csv|ndjson，compress=gzip，筛选参数同列表接口）
+
+    SQLite 连接不能跨线程使用，每个导出独占一个线程和连接，逐块读取后交给事件循环发送；
+    发送会等待客户端接收（背压），客户端断开后停止读取
+    """
+    loop = asyncio.get_running_loop()
+    worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asgi-export')
+    conn = chunks = watcher = None
+    started = False
+    try:
+        conn = await loop.run_in_executor(worker, database.connect)
+        try:
+            chunks, mimetype, filename = await loop.run_in_executor(worker, export.export_stream, conn, request.args)
+        except ValueError as e:
+            return await send_json(send, {'success': False, 'message': str(e)}, 400)
+        # 导出查询在读取第一块时才执行；先取第一块，查询出错时仍能返回 JSON 错误
+        chunk = await loop.run_in_executor(worker, next, chunks, None)
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await request.receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        if mimetype.startswith('text/'):
+            mimetype += '; charset=utf-8'
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', mimetype.encode()),
+                (b'content-disposition', f'attachment; filename={filename}'.encode()),
+            ] + CORS_HEADERS,
+        })
+        started = True
+        while chunk is not None and not disconnected.is_set():
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await loop.run_in_executor(worker, next, chunks, None)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    except Exception as e:
+        if started:
+            print(f"导出中断: {e}")
+        else:
+            await send_json(send, {'success': False, 'message': f'导出失败: {str(e)}'}, 500)
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        if chunks is not None:
+            worker.submit(chunks.close)
+        if conn is not None:
+            worker.submit(conn.close)
+        worker.shutdown(wait=False)
+
+
+# ---- 应用 ----
+
+flask_fallback = WSGIMiddleware(server.app) if WSGIMiddleware else None
+
+
+async def lifespan(receive, send):
+    global event_loop
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            event_loop = asyncio.get_running_loop()
+            await event_loop.run_in_executor(db_executor, server.init_db)
+            outbox_dispatcher.ensure_running()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if async_smtp is not None:
+                await async_smtp.close()
+            db_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    request = Request(scope, receive)
+    method, path = request.method, request.path
+    # 与 Flask 版本相同的响应压缩
+    send = responses.ASGICompressor(send, request.headers.get('accept-encoding', ''))
+
+    if method == 'OPTIONS':
+        return await send_preflight(request, send)
+    if path == '/submit_consultation' and method == 'POST':
+        return await submit_consultation(request, send)
+    if path == '/api/consultations' and method == 'GET':
+        return await get_consultations(request, send)
+    if path == '/api/consultations/bulk/status' and method == 'POST':
+        return await bulk_update_consultation_status(request, send)
+    if path == '/api/consultations/bulk/delete' and method == 'POST':
+        return await bulk_delete_consultations(request, send)
+    if path == '/api/changes' and method == 'GET':
+        return await get_changes(request, send)
+    if path == '/api/changes/stream' and method == 'GET':
+        return await stream_changes(request, send)
+    if path == '/api/export' and method == 'GET':
+        return await export_consultations(request, send)
+    match = CONSULTATION_PATH.match(path)
+    if match and method == 'PUT':
+        return await update_consultation_status(request, send, int(match.group(1)))
+    if match and method == 'DELETE':
+        return await delete_consultation(request, send, int(match.group(1)))
+
+    if flask_fallback is not None:
+        return await flask_fallback(scope, receive, send)
+    await send({'type': 'http.response.start', 'status': 404, 'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': b'Not Found'})
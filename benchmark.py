@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+后端性能基准测试
+在合成数据上测量：表单提交吞吐量、/api/consultations 在 1千/10万/100万 行时的延迟、
+/api/export 的耗时与内存、静态资源发送延迟，输出 p50/p95/p99；
+结果与预算和基准文件比较，变慢超过阈值时以非零状态退出，每次修改 server.py 后都可以运行对比
+
+用法:
+    python benchmark.py                              # 默认 1千/10万/100万 三档
+    python benchmark.py --sizes 1000,100000          # 指定数据量
+    python benchmark.py --save-baseline              # 把本次结果保存为基准
+    python benchmark.py --tolerance 0.3              # 比基准慢 30% 以上才算退化
+
+请求在进程内通过 Flask 测试客户端发出，只测应用与数据库本身；端到端（含网络和工作进程）压测见 locustfile.py。
+邮件发送到进程内的 SMTP 替身；合成数据缓存在 .benchmark/ 目录，重复运行不必重新生成
+"""
+
+import argparse
+import json
+import os
+import random
+import socketserver
+import sqlite3
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+BENCHMARK_DIR = '.benchmark'
+BASELINE_FILE = 'benchmark_baseline.json'
+DEFAULT_SIZES = (1000, 100000, 1000000)
+
+# 延迟预算（p95 毫秒），超出即视为失败，与机器无关的底线
+BUDGETS = {
+    'submit': 50,
+    'list_first_page': 50,
+    'list_filtered': 50,
+    'list_date_range': 50,
+    'list_deep_cursor': 50,
+    'stats_uncached': 1000,
+    'static_html': 20,
+    'static_css_gzip': 20,
+    'static_image': 50,
+    'static_range': 20,
+    'static_not_modified': 20,
+}
+
+# 与基准比较时，差值小于该毫秒数的不算退化（避免亚毫秒级的抖动误报）
+MIN_REGRESSION_MS = 1.0
+
+CONSULTATION_TYPES = ['学生咨询', '家长咨询', '职业咨询', '其他咨询']
+STATUSES = ['新提交', '处理中', '已完成']
+AGE_GROUPS = ['小学阶段（6-12岁）', '中学阶段（12-18岁）', '大学阶段（18-25岁）', '成人阶段（25岁以上）']
+CITIES = ['北京', '上海', '广州', '深圳', '杭州', '成都', '武汉', '南京']
+BROWSERS = [
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/124.0 Safari/537.36',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 Chrome/124.0 Mobile Safari/537.36',
+]
+
+
+# ---- SMTP 替身 ----
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """只应答 SMTP 协议、丢弃邮件内容"""
+
+    def handle(self):
+        self.wfile.write(b'220 benchmark ESMTP\r\n')
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line.rstrip(b'\r\n') == b'.':
+                    in_data = False
+                    self.server.messages += 1
+                    self.wfile.write(b'250 OK\r\n')
+                continue
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.wfile.write(b'250-benchmark\r\n250 8BITMIME\r\n')
+            elif command == b'DATA':
+                in_data = True
+                self.wfile.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+            elif command == b'QUIT':
+                self.wfile.write(b'221 Bye\r\n')
+                return
+            else:
+                self.wfile.write(b'250 OK\r\n')
+
+
+def start_stub_smtp():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StubSMTPHandler)
+    server.daemon_threads = True
+    server.messages = 0
+    threading.Thread(target=server.serve_forever, name='stub-smtp', daemon=True).start()
+    return server
+
+
+# ---- 合成数据 ----
+
+def synthetic_rows(count, seed=2025):
+    """生成 count 行咨询记录，时间均匀分布在最近两年内（北京时间字符串）；时长与线上写入一致，为整数秒"""
+    from engagement import parse_duration
+
+    rng = random.Random(seed)
+    end = datetime(2025, 6, 30, 23, 59, 59)
+    span = int(timedelta(days=730).total_seconds())
+    for index in range(count):
+        timestamp = (end - timedelta(seconds=rng.randrange(span))).strftime('%Y-%m-%d %H:%M:%S')
+        yield (
+            f'用户{index}', f'138{rng.randrange(10 ** 8):08d}', f'user{index}@example.com',
+            rng.choice(CITIES), rng.choice(AGE_GROUPS), rng.choice(CONSULTATION_TYPES),
+            '想了解课程安排和收费情况' * rng.randint(1, 5), timestamp, timestamp[:10],
+            rng.choice(STATUSES), 'iPhone', f'10.0.{rng.randrange(256)}.{rng.randrange(256)}',
+            rng.choice(CITIES), rng.choice(BROWSERS), parse_duration(rng.uniform(5, 300)), parse_duration(rng.uniform(10, 900)),
+        )
+
+
+def seeded_database(server, size):
+    """返回含 size 行合成数据的数据库路径，已生成过时直接复用"""
+    path = os.path.join(BENCHMARK_DIR, f'consultations_{size}.db')
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            # 旧版本生成的数据时长为 '12.3秒' 这样的文本，需要重新生成
+            if (conn.execute('SELECT COUNT(*) FROM consultations').fetchone()[0] == size and
+                    not conn.execute("SELECT 1 FROM consultations WHERE typeof(fill_duration) = 'text' LIMIT 1").fetchone()):
+                return path
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+        os.remove(path)
+
+    print(f"生成 {size} 行合成数据...", flush=True)
+    started = time.perf_counter()
+    use_database(server, path)
+    server.init_db()
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.executemany('''
+        INSERT INTO consultations (
+            name, contact, email, city, age_group, consultation_type, message, timestamp, created_date,
+            status, device_model, ip_address, location, browser, fill_duration, browse_duration
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', synthetic_rows(size))
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    print(f"  完成，用时 {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def use_database(server, path):
+    """让服务端改用另一个数据库文件（当前线程的旧连接先关闭）"""
+    server.database.close()
+    server.database.path = path
+    server.stats_cache.invalidate()
+
+
+# ---- 测量 ----
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def measure(name, func, iterations, warmup=5):
+    """执行 func 若干次，返回延迟分布（毫秒）"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - begin) * 1000)
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return {
+        'name': name,
+        'iterations': iterations,
+        'p50': round(percentile(samples, 0.50), 3),
+        'p95': round(percentile(samples, 0.95), 3),
+        'p99': round(percentile(samples, 0.99), 3),
+        'mean': round(sum(samples) / len(samples), 3),
+        'ops_per_sec': round(iterations / elapsed, 1),
+    }
+
+
+def expect(response, status=200):
+    if response.status_code != status:
+        raise AssertionError(f'{response.request.path} 返回 {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response
+
+
+def bench_submit(server, client, iterations):
+    rng = random.Random(1)
+
+    def submit():
+        expect(client.post('/submit_consultation', json={
+            'name': f'压测用户{rng.randrange(100000)}',
+            'city': rng.choice(CITIES),
+            'text': f'138{rng.randrange(10 ** 8):08d}',
+            'consultation_type': rng.choice(CONSULTATION_TYPES),
+            'age_group': rng.choice(AGE_GROUPS),
+            'description': '基准测试提交',
+            'fill_duration': '12.3秒',
+            'browse_duration': '45.6秒',
+        }))
+
+    return [measure('submit', submit, iterations)]
+
+
+def bench_list(server, client, iterations):
+    def get(url):
+        return lambda: expect(client.get(url))
+
+    # 先翻 20 页拿到一个较深的游标
+    cursor = None
+    for _ in range(20):
+        page = expect(client.get('/api/consultations', query_string={'limit': 50, 'cursor': cursor or ''})).get_json()
+        if not page['has_more']:
+            break
+        cursor = page['next_cursor']
+
+    def stats_uncached():
+        server.stats_cache.invalidate()
+        expect(client.get('/api/stats'))
+
+    return [
+        measure('list_first_page', get('/api/consultations?limit=50'), iterations),
+        measure('list_filtered', get('/api/consultations?limit=50&status=新提交&consultation_type=学生咨询'), iterations),
+        measure('list_date_range', get('/api/consultations?limit=50&start_date=2025-03-01&end_date=2025-03-31'), iterations),
+        measure('list_deep_cursor', get(f'/api/consultations?limit=50&cursor={cursor or ""}'), iterations),
+        measure('stats_uncached', stats_uncached, max(5, iterations // 10), warmup=1),
+    ]
+
+
+def bench_export(server, client, size):
+    """导出全部数据：分别测耗时和 Python 内存峰值（tracemalloc 会拖慢速度，不同时测）"""
+    def run():
+        response = expect(client.get('/api/export'))
+        total = sum(len(chunk) for chunk in response.response)
+        response.close()
+        return total
+
+    rounds = 3 if size <= 100000 else 1
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        total_bytes = run()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = min(timings)
+    return [{
+        'name': 'export_csv',
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(size / seconds),
+        'bytes': total_bytes,
+        'peak_memory_mb': round(peak / 1024 / 1024, 2),
+    }]
+
+
+def bench_static(server, client, iterations):
+    def get(url, status=200, **headers):
+        def request():
+            response = expect(client.get(url, headers=headers), status)
+            for _ in response.response:
+                pass
+            response.close()
+        return request
+
+    etag = expect(client.get('/index.html')).headers.get('ETag')
+    return [
+        measure('static_html', get('/index.html'), iterations),
+        measure('static_css_gzip', get('/styles.css', **{'Accept-Encoding': 'gzip, br'}), iterations),
+        measure('static_image', get('/xingkong.PNG', Accept='image/avif,image/webp,*/*'), iterations),
+        measure('static_range', get('/xingkong.PNG', 206, Range='bytes=0-65535'), iterations),
+        measure('static_not_modified', get('/index.html', 304, **{'If-None-Match': etag}), iterations),
+    ]
+
+
+# ---- 报告与阈值 ----
+
+def print_table(title, results):
+    print(f"\n{title}")
+    for result in results:
+        if 'p95' in result:
+            print(f"  {result['name']:<22} p50 {result['p50']:>9.2f}ms  p95 {result['p95']:>9.2f}ms  "
+                  f"p99 {result['p99']:>9.2f}ms  {result['ops_per_sec']:>9.1f}/s")
+        else:
+            print(f"  {result['name']:<22} {result['seconds']:>8.2f}s  {result['rows_per_sec']:>9}行/s  "
+                  f"{result['bytes'] / 1024 / 1024:>8.1f}MB  内存峰值 {result['peak_memory_mb']:.1f}MB")
+
+
+def check(results, baseline, tolerance):
+    """返回退化列表：超出预算，或比基准慢 tolerance 以上"""
+    failures = []
+    for key, result in results.items():
+        name = result['name']
+        if 'p95' in result and name in BUDGETS and result['p95'] > BUDGETS[name]:
+            failures.append(f"{key}: p95 {result['p95']}ms 超出预算 {BUDGETS[name]}ms")
+
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if 'p95' in result:
+            limit = previous['p95'] * (1 + tolerance)
+            if result['p95'] > limit and result['p95'] - previous['p95'] > MIN_REGRESSION_MS:
+                failures.append(f"{key}: p95 {result['p95']}ms，基准 {previous['p95']}ms")
+        else:
+            if result['seconds'] > previous['seconds'] * (1 + tolerance):
+                failures.append(f"{key}: 耗时 {result['seconds']}s，基准 {previous['seconds']}s")
+            if result['peak_memory_mb'] > previous['peak_memory_mb'] * (1 + tolerance) + 1:
+                failures.append(f"{key}: 内存峰值 {result['peak_memory_mb']}MB，基准 {previous['peak_memory_mb']}MB")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='后端性能基准测试')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='列表与导出测试的数据行数，逗号分隔')
+    parser.add_argument('--iterations', type=int, default=200, help='每个接口的请求次数')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='基准结果文件')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写入基准文件')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许比基准慢的比例')
+    parser.add_argument('--output', help='把本次结果写入 JSON 文件')
+    options = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    os.makedirs(BENCHMARK_DIR, exist_ok=True)
+    sizes = [int(size) for size in options.sizes.split(',') if size]
+
+    import ratelimit
+    import server
+    from smtp_pool import SMTPPool
+
+    # 所有请求来自同一个测试客户端地址，不关闭限流时提交很快就会返回 429
+    ratelimit.RATELIMIT_ENABLED = False
+
+    smtp = start_stub_smtp()
+    server.smtp_pool = SMTPPool('127.0.0.1', smtp.server_address[1], starttls=False)
+    client = server.app.test_client()
+    results = {}
+
+    def record(title, suffix, items):
+        print_table(title, items)
+        for item in items:
+            results[f"{item['name']}{suffix}"] = item
+
+    # 表单提交：每次在空数据库上测，发件箱线程同时把通知发往 SMTP 替身
+    submit_db = os.path.join(BENCHMARK_DIR, 'submit.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(submit_db + suffix):
+            os.remove(submit_db + suffix)
+    use_database(server, submit_db)
+    server.init_db()
+    record('表单提交', '', bench_submit(server, client, options.iterations))
+
+    for size in sizes:
+        use_database(server, seeded_database(server, size))
+        record(f'列表与统计（{size} 行）', f'@{size}', bench_list(server, client, options.iterations))
+        record(f'导出（{size} 行）', f'@{size}', bench_export(server, client, size))
+
+    record('静态资源', '', bench_static(server, client, options.iterations))
+
+    time.sleep(1)
+    print(f"\nSMTP 替身共收到 {smtp.messages} 封通知邮件")
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if options.save_baseline:
+        with open(options.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✅ 基准已保存到 {options.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(options.baseline):
+        with open(options.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    failures = check(results, baseline, options.tolerance)
+    if failures:
+        print("\n❌ 性能退化：")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\n✅ 所有指标都在预算和基准范围内" if baseline else "\n✅ 所有指标都在预算范围内（尚无基准，可用 --save-baseline 保存）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
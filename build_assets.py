@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+前端资源构建脚本
+压缩 CSS/JS/HTML、按内容哈希重命名、预先生成 .gz/.br 压缩文件，
+改写 index.html 中的引用并重新生成 sw.js 的预缓存清单，输出到 dist/
+
+用法: python build_assets.py
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+
+# 可选的压缩库：安装后压缩效果更好，未安装时使用内置的保守规则
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SOURCE_DIR = '.'
+DIST_DIR = 'dist'
+
+# build_images.py 生成的图片清单，存在时为 index.html 中的图片加上 srcset
+IMAGE_MANIFEST = os.path.join(DIST_DIR, 'images', 'manifest.json')
+
+# 图片在页面上的显示宽度（srcset 的 sizes），未列出的按整屏宽度
+IMAGE_SIZES = {'logo.jpg': '80px'}
+
+# 需要加哈希的资源（页面本身和 sw.js 的地址必须固定，不加哈希）
+FINGERPRINTED_ASSETS = ['styles.css', 'script.js']
+
+# 预压缩的文件类型
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg')
+
+# 这些标签内的空白有意义，压缩 HTML 时原样保留
+PRESERVED_BLOCK = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2>)', re.S | re.I)
+
+
+def minify_css(text):
+    if rcssmin:
+        return rcssmin.cssmin(text)
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    # 冒号两侧不处理：选择器 "a :hover" 和 "a:hover" 含义不同
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    if rjsmin:
+        return rjsmin.jsmin(text)
+    # 没有词法分析时只去掉行尾空白和空行，避免破坏字符串、模板字符串和正则
+    lines = (line.rstrip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+def minify_html(text):
+    text = re.sub(r'<!--(?!\[if).*?-->', '', text, flags=re.S)
+    parts = PRESERVED_BLOCK.split(text)
+    result = []
+    # split 的结果依次为：普通文本、保留块、标签名、普通文本……
+    for index in range(0, len(parts), 3):
+        plain = parts[index]
+        lines = (line.strip() for line in plain.splitlines())
+        result.append('\n'.join(line for line in lines if line))
+        if index + 1 < len(parts):
+            result.append(parts[index + 1])
+    return ''.join(result)
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js, '.html': minify_html}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def fingerprinted_name(filename, data):
+    """styles.css -> styles.<哈希>.css"""
+    stem, extension = os.path.splitext(filename)
+    return f'{stem}.{content_hash(data)}{extension}'
+
+
+def read_text(filename):
+    with open(os.path.join(SOURCE_DIR, filename), encoding='utf-8') as f:
+        return f.read()
+
+
+def write_file(filename, data):
+    path = os.path.join(DIST_DIR, filename)
+    with open(path, 'wb') as f:
+        f.write(data)
+    if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+        write_compressed(path, data)
+
+
+def write_compressed(path, data):
+    """写入 .gz 和 .br（安装了 brotli 时）预压缩文件，服务端按 Accept-Encoding 选择"""
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def rewrite_references(html, mapping):
+    """把 index.html 中对原文件名的引用（可带 ?v= 参数）改为带哈希的文件名"""
+    for original, hashed in mapping.items():
+        html = re.sub(r'''(["'])%s(\?[^"']*)?\1''' % re.escape(original), rf'\g<1>{hashed}\g<1>', html)
+    return html
+
+
+def add_srcset(html):
+    """按图片清单为 <img src="..."> 加上 srcset/sizes，格式由服务器按 Accept 头选择"""
+    if not os.path.exists(IMAGE_MANIFEST):
+        return html
+    with open(IMAGE_MANIFEST, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    def replace(match):
+        filename = match.group(2)
+        if filename not in manifest or 'srcset=' in match.group(0):
+            return match.group(0)
+        widths = sorted(int(width) for width in manifest[filename]['variants'])
+        srcset = ', '.join(f'{filename}?w={width} {width}w' for width in widths)
+        sizes = IMAGE_SIZES.get(filename, '100vw')
+        return f'{match.group(1)} srcset="{srcset}" sizes="{sizes}"'
+
+    return re.sub(r'(<img\b[^>]*?\bsrc="([^"?]+)")', replace, html)
+
+
+def build_service_worker(mapping):
+    """按本次构建的文件名重新生成预缓存清单，缓存名随内容变化，旧缓存在 activate 时删除"""
+    source = read_text('sw.js')
+    precache = ['/', '/index.html'] + [f'/{hashed}' for hashed in mapping.values()]
+    external = re.findall(r"'(https://[^']+)'", source.split('];', 1)[0])
+    urls = precache + external
+    version = content_hash(json.dumps(urls).encode('utf-8'))
+
+    manifest = "const urlsToCache = [\n" + ',\n'.join(f"  '{url}'" for url in urls) + "\n];"
+    source = re.sub(r"const CACHE_NAME = '[^']*';", f"const CACHE_NAME = 'vitality-education-{version}';", source)
+    source = re.sub(r'const urlsToCache = \[.*?\];', lambda _: manifest, source, count=1, flags=re.S)
+    return source
+
+
+def build():
+    # 只清理上次构建的文件，保留 build_images.py 生成的 images/ 目录
+    os.makedirs(DIST_DIR, exist_ok=True)
+    for name in os.listdir(DIST_DIR):
+        path = os.path.join(DIST_DIR, name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    mapping = {}
+    for filename in FINGERPRINTED_ASSETS:
+        minified = MINIFIERS[os.path.splitext(filename)[1]](read_text(filename)).encode('utf-8')
+        hashed = fingerprinted_name(filename, minified)
+        write_file(hashed, minified)
+        mapping[filename] = hashed
+        print(f"✅ {filename} -> {hashed} ({len(minified)} 字节)")
+
+    html = minify_html(add_srcset(rewrite_references(read_text('index.html'), mapping))).encode('utf-8')
+    write_file('index.html', html)
+    print(f"✅ index.html ({len(html)} 字节)")
+
+    write_file('sw.js', minify_js(build_service_worker(mapping)).encode('utf-8'))
+    print("✅ sw.js 预缓存清单已更新")
+
+    with open(os.path.join(DIST_DIR, 'asset-manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(mapping, f, ensure_ascii=False, indent=2)
+
+    if not brotli:
+        print("⚠️  未安装 brotli，只生成了 .gz 文件（pip install brotli）")
+    print(f"\n🎉 构建完成，输出目录: {DIST_DIR}/")
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+图片构建脚本
+把首页大图缩放到多个宽度，生成 WebP（以及编码器可用时的 AVIF）版本，
+写入 dist/images/ 并生成 manifest.json；服务器按 Accept 头选择格式，
+build_assets.py 按清单为 index.html 中的图片加上 srcset
+
+用法: python build_images.py
+需要 Pillow（pip install Pillow），AVIF 需要 Pillow 11.3+ 或 pillow-avif-plugin
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import pillow_avif  # noqa: F401  注册 AVIF 编码器
+except ImportError:
+    pass
+
+SOURCE_DIR = '.'
+OUTPUT_DIR = os.path.join('dist', 'images')
+MANIFEST_FILE = os.path.join(OUTPUT_DIR, 'manifest.json')
+
+# 需要处理的图片
+SOURCE_IMAGES = ['xingkong.PNG', 'xingkong2.PNG', 'xingkong3.PNG', 'logo.jpg']
+
+# 生成的宽度，超过原图宽度的会跳过；最大宽度同时作为不指定宽度时的默认版本
+# 160 供导航栏 80px 的 logo 在高清屏上使用
+WIDTHS = (160, 480, 960, 1440, 1920)
+
+# 各格式的编码参数
+ENCODERS = {
+    'avif': ('AVIF', {'quality': 55}),
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('PNG', {'optimize': True}),
+}
+
+
+def available_formats(image):
+    """本机可用的现代格式，加上兜底格式：不透明的图片用 JPEG（照片存 PNG 反而更大），有透明通道的用 PNG"""
+    Image.init()
+    formats = [name for name in ('avif', 'webp') if ENCODERS[name][0] in Image.SAVE]
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return formats + ['png' if has_alpha else 'jpg']
+
+
+def target_widths(original_width):
+    widths = [width for width in WIDTHS if width < original_width]
+    widths.append(min(original_width, WIDTHS[-1]))
+    return sorted(set(widths))
+
+
+def encode(image, image_format):
+    pil_format, options = ENCODERS[image_format]
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def build_image(filename):
+    """生成一张图片的全部版本，返回清单条目"""
+    stem = os.path.splitext(filename)[0]
+    with Image.open(os.path.join(SOURCE_DIR, filename)) as original:
+        original.load()
+        width, height = original.size
+        formats = available_formats(original)
+        variants = {}
+        for target in target_widths(width):
+            resized = original if target == width else original.resize(
+                (target, round(height * target / width)), Image.LANCZOS)
+            variants[str(target)] = {}
+            for image_format in formats:
+                data = encode(resized, image_format)
+                digest = hashlib.sha256(data).hexdigest()[:10]
+                name = f'{stem}.{target}.{digest}.{image_format}'
+                with open(os.path.join(OUTPUT_DIR, name), 'wb') as f:
+                    f.write(data)
+                variants[str(target)][image_format] = {'file': f'images/{name}', 'bytes': len(data)}
+
+    original_bytes = os.path.getsize(os.path.join(SOURCE_DIR, filename))
+    default = variants[str(max(int(w) for w in variants))]
+    best = min(item['bytes'] for item in default.values())
+    print(f"✅ {filename}: {original_bytes // 1024}KB -> {best // 1024}KB（{', '.join(formats)}，宽度 {', '.join(variants)}）")
+    return {'width': width, 'height': height, 'variants': variants}
+
+
+def build():
+    if Image is None:
+        print("❌ 需要安装 Pillow: pip install Pillow")
+        sys.exit(1)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    for name in os.listdir(OUTPUT_DIR):
+        os.remove(os.path.join(OUTPUT_DIR, name))
+
+    manifest = {filename: build_image(filename) for filename in SOURCE_IMAGES}
+    with open(MANIFEST_FILE, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    Image.init()
+    if 'AVIF' not in Image.SAVE:
+        print("⚠️  当前 Pillow 不支持 AVIF，只生成了 WebP（pip install pillow-avif-plugin）")
+    print(f"\n🎉 图片构建完成，清单: {MANIFEST_FILE}")
+    print("请重新运行 python build_assets.py 以更新 index.html 中的 srcset")
+
+
+if __name__ == '__main__':
+    build()
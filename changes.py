@@ -0,0 +1,177 @@
+"""
+咨询变更日志
+触发器把每次新增、修改、删除记录到 consultation_changes，后台按游标（变更 id）只取增量：
+GET /api/changes?since= 轮询，GET /api/changes/stream 以 Server-Sent Events 推送，两者数据格式相同
+Flask 版本中每个推送连接占用一个工作线程，每个进程同时推送的连接数不超过 CHANGE_STREAM_MAX_PER_PROCESS，
+超出时返回 503，后台页面改为轮询；asyncio 版本的推送在事件循环中等待，不受此限制
+"""
+
+import json
+import threading
+import time
+
+from consultations import format_rows
+
+# 导入配置
+try:
+    from config import (CHANGE_LOG_RETENTION_DAYS, CHANGE_FEED_POLL_INTERVAL,
+                        CHANGE_STREAM_HEARTBEAT, CHANGE_STREAM_MAX_SECONDS, CHANGE_STREAM_MAX_PER_PROCESS)
+except ImportError:
+    CHANGE_LOG_RETENTION_DAYS = 7     # 变更日志保留天数，游标早于保留范围时客户端需要重新加载
+    CHANGE_FEED_POLL_INTERVAL = 1     # 推送流检查新变更的间隔（秒），本进程内的写入会立即唤醒
+    CHANGE_STREAM_HEARTBEAT = 15      # 没有变更时发送心跳的间隔（秒），防止代理断开空闲连接
+    CHANGE_STREAM_MAX_SECONDS = 300   # 单个推送连接的最长时间，到期后浏览器自动重连（带 Last-Event-ID）
+    CHANGE_STREAM_MAX_PER_PROCESS = 2  # Flask 版本每个进程同时推送的连接数，须小于每个进程的线程数，留出线程处理普通请求
+
+# 一次最多返回的变更条数
+MAX_CHANGES = 500
+
+# 清理过期变更的间隔（秒）
+PRUNE_INTERVAL = 3600
+_last_pruned = 0
+
+# 本进程内有写入时唤醒推送流；其他进程的写入靠轮询发现
+_changed = threading.Condition()
+
+# Flask 版本中正在推送的连接占用的名额
+_stream_slots = threading.BoundedSemaphore(CHANGE_STREAM_MAX_PER_PROCESS)
+
+
+def parse_since(value):
+    """解析游标，缺省时返回 None（表示从当前最新位置开始）"""
+    if value in (None, ''):
+        return None
+    try:
+        since = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('无效的since参数')
+    if since < 0:
+        raise ValueError('无效的since参数')
+    return since
+
+
+def latest_cursor(cursor):
+    """最后分配的变更 id（AUTOINCREMENT 记在 sqlite_sequence 中，变更全部被清理后也不会回退）"""
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'consultation_changes'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def is_stale(cursor, since):
+    """since 之后有变更已被清理（或游标不属于这个数据库），增量无法补齐，需要重新加载全部数据"""
+    latest = latest_cursor(cursor)
+    if since >= latest:
+        return since > latest
+    # AUTOINCREMENT 的 id 不会复用，since 之后的变更应从 since + 1 连续保留到 latest；
+    # 日志为空或最早一条大于 since + 1 说明中间的变更已被清理
+    cursor.execute('SELECT MIN(id) FROM consultation_changes')
+    oldest = cursor.fetchone()[0]
+    return oldest is None or oldest > since + 1
+
+
+def fetch_changes(conn, since):
+    """取 since 之后的变更，同一条咨询只返回最终状态
+
+    返回 cursor（下次请求的 since）、consultations（新增或修改后的记录）、deleted（已删除的 id）、
+    has_more（还有未取完的变更）、reset（游标早于保留范围，需要重新加载全部数据）
+    """
+    cursor = conn.cursor()
+    if since is None:
+        return {'cursor': latest_cursor(cursor), 'consultations': [], 'deleted': [], 'has_more': False, 'reset': False}
+
+    if is_stale(cursor, since):
+        return {'cursor': latest_cursor(cursor), 'consultations': [], 'deleted': [], 'has_more': False, 'reset': True}
+
+    cursor.execute('''
+        SELECT id, consultation_id, operation FROM consultation_changes
+        WHERE id > ? ORDER BY id LIMIT ?
+    ''', (since, MAX_CHANGES + 1))
+    rows = cursor.fetchall()
+    has_more = len(rows) > MAX_CHANGES
+    rows = rows[:MAX_CHANGES]
+    if not rows:
+        return {'cursor': since, 'consultations': [], 'deleted': [], 'has_more': False, 'reset': False}
+
+    latest = {}
+    for _, consultation_id, operation in rows:
+        latest[consultation_id] = operation
+    changed_ids = [consultation_id for consultation_id, operation in latest.items() if operation != 'delete']
+
+    records = []
+    if changed_ids:
+        placeholders = ', '.join('?' * len(changed_ids))
+        cursor.execute(f'''
+            SELECT * FROM consultations WHERE id IN ({placeholders})
+            ORDER BY timestamp DESC, id DESC
+        ''', changed_ids)
+        records = format_rows(cursor, cursor.fetchall())
+
+    # 在本批变更之后又被删除的记录已查不到，同样按删除处理
+    found = {record['id'] for record in records}
+    deleted = [consultation_id for consultation_id in latest if consultation_id not in found]
+
+    return {
+        'cursor': rows[-1][0],
+        'consultations': records,
+        'deleted': deleted,
+        'has_more': has_more,
+        'reset': False,
+    }
+
+
+def prune(conn):
+    """删除超过保留天数的变更（每个进程每小时最多执行一次）"""
+    global _last_pruned
+    now = time.time()
+    if now - _last_pruned < PRUNE_INTERVAL:
+        return
+    _last_pruned = now
+    conn.execute('DELETE FROM consultation_changes WHERE changed_at < ?', (now - CHANGE_LOG_RETENTION_DAYS * 86400,))
+    conn.commit()
+
+
+def notify_changed():
+    """本进程写入咨询后调用，立即唤醒推送流"""
+    with _changed:
+        _changed.notify_all()
+
+
+def wait_for_change(timeout):
+    with _changed:
+        _changed.wait(timeout)
+
+
+def acquire_stream_slot():
+    """占用一个推送名额，已满时返回 False（不等待）"""
+    return _stream_slots.acquire(blocking=False)
+
+
+def release_stream_slot():
+    _stream_slots.release()
+
+
+def format_event(result):
+    """一条 SSE 消息，id 为游标，浏览器重连时通过 Last-Event-ID 带回"""
+    return f"id: {result['cursor']}\nevent: changes\ndata: {json.dumps(result, ensure_ascii=False)}\n\n"
+
+
+def stream_events(conn, since):
+    """生成 SSE 文本：有变更时推送，空闲时发送心跳，到达最长时间后结束"""
+    started = last_sent = time.monotonic()
+    yield 'retry: 3000\n\n'
+    if since is None:
+        since = latest_cursor(conn.cursor())
+
+    while time.monotonic() - started < CHANGE_STREAM_MAX_SECONDS:
+        result = fetch_changes(conn, since)
+        now = time.monotonic()
+        if result['cursor'] != since or result['reset']:
+            since = result['cursor']
+            last_sent = now
+            yield format_event(result)
+            if result['has_more']:
+                continue
+        elif now - last_sent >= CHANGE_STREAM_HEARTBEAT:
+            last_sent = now
+            yield ': keepalive\n\n'
+        wait_for_change(CHANGE_FEED_POLL_INTERVAL)
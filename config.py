@@ -18,5 +18,106 @@ DATABASE_FILE = "consultations.db"
 # 服务器配置
 HOST = "0.0.0.0"
 PORT = 5000
-DEBUG = True 
- 
\ No newline at end of file
+DEBUG = True
+
+# 邮件发件箱配置（表单提交后异步发送通知）
+OUTBOX_POLL_INTERVAL = 5      # 空闲时轮询间隔（秒）
+OUTBOX_BATCH_SIZE = 20        # 每轮最多取出的通知数
+OUTBOX_MAX_ATTEMPTS = 6       # 超过该次数标记为失败
+OUTBOX_BACKOFF_BASE = 10      # 重试退避基数（秒），按 2 的指数增长
+OUTBOX_BACKOFF_MAX = 1800     # 单次退避上限（秒）
+OUTBOX_LEASE_SECONDS = 120    # 取出后的租约时长，进程崩溃后到期会被重新投递
+
+# SMTP连接池配置
+SMTP_POOL_SIZE = 2                  # 最多同时保持的会话数
+SMTP_IDLE_TIMEOUT = 60              # 会话空闲超过该秒数后关闭重建
+SMTP_MAX_MESSAGES_PER_SESSION = 50  # 单个会话最多发送的邮件数，达到后重建
+
+# 摘要模式：每隔 N 秒把积压的通知合并成一封邮件，0 表示逐封发送
+EMAIL_DIGEST_INTERVAL = 0
+EMAIL_DIGEST_MAX_ITEMS = 200        # 一封摘要邮件最多包含的通知数
+
+# 后台统计数据缓存秒数
+STATS_CACHE_TTL = 10
+
+# SQLite连接配置（每个线程复用一个连接）
+DB_JOURNAL_MODE = "WAL"           # WAL 模式下后台读取与表单写入互不阻塞
+DB_SYNCHRONOUS = "NORMAL"         # WAL 下 NORMAL 即可保证数据库不损坏
+DB_CACHE_SIZE = -16000            # 页缓存，负数表示 KiB（约16MB）
+DB_MMAP_SIZE = 64 * 1024 * 1024   # 内存映射读取大小（字节），0 表示关闭
+DB_BUSY_TIMEOUT = 5               # 数据库被锁时的等待秒数
+DB_CACHED_STATEMENTS = 256        # 每个连接缓存的预编译语句数
+
+# 静态资源配置
+STATIC_MEDIA_MAX_AGE = 7 * 24 * 3600  # 图片、视频的缓存秒数，过期后按 ETag 重新验证
+STATIC_USE_X_SENDFILE = False         # 前面有支持 X-Sendfile 的反向代理时开启，由代理直接发送文件
+
+# 生产环境服务配置（python serve.py / gunicorn -c gunicorn.conf.py wsgi:app）
+SERVER_BIND = "0.0.0.0:5002"
+SERVER_WORKERS = 0        # 工作进程数，0 表示按 CPU 核数自动计算（2 × 核数 + 1）
+SERVER_THREADS = 4        # 每个进程的线程数
+SERVER_KEEPALIVE = 5      # 长连接保持秒数
+SERVER_TIMEOUT = 30       # 请求超时秒数，超时的工作进程会被重启
+
+# asyncio 版本（uvicorn asgi_server:app）执行 SQLite 调用的线程数
+ASGI_DB_THREADS = 4
+
+# 运行指标（GET /metrics）与慢请求日志
+METRICS_ENABLED = True          # 关闭后不计时，数据库使用普通连接
+METRICS_SLOW_REQUEST_MS = 500   # 超过该毫秒数的请求连同耗时最长的 SQL 打印到日志，0 表示不记录
+METRICS_SLOW_QUERY_LIMIT = 5    # 慢请求日志中列出的 SQL 条数
+
+# 全文搜索：命中行数不超过该值时按相关度排序，否则按时间倒序
+SEARCH_RANK_LIMIT = 5000
+SEARCH_SCAN_TIMEOUT_MS = 200     # 含有不足三个字的关键词时，逐行扫描的最长时间（超时返回已找到的结果）
+
+# 后台变更推送（GET /api/changes、/api/changes/stream）
+CHANGE_LOG_RETENTION_DAYS = 7     # 变更日志保留天数，游标早于保留范围时后台重新加载
+CHANGE_FEED_POLL_INTERVAL = 1     # 推送流检查新变更的间隔（秒），本进程内的写入会立即唤醒
+CHANGE_STREAM_HEARTBEAT = 15      # 没有变更时发送心跳的间隔（秒）
+CHANGE_STREAM_MAX_SECONDS = 300   # 单个推送连接的最长时间，到期后浏览器自动重连
+CHANGE_STREAM_MAX_PER_PROCESS = 2  # Flask 版本每个进程同时推送的连接数（须小于 SERVER_THREADS），超出时后台改为轮询
+
+# 表单提交的组提交写入（突发提交时攒批提交，每批一次落盘）
+INGEST_ENABLED = False        # 开启后表单提交经由写入线程批量提交，请求在所在批次提交后返回
+INGEST_BATCH_SIZE = 200       # 每批最多写入的条数
+INGEST_MAX_DELAY_MS = 5       # 收到第一条后最多再等待的毫秒数
+INGEST_QUEUE_SIZE = 10000     # 队列上限
+INGEST_TIMEOUT = 10           # 请求等待写入结果的最长秒数
+INGEST_SYNCHRONOUS = "FULL"   # 写入线程连接的 synchronous 设置
+
+# 接口响应压缩（JSON、CSV、HTML 等文本响应按 Accept-Encoding 压缩，安装 brotli 后优先使用 br）
+COMPRESS_ENABLED = True        # 前面的反向代理负责压缩时可关闭
+COMPRESS_MIN_SIZE = 1024       # 小于该字节数的响应不压缩
+COMPRESS_LEVEL = 3             # gzip 压缩级别（1~9），3 级以一半的耗时得到接近 6 级的压缩率
+COMPRESS_BROTLI_QUALITY = 4    # brotli 压缩质量（0~11）
+
+# 表单提交限流与重复提交去重（超出时返回 429，不写数据库、不发邮件）
+RATELIMIT_ENABLED = True            # 关闭后不限流、不去重
+RATELIMIT_STORAGE_URL = ""          # 空为进程内存储（每个工作进程单独计数）；redis://host:6379/0 为多进程共享（需要 pip install redis）
+RATELIMIT_IP_BURST = 10             # 同一 IP 连续提交的上限
+RATELIMIT_IP_PER_HOUR = 30          # 同一 IP 每小时恢复的提交次数
+RATELIMIT_CONTACT_BURST = 3         # 同一联系方式连续提交的上限
+RATELIMIT_CONTACT_PER_HOUR = 5      # 同一联系方式每小时恢复的提交次数
+RATELIMIT_MEMORY_MAX_KEYS = 100000  # 进程内存储最多保留的键数
+IDEMPOTENCY_TTL = 86400             # 幂等键（Idempotency-Key 请求头）保留秒数
+
+# 反向代理：限流与地区解析按 X-Forwarded-For 中的访客地址区分（见 proxy.py）
+PROXY_TRUSTED_HOPS = 1  # 信任的代理层数，Render 等平台在一层代理之后；直接对外服务时改为 0，防止伪造转发头
+
+# 后台页面渲染缓存（templates/ 中的模板只渲染一次，按 ETag 返回 304）
+PAGE_CACHE_ENABLED = True  # 关闭后每次请求都重新渲染（修改模板调试时）
+
+# 提交时的设备与地区解析（地区需要 pip install geoip2 和离线数据库文件）
+GEOIP_DATABASE = "GeoLite2-City.mmdb"  # MaxMind GeoLite2-City 等 .mmdb 文件，不存在时不解析地区
+ENRICH_CACHE_SIZE = 4096               # UA 与 IP 解析结果各缓存的条数
+
+# 列式分析快照（python analytics.py 或 POST /api/reports/snapshot 生成，需要 pip install pyarrow numpy）
+SNAPSHOT_DIR = "snapshots"  # 快照目录，按月份分区的 Parquet 文件
+
+# 填写/浏览时长统计（GET /api/engagement，需要 pip install numpy）
+ENGAGEMENT_DAYS = 30       # 统计最近多少天的提交
+ENGAGEMENT_CACHE_TTL = 60  # 统计结果缓存秒数
+
+# 提交数量趋势（GET /api/trends，读按小时/日/周/月汇总的数量表）
+TRENDS_MAX_BUCKETS = 2000  # 一次趋势查询最多返回的时间段数
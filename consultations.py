@@ -0,0 +1,227 @@
+"""
+咨询记录的读写操作
+server.py（Flask）和 asgi_server.py（asyncio）共用，两个入口返回的数据完全一致；
+函数只接收数据库连接和参数，不依赖具体的 Web 框架
+"""
+
+from datetime import datetime
+from operator import itemgetter
+
+import pytz
+
+import engagement
+import enrichment
+import outbox
+import query
+
+beijing_tz = pytz.timezone('Asia/Shanghai')
+
+# 必填字段（与前端表单一致）
+REQUIRED_FIELDS = ['name', 'city', 'text', 'consultation_type', 'age_group', 'description']
+
+# 批量操作一次最多处理的记录数
+MAX_BULK_SIZE = 1000
+
+
+def missing_field(data):
+    """返回第一个缺少的必填字段，都有时返回 None"""
+    for field in REQUIRED_FIELDS:
+        if not data.get(field):
+            return field
+    return None
+
+
+def create(conn, data, ip_address, browser):
+    """保存一条咨询，并在同一事务中写入邮件通知；返回提交时间"""
+    submitted_at = insert(conn.cursor(), data, ip_address, browser)
+    conn.commit()
+    return submitted_at
+
+
+def insert(cursor, data, ip_address, browser):
+    """写入咨询记录与邮件通知，不提交（由调用方决定事务边界）；返回提交时间"""
+    submitted_at = datetime.now(beijing_tz).strftime('%Y-%m-%d %H:%M:%S')
+
+    cursor.execute('''
+        INSERT INTO consultations (
+            name, contact, email, city, age_group, consultation_type, message, timestamp, created_date,
+            device_model, ip_address, location, browser, fill_duration, browse_duration,
+            device_type, os_name, browser_name, geo_country, geo_region, geo_city
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        data['name'],
+        data['text'],  # 使用text字段作为联系方式
+        data.get('email', ''),
+        data.get('city', ''),
+        data.get('age_group', ''),
+        data['consultation_type'],
+        data.get('description', ''),  # 使用description字段作为咨询内容
+        submitted_at,
+        submitted_at[:10],
+        data.get('device_model', ''),
+        ip_address,
+        data.get('location', ''),
+        browser,
+        # 时长统一为整数秒
+        engagement.parse_duration(data.get('fill_duration')),
+        engagement.parse_duration(data.get('browse_duration')),
+        # 设备与地区在写入时解析一次（带缓存），后台直接读取
+        *enrichment.enrich(ip_address, browser)
+    ))
+    # 邮件通知写入发件箱，与咨询记录同一事务提交，由后台线程发送
+    outbox.enqueue(cursor, dict(data, submitted_at=submitted_at))
+    return submitted_at
+
+
+# 接口返回的字段，以及旧版数据库缺少该列时的默认值（None 表示必有的列）
+ROW_FIELDS = (
+    ('id', None),
+    ('name', None),
+    ('contact', None),
+    ('email', None),
+    ('city', ''),
+    ('age_group', ''),
+    ('consultation_type', None),
+    ('message', None),
+    ('timestamp', None),
+    ('status', None),
+    ('device_model', ''),
+    ('ip_address', ''),
+    ('location', ''),
+    ('browser', ''),
+    ('fill_duration', 0),
+    ('browse_duration', 0),
+    ('device_type', ''),
+    ('os_name', ''),
+    ('browser_name', ''),
+    ('geo_country', ''),
+    ('geo_region', ''),
+    ('geo_city', ''),
+)
+
+
+def row_formatter(description):
+    """按查询结果的列（cursor.description）一次性确定每个字段的位置，
+    返回把一行（元组或 sqlite3.Row）转换为接口字典的函数"""
+    index = {column[0]: position for position, column in enumerate(description)}
+    missing = [name for name, default in ROW_FIELDS if default is None and name not in index]
+    if missing:
+        raise KeyError(f"查询结果缺少列: {', '.join(missing)}")
+    present = tuple(name for name, _ in ROW_FIELDS if name in index)
+    defaults = {name: default for name, default in ROW_FIELDS if name not in index}
+    getter = itemgetter(*(index[name] for name in present))
+
+    if defaults:
+        def format_row(row):
+            record = dict(zip(present, getter(row)))
+            record.update(defaults)
+            return record
+    else:
+        def format_row(row):
+            return dict(zip(present, getter(row)))
+    return format_row
+
+
+def format_rows(cursor, rows):
+    """把 cursor 查询到的多行转换为接口字典"""
+    if not rows:
+        return []
+    format_row = row_formatter(cursor.description)
+    return [format_row(row) for row in rows]
+
+
+def fetch_page(conn, args):
+    """按筛选条件取一页咨询，返回 consultations / next_cursor / has_more；参数无效时抛出 ValueError"""
+    sql, params, limit = query.build_page_query(args)
+
+    # 多取一行判断是否有下一页
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    records = format_rows(cursor, rows[:limit])
+    next_cursor = query.encode_cursor(records[-1]['timestamp'], records[-1]['id']) if has_more else None
+
+    return {
+        'consultations': records,
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+    }
+
+
+def update_status(conn, consultation_id, status):
+    conn.execute('UPDATE consultations SET status = ? WHERE id = ?', (status, consultation_id))
+    conn.commit()
+
+
+def delete(conn, consultation_id):
+    conn.execute('DELETE FROM consultations WHERE id = ?', (consultation_id,))
+    conn.commit()
+
+
+def select_bulk_targets(cursor, data):
+    """批量操作的目标记录：ids（id 列表）或 filter（筛选条件，字段同列表接口），二选一；
+    返回 (要处理的 id 列表, 其中存在的 id 集合)，参数无效时抛出 ValueError"""
+    ids = data.get('ids')
+    filters = data.get('filter')
+    if (ids is None) == (filters is None):
+        raise ValueError('需要提供ids或filter其中之一')
+
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            raise ValueError('ids必须是非空列表')
+        try:
+            requested = list(dict.fromkeys(int(consultation_id) for consultation_id in ids))
+        except (TypeError, ValueError):
+            raise ValueError('ids中包含无效的id')
+        if len(requested) > MAX_BULK_SIZE:
+            raise ValueError(f'一次最多处理{MAX_BULK_SIZE}条记录')
+        placeholders = ', '.join('?' * len(requested))
+        cursor.execute(f'SELECT id FROM consultations WHERE id IN ({placeholders})', requested)
+        return requested, {row[0] for row in cursor.fetchall()}
+
+    if not isinstance(filters, dict):
+        raise ValueError('filter必须是对象')
+    conditions, params = query.build_filters(filters)
+    if not conditions:
+        raise ValueError('filter不能为空')
+    cursor.execute(f"SELECT id FROM consultations WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?",
+                   params + [MAX_BULK_SIZE + 1])
+    matched = [row[0] for row in cursor.fetchall()]
+    if len(matched) > MAX_BULK_SIZE:
+        raise ValueError(f'符合筛选条件的记录超过{MAX_BULK_SIZE}条，请缩小筛选范围')
+    return matched, set(matched)
+
+
+def _bulk_apply(conn, data, sql, params, outcome):
+    """在一个事务内对目标记录执行 sql（executemany），返回每个 id 的结果"""
+    cursor = conn.cursor()
+    # 加写锁后再查目标记录，查到的记录在提交前不会被其他请求删除
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        requested, existing = select_bulk_targets(cursor, data)
+        cursor.executemany(sql, [params(consultation_id) for consultation_id in requested
+                                 if consultation_id in existing])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    results = [
+        {'id': consultation_id, 'result': outcome if consultation_id in existing else 'not_found'}
+        for consultation_id in requested
+    ]
+    return {'results': results, 'succeeded': len(existing), 'failed': len(requested) - len(existing)}
+
+
+def bulk_update_status(conn, data, status):
+    """批量修改状态，返回 results（每个 id 为 updated 或 not_found）/ succeeded / failed"""
+    return _bulk_apply(conn, data, 'UPDATE consultations SET status = ? WHERE id = ?',
+                       lambda consultation_id: (status, consultation_id), 'updated')
+
+
+def bulk_delete(conn, data):
+    """批量删除，返回 results（每个 id 为 deleted 或 not_found）/ succeeded / failed"""
+    return _bulk_apply(conn, data, 'DELETE FROM consultations WHERE id = ?',
+                       lambda consultation_id: (consultation_id,), 'deleted')
@@ -0,0 +1,107 @@
+"""
+SQLite 连接层
+每个线程复用一个已配置好的连接（WAL、synchronous、缓存、mmap、忙等待），
+避免每个请求重新连接、重新解析表结构；语句缓存让相同 SQL 不必重复编译。
+传入 on_query 时使用计时的连接与游标，每条语句执行后回调 on_query(sql, 秒数)
+"""
+
+import sqlite3
+import threading
+import time
+
+# 导入配置
+try:
+    from config import (DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_CACHE_SIZE, DB_MMAP_SIZE,
+                        DB_BUSY_TIMEOUT, DB_CACHED_STATEMENTS)
+except ImportError:
+    DB_JOURNAL_MODE = 'WAL'         # WAL 模式下读写互不阻塞
+    DB_SYNCHRONOUS = 'NORMAL'       # WAL 下 NORMAL 已能保证不损坏，只在断电时可能丢最近的事务
+    DB_CACHE_SIZE = -16000          # 页缓存，负数表示 KiB（约16MB）
+    DB_MMAP_SIZE = 64 * 1024 * 1024 # 内存映射读取大小（字节），0 表示关闭
+    DB_BUSY_TIMEOUT = 5             # 数据库被锁时的等待秒数
+    DB_CACHED_STATEMENTS = 256      # 每个连接缓存的预编译语句数
+
+
+class TimedCursor(sqlite3.Cursor):
+    """记录每条语句执行耗时的游标（结果集的逐行读取不计入）"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.connection.on_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.connection.on_query(sql, time.perf_counter() - started)
+
+
+class TimedConnection(sqlite3.Connection):
+    """cursor() 返回 TimedCursor；conn.execute() 的 C 实现不经过 Python 层的游标方法，需要单独改写"""
+
+    on_query = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class Database:
+    """按线程复用连接的 SQLite 数据库"""
+
+    def __init__(self, path, on_query=None):
+        self.path = path
+        self.on_query = on_query
+        self._local = threading.local()
+
+    def connect(self):
+        """新建一个配置好的连接"""
+        if self.on_query:
+            conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT, cached_statements=DB_CACHED_STATEMENTS,
+                                   factory=TimedConnection)
+            conn.on_query = self.on_query
+        else:
+            conn = sqlite3.connect(self.path, timeout=DB_BUSY_TIMEOUT, cached_statements=DB_CACHED_STATEMENTS)
+        conn.execute(f'PRAGMA journal_mode = {DB_JOURNAL_MODE}')
+        conn.execute(f'PRAGMA synchronous = {DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size = {int(DB_CACHE_SIZE)}')
+        conn.execute(f'PRAGMA mmap_size = {int(DB_MMAP_SIZE)}')
+        conn.execute(f'PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT * 1000)}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    def connection(self):
+        """当前线程的连接（首次使用时创建）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        return conn
+
+    def release(self):
+        """请求结束时调用：回滚未提交的事务，连接留给本线程下次使用"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn.in_transaction:
+            conn.rollback()
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+
+def dict_cursor(conn):
+    """返回按列名取值的游标（不修改连接本身的 row_factory）"""
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    return cursor
@@ -0,0 +1,152 @@
+"""
+填写时长、浏览时长统计（需要 pip install numpy）
+- 写入时把前端发来的 '12.3秒'、'12.3'、12.3 等统一为整数秒（parse_duration），无法识别时为 NULL；
+  迁移 8 用同一个函数转换已有数据
+- GET /api/engagement：最近 ENGAGEMENT_DAYS 天内，整体、按咨询类型、按日的均值、中位数、p90 与分段直方图。
+  各组的统计量由 NumPy 一次排序后按下标批量算出，不逐组循环；结果缓存 ENGAGEMENT_CACHE_TTL 秒
+"""
+
+import math
+import re
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from stats import StatsCache, beijing_tz
+
+# 导入配置
+try:
+    from config import ENGAGEMENT_DAYS, ENGAGEMENT_CACHE_TTL
+except ImportError:
+    ENGAGEMENT_DAYS = 30         # 统计最近多少天的提交
+    ENGAGEMENT_CACHE_TTL = 60    # 统计结果缓存秒数
+
+DURATION_COLUMNS = ('fill_duration', 'browse_duration')
+
+# 直方图分段（秒），最后一段为 1 小时以上
+HISTOGRAM_EDGES = (0, 10, 30, 60, 120, 300, 600, 1800, 3600)
+HISTOGRAM_LABELS = ('<10秒', '10-30秒', '30秒-1分', '1-2分', '2-5分', '5-10分', '10-30分', '30分-1时', '≥1时')
+
+# 中位数与 p90
+QUANTILES = (0.5, 0.9)
+
+DURATION_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(?:秒|s|sec)?\s*$', re.I)
+
+
+def parse_duration(value):
+    """时长统一为整数秒（四舍五入），空值或无法识别时返回 None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return math.floor(value + 0.5) if math.isfinite(value) and value >= 0 else None
+    match = DURATION_PATTERN.match(str(value))
+    if not match:
+        return None
+    return math.floor(float(match.group(1)) + 0.5)
+
+
+def available():
+    return np is not None
+
+
+def grouped_summary(codes, values, groups):
+    """按组计算 count / mean / median / p90 / histogram
+
+    codes 为每个值所属组的编号（0..groups-1），values 为浮点数组（NaN 表示未记录）；
+    按 (组, 值) 排序一次后，各组的分位数按下标直接取出，直方图用一次 bincount 得到
+    """
+    valid = ~np.isnan(values)
+    codes, values = codes[valid], values[valid]
+    order = np.lexsort((values, codes))
+    codes, values = codes[order], values[order]
+
+    counts = np.bincount(codes, minlength=groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sums = np.bincount(codes, weights=values, minlength=groups)
+    present = counts > 0
+    means = np.divide(sums, counts, out=np.zeros(groups), where=present)
+
+    quantiles = []
+    last = np.maximum(counts - 1, 0)
+    for q in QUANTILES:
+        position = starts + q * last
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        fraction = position - low
+        if values.size:
+            low, high = np.minimum(low, values.size - 1), np.minimum(high, values.size - 1)
+            quantiles.append(np.where(present, values[low] * (1 - fraction) + values[high] * fraction, 0))
+        else:
+            quantiles.append(np.zeros(groups))
+
+    buckets = len(HISTOGRAM_EDGES)
+    bucket = np.searchsorted(HISTOGRAM_EDGES, values, side='right') - 1
+    histograms = np.bincount(codes * buckets + bucket, minlength=groups * buckets).reshape(groups, buckets)
+
+    return [
+        {
+            'count': int(counts[i]),
+            'mean': round(float(means[i]), 1),
+            'median': round(float(quantiles[0][i]), 1),
+            'p90': round(float(quantiles[1][i]), 1),
+            'histogram': histograms[i].tolist(),
+        }
+        for i in range(groups)
+    ]
+
+
+def _encode(labels):
+    """字符串标签编码为组编号，返回 (编号数组, 各组名称)"""
+    names, codes = np.unique(np.asarray(labels, dtype=object).astype(str), return_inverse=True)
+    return codes.reshape(-1), names.tolist()
+
+
+def compute_engagement(cursor, now=None):
+    """最近 ENGAGEMENT_DAYS 天的时长统计：overall / by_type / by_day（整数秒）"""
+    now = now or datetime.now(beijing_tz)
+    start_date = (now.date() - timedelta(days=ENGAGEMENT_DAYS - 1)).strftime('%Y-%m-%d')
+    # 由 idx_consultations_engagement 覆盖，只读索引
+    cursor.execute('''
+        SELECT created_date, consultation_type, fill_duration, browse_duration
+        FROM consultations WHERE created_date >= ?
+    ''', (start_date,))
+    rows = cursor.fetchall()
+
+    result = {
+        'start_date': start_date,
+        'days': ENGAGEMENT_DAYS,
+        'histogram_labels': list(HISTOGRAM_LABELS),
+        'overall': {},
+        'by_type': {},
+        'by_day': [],
+    }
+    if not rows:
+        return result
+
+    dates, types, fill, browse = zip(*rows)
+    columns = {
+        'fill_duration': np.array(fill, dtype=float),
+        'browse_duration': np.array(browse, dtype=float),
+    }
+    type_codes, type_names = _encode(types)
+    day_codes, day_names = _encode(dates)
+    overall_codes = np.zeros(len(rows), dtype=np.int64)
+
+    for column, values in columns.items():
+        result['overall'][column] = grouped_summary(overall_codes, values, 1)[0]
+        for name, summary in zip(type_names, grouped_summary(type_codes, values, len(type_names))):
+            result['by_type'].setdefault(name, {})[column] = summary
+        for position, summary in enumerate(grouped_summary(day_codes, values, len(day_names))):
+            # 按日只返回均值、中位数、p90，不带直方图
+            summary.pop('histogram')
+            if column == DURATION_COLUMNS[0]:
+                result['by_day'].append({'date': day_names[position]})
+            result['by_day'][position][column] = summary
+    return result
+
+
+# 统计结果缓存（不随每次提交失效，过期后重新计算）
+engagement_cache = StatsCache(ttl=ENGAGEMENT_CACHE_TTL, compute=compute_engagement)
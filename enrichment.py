@@ -0,0 +1,199 @@
+"""
+提交时的设备与地区解析
+- User-Agent 解析为设备类型、操作系统、浏览器（只保留主版本号），同一个 UA 字符串只解析一次（LRU 缓存）
+- IP 按本地离线 GeoIP 数据库（MaxMind GeoLite2-City 等 .mmdb 文件，需要 pip install geoip2）解析为国家、省份、城市，
+  查询结果同样缓存；未安装 geoip2 或没有数据库文件时地区列留空
+- 结果在写入时存入 device_type / os_name / browser_name / geo_country / geo_region / geo_city 列，
+  前端不再调用第三方接口获取 IP 与地址
+"""
+
+import ipaddress
+import os
+import re
+import threading
+from functools import lru_cache
+
+try:
+    import geoip2.database
+    import geoip2.errors
+except ImportError:
+    geoip2 = None
+
+# 导入配置
+try:
+    from config import GEOIP_DATABASE, ENRICH_CACHE_SIZE
+except ImportError:
+    GEOIP_DATABASE = 'GeoLite2-City.mmdb'  # 离线 GeoIP 数据库文件，不存在时不解析地区
+    ENRICH_CACHE_SIZE = 4096               # UA 与 IP 解析结果各缓存的条数
+
+# 写入的列，顺序与 enrich() 返回值一致
+ENRICH_COLUMNS = ('device_type', 'os_name', 'browser_name', 'geo_country', 'geo_region', 'geo_city')
+
+# GeoIP 地名优先使用的语言
+GEOIP_LOCALES = ('zh-CN', 'en')
+
+BOT_PATTERN = re.compile(r'bot|spider|crawl|slurp|curl|wget|python-requests|headless', re.I)
+TABLET_PATTERN = re.compile(r'iPad|Tablet|PlayBook|Silk|Android(?!.*Mobile)', re.I)
+MOBILE_PATTERN = re.compile(r'Mobi|iPhone|iPod|Android|BlackBerry|Windows Phone|HarmonyOS', re.I)
+
+# 按顺序匹配，先匹配的优先（套壳浏览器要排在 Chrome、Safari 之前）
+OS_PATTERNS = (
+    (re.compile(r'Windows Phone(?: OS)? ([\d.]+)?', re.I), 'Windows Phone'),
+    (re.compile(r'HarmonyOS(?:[ /]([\d.]+))?', re.I), 'HarmonyOS'),
+    (re.compile(r'(?:iPhone|iPad|iPod).*? OS ([\d_]+)', re.I), 'iOS'),
+    (re.compile(r'Android(?: ([\d.]+))?', re.I), 'Android'),
+    (re.compile(r'Windows NT ([\d.]+)', re.I), 'Windows'),
+    (re.compile(r'Mac OS X(?: ([\d_.]+))?', re.I), 'macOS'),
+    (re.compile(r'CrOS', re.I), 'Chrome OS'),
+    (re.compile(r'Linux', re.I), 'Linux'),
+)
+
+BROWSER_PATTERNS = (
+    (re.compile(r'MicroMessenger/([\d.]+)', re.I), '微信'),
+    (re.compile(r'\bQQ/([\d.]+)', re.I), 'QQ'),
+    (re.compile(r'M?QQBrowser/([\d.]+)', re.I), 'QQ浏览器'),
+    (re.compile(r'UCBrowser/([\d.]+)', re.I), 'UC浏览器'),
+    (re.compile(r'Quark/([\d.]+)', re.I), '夸克'),
+    (re.compile(r'Trae/([\d.]+)', re.I), 'Trae'),
+    (re.compile(r'Edg(?:e|A|iOS)?/([\d.]+)', re.I), 'Edge'),
+    (re.compile(r'(?:OPR|Opera)/([\d.]+)', re.I), 'Opera'),
+    (re.compile(r'(?:Firefox|FxiOS)/([\d.]+)', re.I), 'Firefox'),
+    (re.compile(r'(?:Chrome|CriOS)/([\d.]+)', re.I), 'Chrome'),
+    (re.compile(r'Version/([\d.]+).*Safari/', re.I), 'Safari'),
+    (re.compile(r'(?:MSIE |Trident/.*rv:)([\d.]+)', re.I), 'Internet Explorer'),
+    (re.compile(r'Safari/', re.I), 'Safari'),
+)
+
+# Windows NT 内核版本对应的系统版本
+WINDOWS_VERSIONS = {'10.0': '10', '6.3': '8.1', '6.2': '8', '6.1': '7', '6.0': 'Vista', '5.1': 'XP'}
+
+_reader = None
+_reader_lock = threading.Lock()
+_reader_checked = False
+
+
+def _version(match, parts):
+    """取匹配到的版本号前 parts 段（1_2_3 与 1.2.3 两种写法）"""
+    if not match.groups() or not match.group(1):
+        return ''
+    return '.'.join(re.split(r'[._]', match.group(1))[:parts])
+
+
+@lru_cache(maxsize=ENRICH_CACHE_SIZE)
+def parse_user_agent(user_agent):
+    """解析 User-Agent，返回 (设备类型, 操作系统, 浏览器)，无法识别的部分为空字符串"""
+    if not user_agent:
+        return '', '', ''
+
+    if BOT_PATTERN.search(user_agent):
+        device_type = '爬虫'
+    elif TABLET_PATTERN.search(user_agent):
+        device_type = '平板'
+    elif MOBILE_PATTERN.search(user_agent):
+        device_type = '手机'
+    else:
+        device_type = '电脑'
+
+    os_name = ''
+    for pattern, name in OS_PATTERNS:
+        match = pattern.search(user_agent)
+        if match:
+            version = _version(match, 2)
+            if name == 'Windows':
+                version = WINDOWS_VERSIONS.get(version, version)
+            os_name = f'{name} {version}' if version else name
+            break
+
+    browser_name = ''
+    for pattern, name in BROWSER_PATTERNS:
+        match = pattern.search(user_agent)
+        if match:
+            version = _version(match, 1)
+            browser_name = f'{name} {version}' if version else name
+            break
+
+    return device_type, os_name, browser_name
+
+
+def _geoip_reader():
+    """首次使用时打开 GeoIP 数据库（进程内只打开一次）"""
+    global _reader, _reader_checked
+    if _reader_checked:
+        return _reader
+    with _reader_lock:
+        if not _reader_checked:
+            if GEOIP_DATABASE and os.path.isfile(GEOIP_DATABASE):
+                if geoip2 is None:
+                    print("警告: 未安装 geoip2，不解析提交者地区（pip install geoip2）")
+                else:
+                    try:
+                        _reader = geoip2.database.Reader(GEOIP_DATABASE)
+                    except Exception as e:
+                        print(f"打开GeoIP数据库失败: {e}")
+            _reader_checked = True
+    return _reader
+
+
+def _local_name(record):
+    names = record.names or {}
+    return next((names[locale] for locale in GEOIP_LOCALES if names.get(locale)), '')
+
+
+@lru_cache(maxsize=ENRICH_CACHE_SIZE)
+def lookup_ip(ip_address):
+    """IP 解析为 (国家, 省份, 城市)；内网地址、查不到或没有数据库时为空字符串"""
+    try:
+        if not ipaddress.ip_address(ip_address or '').is_global:
+            return '', '', ''
+    except ValueError:
+        return '', '', ''
+
+    reader = _geoip_reader()
+    if reader is None:
+        return '', '', ''
+    try:
+        response = reader.city(ip_address)
+    except geoip2.errors.AddressNotFoundError:
+        return '', '', ''
+    except Exception as e:
+        print(f"GeoIP查询失败: {e}")
+        return '', '', ''
+    return (
+        _local_name(response.country),
+        _local_name(response.subdivisions.most_specific),
+        _local_name(response.city),
+    )
+
+
+def enrich(ip_address, user_agent):
+    """一次提交的解析结果，按 ENRICH_COLUMNS 的顺序返回"""
+    return parse_user_agent(user_agent or '') + lookup_ip(ip_address or '')
+
+
+def backfill(cursor):
+    """为已有记录填充解析列：每个不同的 UA / IP 只解析一次，写入临时映射表后一条 UPDATE 回填"""
+    cursor.execute('CREATE TEMP TABLE enrich_user_agents (user_agent TEXT PRIMARY KEY, device_type, os_name, browser_name)')
+    cursor.execute("SELECT DISTINCT browser FROM consultations WHERE browser IS NOT NULL AND browser != ''")
+    rows = [(user_agent,) + parse_user_agent(user_agent) for user_agent, in cursor.fetchall()]
+    cursor.executemany('INSERT INTO enrich_user_agents VALUES (?, ?, ?, ?)', rows)
+    cursor.execute('''
+        UPDATE consultations SET (device_type, os_name, browser_name) = (
+            SELECT device_type, os_name, browser_name FROM enrich_user_agents WHERE user_agent = consultations.browser
+        )
+        WHERE browser IS NOT NULL AND browser != ''
+    ''')
+    cursor.execute('DROP TABLE enrich_user_agents')
+
+    if _geoip_reader() is None:
+        return
+    cursor.execute('CREATE TEMP TABLE enrich_ips (ip_address TEXT PRIMARY KEY, geo_country, geo_region, geo_city)')
+    cursor.execute("SELECT DISTINCT ip_address FROM consultations WHERE ip_address IS NOT NULL AND ip_address != ''")
+    rows = [(ip_address,) + lookup_ip(ip_address) for ip_address, in cursor.fetchall()]
+    cursor.executemany('INSERT INTO enrich_ips VALUES (?, ?, ?, ?)', rows)
+    cursor.execute('''
+        UPDATE consultations SET (geo_country, geo_region, geo_city) = (
+            SELECT geo_country, geo_region, geo_city FROM enrich_ips WHERE ip_address = consultations.ip_address
+        )
+        WHERE ip_address IS NOT NULL AND ip_address != ''
+    ''')
+    cursor.execute('DROP TABLE enrich_ips')
@@ -0,0 +1,106 @@
+"""
+流式导出咨询数据
+按块读取游标、边读边写，导出任意行数都只占用固定内存；支持 CSV、NDJSON 和 gzip 压缩
+"""
+
+import csv
+import io
+import json
+import zlib
+
+import query
+
+# 每次从游标读取的行数
+CHUNK_ROWS = 1000
+
+# 导出列与 CSV 表头
+EXPORT_COLUMNS = [
+    ('id', 'ID'),
+    ('name', '姓名'),
+    ('contact', '联系方式'),
+    ('email', '邮箱'),
+    ('city', '城市'),
+    ('age_group', '年龄段'),
+    ('consultation_type', '咨询类型'),
+    ('message', '咨询内容'),
+    ('timestamp', '提交时间'),
+    ('status', '状态'),
+]
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+def parse_format(args):
+    """解析导出格式，返回 (格式, 是否 gzip 压缩)"""
+    export_format = (args.get('format') or 'csv').lower()
+    if export_format not in FORMATS:
+        raise ValueError(f'不支持的导出格式: {export_format}')
+    compress = (args.get('compress') or '').lower()
+    if compress not in ('', 'gzip'):
+        raise ValueError(f'不支持的压缩方式: {compress}')
+    return export_format, compress == 'gzip'
+
+
+def build_export_query(args):
+    """导出查询，筛选条件与列表接口相同"""
+    conditions, params = query.build_filters(args)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    columns = ', '.join(column for column, _ in EXPORT_COLUMNS)
+    return f'SELECT {columns} FROM consultations {where} ORDER BY timestamp DESC, id DESC', params
+
+
+def iter_chunks(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(CHUNK_ROWS)
+        if not rows:
+            break
+        yield rows
+
+
+def iter_csv(conn, sql, params):
+    """逐块生成 CSV 文本，字段中的逗号、引号、换行都会正确转义"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for _, header in EXPORT_COLUMNS])
+    for rows in iter_chunks(conn, sql, params):
+        writer.writerows(['' if value is None else value for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(conn, sql, params):
+    """逐块生成 NDJSON，每行一个 JSON 对象"""
+    keys = [column for column, _ in EXPORT_COLUMNS]
+    for rows in iter_chunks(conn, sql, params):
+        yield ''.join(json.dumps(dict(zip(keys, row)), ensure_ascii=False) + '\n' for row in rows)
+
+
+def gzip_stream(chunks):
+    """把文本块流式压缩为 gzip"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(conn, args):
+    """返回 (数据块生成器, MIME 类型, 文件名)"""
+    export_format, compress = parse_format(args)
+    sql, params = build_export_query(args)
+    mimetype, extension = FORMATS[export_format]
+
+    chunks = iter_csv(conn, sql, params) if export_format == 'csv' else iter_ndjson(conn, sql, params)
+    filename = f'consultations.{extension}'
+    if compress:
+        return gzip_stream(chunks), 'application/gzip', filename + '.gz'
+    return (chunk.encode('utf-8') for chunk in chunks), mimetype, filename
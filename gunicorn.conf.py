@@ -0,0 +1,37 @@
+"""
+gunicorn 配置（生产环境）
+多进程 + 每进程多线程；kill -HUP <主进程PID> 平滑重载，旧进程处理完当前请求再退出
+"""
+
+import os
+
+# 导入配置
+try:
+    from config import SERVER_BIND, SERVER_WORKERS, SERVER_THREADS, SERVER_KEEPALIVE, SERVER_TIMEOUT
+except ImportError:
+    SERVER_BIND = "0.0.0.0:5002"
+    SERVER_WORKERS = 0        # 0 表示按 CPU 核数自动计算
+    SERVER_THREADS = 4
+    SERVER_KEEPALIVE = 5
+    SERVER_TIMEOUT = 30
+
+bind = os.environ.get('BIND', SERVER_BIND)
+workers = int(os.environ.get('WORKERS', SERVER_WORKERS)) or (os.cpu_count() or 1) * 2 + 1
+threads = int(os.environ.get('THREADS', SERVER_THREADS))
+worker_class = 'gthread'
+
+# 长连接：浏览器复用连接加载页面资源，反向代理之后可适当调大
+keepalive = SERVER_KEEPALIVE
+timeout = SERVER_TIMEOUT
+graceful_timeout = 30
+
+# 每个进程处理一定请求数后自动重启，防止内存缓慢增长；加随机量避免同时重启
+max_requests = 2000
+max_requests_jitter = 200
+
+# 主进程先加载应用（迁移只执行一次），再 fork 出工作进程；
+# 数据库连接和邮件投递线程都在工作进程中按需创建
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
@@ -0,0 +1,122 @@
+"""
+表单提交的组提交写入（可选，INGEST_ENABLED）
+请求线程只把提交放入队列并等待结果；写入线程每攒够 INGEST_BATCH_SIZE 条或等待 INGEST_MAX_DELAY_MS 毫秒
+就在一个事务中写入整批并提交，请求在所在批次提交后才返回成功。
+突发提交时一次提交（一次 fsync、一次写锁）分摊到整批，写入线程的连接因此可以用 synchronous=FULL
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import consultations
+
+# 导入配置
+try:
+    from config import (INGEST_ENABLED, INGEST_BATCH_SIZE, INGEST_MAX_DELAY_MS, INGEST_QUEUE_SIZE,
+                        INGEST_TIMEOUT, INGEST_SYNCHRONOUS)
+except ImportError:
+    INGEST_ENABLED = False        # 开启后表单提交经由写入线程批量提交
+    INGEST_BATCH_SIZE = 200       # 每批最多写入的条数
+    INGEST_MAX_DELAY_MS = 5       # 收到第一条后最多再等待的毫秒数
+    INGEST_QUEUE_SIZE = 10000     # 队列上限，写满后新的提交等待 INGEST_TIMEOUT 秒后失败
+    INGEST_TIMEOUT = 10           # 请求等待写入结果的最长秒数
+    INGEST_SYNCHRONOUS = 'FULL'   # 写入线程连接的 synchronous 设置，FULL 表示每批提交都落盘
+
+
+class IngestWriter:
+    """组提交写入线程（每个进程一个，首次提交时启动）
+
+    submit() 返回 concurrent.futures.Future，所在批次提交后得到提交时间，写入失败时得到异常；
+    Flask 视图用 result() 等待，asyncio 版本用 asyncio.wrap_future() 等待，不占用线程
+    """
+
+    def __init__(self, database, batch_size=INGEST_BATCH_SIZE, max_delay=INGEST_MAX_DELAY_MS / 1000):
+        self.database = database
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=INGEST_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_running(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, data, ip_address, browser):
+        """把一条提交放入队列，返回 Future；队列已满时等待 INGEST_TIMEOUT 秒后抛出 RuntimeError"""
+        self.ensure_running()
+        future = Future()
+        try:
+            self._queue.put((future, data, ip_address, browser), timeout=INGEST_TIMEOUT)
+        except queue.Full:
+            raise RuntimeError('写入队列已满，请稍后重试')
+        return future
+
+    def write(self, data, ip_address, browser):
+        """提交并等待所在批次写入完成，返回提交时间"""
+        future = self.submit(data, ip_address, browser)
+        try:
+            return future.result(timeout=INGEST_TIMEOUT)
+        except FutureTimeoutError:
+            raise RuntimeError('等待写入超时')
+
+    def depth(self):
+        """队列中等待写入的条数"""
+        return self._queue.qsize()
+
+    def _run(self):
+        conn = self.database.connect()
+        conn.execute(f'PRAGMA synchronous = {INGEST_SYNCHRONOUS}')
+        while True:
+            batch = self._collect()
+            try:
+                self._write(conn, batch)
+            except Exception as e:
+                print(f"批量写入咨询失败: {e}")
+                for future, *_ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _collect(self):
+        """阻塞等待第一条，之后在 max_delay 内尽量凑满一批"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, conn, batch):
+        """整批一个事务；每条一个保存点，单条出错只影响它自己"""
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        results = []
+        try:
+            for future, data, ip_address, browser in batch:
+                cursor.execute('SAVEPOINT submission')
+                try:
+                    results.append((future, consultations.insert(cursor, data, ip_address, browser), None))
+                    cursor.execute('RELEASE submission')
+                except Exception as e:
+                    cursor.execute('ROLLBACK TO submission')
+                    cursor.execute('RELEASE submission')
+                    results.append((future, None, e))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        for future, submitted_at, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(submitted_at)
@@ -0,0 +1,59 @@
+"""
+压测场景：表单提交 + 后台列表
+python serve.py                       # 先以生产模式启动
+locust -f locustfile.py --host http://localhost:5002 --headless -u 200 -r 20 -t 1m
+
+Locust 结果中每个接口的 "Current RPS" / "Requests/s" 即吞吐量，以及 p50/p95/p99 延迟。
+压测前请在 server.py 中把 smtp_pool 指向本地SMTP替身（见 BACKEND_README.md），避免发出真实邮件；
+并在 config.py 中设置 RATELIMIT_ENABLED = False：所有虚拟用户来自压测机的同一个 IP，
+不关闭限流时绝大部分提交会返回 429（提交限流见 ratelimit.py）
+"""
+
+import random
+
+from locust import HttpUser, between, task
+
+CONSULTATION_TYPES = ['学生咨询', '家长咨询', '职业咨询', '其他咨询']
+AGE_GROUPS = ['小学阶段（6-12岁）', '中学阶段（12-18岁）', '大学阶段（18-25岁）']
+CITIES = ['北京', '上海', '广州', '深圳', '杭州']
+
+
+class Visitor(HttpUser):
+    """网站访客：提交咨询表单"""
+    weight = 3
+    wait_time = between(1, 3)
+
+    @task
+    def submit_consultation(self):
+        self.client.post('/submit_consultation', json={
+            'name': f'压测用户{random.randint(1, 100000)}',
+            'city': random.choice(CITIES),
+            'text': f'138{random.randint(10000000, 99999999)}',
+            'consultation_type': random.choice(CONSULTATION_TYPES),
+            'age_group': random.choice(AGE_GROUPS),
+            'description': '压测提交',
+            'fill_duration': random.randint(10, 300),
+            'browse_duration': random.randint(30, 900),
+        })
+
+
+class Admin(HttpUser):
+    """后台管理员：翻看列表和统计"""
+    weight = 1
+    wait_time = between(0.5, 2)
+
+    @task(3)
+    def list_consultations(self):
+        response = self.client.get('/api/consultations?limit=50', name='/api/consultations')
+        cursor = response.json().get('next_cursor') if response.ok else None
+        if cursor:
+            self.client.get(f'/api/consultations?limit=50&cursor={cursor}', name='/api/consultations?cursor')
+
+    @task(2)
+    def filtered_list(self):
+        self.client.get(f'/api/consultations?status=新提交&consultation_type={random.choice(CONSULTATION_TYPES)}',
+                        name='/api/consultations?filters')
+
+    @task(1)
+    def stats(self):
+        self.client.get('/api/stats')
@@ -0,0 +1,226 @@
+"""
+运行指标（Prometheus 文本格式，GET /metrics）
+按路由统计请求耗时、响应大小、每个请求执行的 SQL 条数；按语句类型统计 SQL 耗时；
+SMTP 发送耗时与失败次数；数据库文件大小。超过 METRICS_SLOW_REQUEST_MS 的请求连同耗时最长的 SQL 打印到日志。
+
+不依赖 prometheus_client：计数只是在锁内累加几个数字，开销在微秒级；
+gunicorn 多进程时每个工作进程单独统计，由 Prometheus 按实例汇总
+"""
+
+import bisect
+import os
+import threading
+import time
+from functools import partial
+
+from flask import g, request
+
+# 导入配置
+try:
+    from config import METRICS_ENABLED, METRICS_SLOW_REQUEST_MS, METRICS_SLOW_QUERY_LIMIT
+except ImportError:
+    METRICS_ENABLED = True          # 关闭后不计时，数据库使用普通连接
+    METRICS_SLOW_REQUEST_MS = 500   # 超过该毫秒数的请求记入慢请求日志，0 表示不记录
+    METRICS_SLOW_QUERY_LIMIT = 5    # 慢请求日志中列出的 SQL 条数（按耗时从高到低）
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labelnames = labelnames
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # 各区间的计数（最后一个为 +Inf）、总和
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _number(bound)
+                    lines.append(f'{self.name}_bucket{_labels(self.labelnames + ("le",), labels + (le,))} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """取值时调用函数计算（例如数据库文件大小）"""
+
+    def __init__(self, name, documentation, func):
+        self.name = name
+        self.documentation = documentation
+        self.func = func
+
+    def render(self):
+        try:
+            value = self.func()
+        except Exception as e:
+            print(f"读取指标 {self.name} 失败: {e}")
+            return []
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge', f'{self.name} {_number(value)}']
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+request_duration = Histogram('http_request_duration_seconds', '请求耗时（含流式响应的发送时间）',
+                             LATENCY_BUCKETS, ('method', 'route', 'status'))
+response_size = Histogram('http_response_size_bytes', '响应体大小', SIZE_BUCKETS, ('route',))
+request_queries = Histogram('http_request_sql_queries', '每个请求执行的 SQL 条数', COUNT_BUCKETS, ('route',))
+query_duration = Histogram('db_query_duration_seconds', 'SQL 执行耗时（按语句类型）', LATENCY_BUCKETS, ('statement',))
+smtp_duration = Histogram('smtp_send_duration_seconds', '单封邮件的 SMTP 发送耗时', LATENCY_BUCKETS)
+smtp_failures = Counter('smtp_send_failures_total', 'SMTP 发送失败次数')
+slow_requests = Counter('http_slow_requests_total', '超过慢请求阈值的请求数', ('route',))
+
+REGISTRY = [request_duration, response_size, request_queries, query_duration,
+            smtp_duration, smtp_failures, slow_requests]
+
+# 当前线程正在处理的请求记录的 SQL，请求之外（如发件箱线程）为 None
+_local = threading.local()
+
+
+def observe_query(sql, seconds):
+    """db.Database 的 on_query 回调"""
+    statement = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'EMPTY'
+    query_duration.observe(seconds, statement)
+    queries = getattr(_local, 'queries', None)
+    if queries is not None:
+        queries.append((seconds, sql))
+
+
+def observe_smtp(seconds, ok):
+    """smtp_pool 的 observer 回调"""
+    smtp_duration.observe(seconds)
+    if not ok:
+        smtp_failures.inc()
+
+
+def add_file_size_gauge(path):
+    """数据库文件大小（含 WAL 文件）"""
+    def size():
+        return sum(os.path.getsize(name) for name in (path, path + '-wal') if os.path.exists(name))
+    REGISTRY.append(Gauge('db_file_size_bytes', '数据库文件大小（含 WAL）', size))
+
+
+def add_gauge(name, documentation, func):
+    REGISTRY.append(Gauge(name, documentation, func))
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """注册请求计时钩子；METRICS_ENABLED 为 False 时不做任何事"""
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        _local.queries = []
+
+    @app.after_request
+    def finish_timer(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        # 变更推送（SSE）是长连接，持续时间不代表处理耗时，不计入请求指标
+        if response.mimetype == 'text/event-stream':
+            _local.queries = None
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        record = partial(_record, request.method, route, request.full_path, str(response.status_code),
+                         started, _local.queries)
+
+        # 静态文件虽然也是流式发送，但长度已知，不包装文件体以免失去 sendfile
+        size = response.content_length if response.content_length is not None else response.calculate_content_length()
+        if size is not None:
+            record(size)
+            return response
+
+        # 长度未知的流式响应（导出）在发送完毕、连接关闭时才计入，期间执行的 SQL 也算在本请求内
+        sent = [0]
+        chunks = response.response
+
+        def counting():
+            for chunk in chunks:
+                sent[0] += len(chunk)
+                yield chunk
+
+        response.response = counting()
+        response.call_on_close(lambda: record(sent[0]))
+        return response
+
+
+def _record(method, route, path, status, started, queries, size):
+    _local.queries = None
+    elapsed = time.perf_counter() - started
+    request_duration.observe(elapsed, method, route, status)
+    response_size.observe(size, route)
+    request_queries.observe(len(queries), route)
+    if METRICS_SLOW_REQUEST_MS and elapsed * 1000 >= METRICS_SLOW_REQUEST_MS:
+        slow_requests.inc(route)
+        log_slow_request(method, path, elapsed, queries)
+
+
+def log_slow_request(method, path, elapsed, queries):
+    """打印慢请求及其中耗时最长的 SQL"""
+    total = sum(seconds for seconds, _ in queries)
+    lines = [f"慢请求: {method} {path} {elapsed * 1000:.1f}ms，SQL {len(queries)} 条共 {total * 1000:.1f}ms"]
+    for seconds, sql in sorted(queries, reverse=True)[:METRICS_SLOW_QUERY_LIMIT]:
+        lines.append(f"    {seconds * 1000:8.1f}ms  {' '.join(sql.split())[:300]}")
+    print('\n'.join(lines))
@@ -0,0 +1,318 @@
+"""
+数据库迁移
+每个迁移有一个递增编号，已应用的版本记录在 PRAGMA user_version 中；
+启动时只比较版本号，已是最新版本时不做任何表结构检查。
+已发布的迁移直接写出建表、触发器的 SQL，不调用其他模块的建表函数，避免后来的修改改变旧迁移的结果；
+只有回填数据时调用解析函数（与写入时保持一致）
+"""
+
+import engagement
+import enrichment
+
+
+def _baseline(cursor):
+    """1: 咨询表（兼容旧版数据库：phone 列改名、补齐缺少的列）"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='consultations'")
+    if not cursor.fetchone():
+        cursor.execute('''
+            CREATE TABLE consultations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                contact TEXT NOT NULL,
+                email TEXT,
+                city TEXT,
+                age_group TEXT,
+                consultation_type TEXT NOT NULL,
+                message TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                status TEXT DEFAULT '新提交',
+                device_model TEXT,
+                ip_address TEXT,
+                location TEXT,
+                browser TEXT,
+                fill_duration INTEGER,
+                browse_duration INTEGER
+            )
+        ''')
+        return
+
+    cursor.execute('PRAGMA table_info(consultations)')
+    columns = [column[1] for column in cursor.fetchall()]
+
+    # 重命名phone列为contact
+    if 'phone' in columns and 'contact' not in columns:
+        cursor.execute('ALTER TABLE consultations RENAME COLUMN phone TO contact')
+
+    # 添加缺少的列
+    required_columns = [
+        ('city', 'TEXT'),
+        ('age_group', 'TEXT'),
+        ('device_model', 'TEXT'),
+        ('ip_address', 'TEXT'),
+        ('location', 'TEXT'),
+        ('browser', 'TEXT'),
+        ('fill_duration', 'INTEGER'),
+        ('browse_duration', 'INTEGER')
+    ]
+    for column_name, column_type in required_columns:
+        if column_name not in columns:
+            cursor.execute(f'ALTER TABLE consultations ADD COLUMN {column_name} {column_type}')
+
+
+def _email_outbox(cursor):
+    """2: 邮件发件箱"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            sent_at REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+        ON email_outbox (status, next_attempt_at)
+    ''')
+
+
+def _list_indexes(cursor):
+    """3: 后台列表按时间排序、按状态/类型筛选所需的索引"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_consultations_timestamp ON consultations (timestamp, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_consultations_status ON consultations (status, timestamp, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_consultations_type ON consultations (consultation_type, timestamp, id)')
+
+
+def _created_date(cursor):
+    """4: 提交日期列（北京时间 YYYY-MM-DD），用于按日/周/月统计，并建立覆盖统计查询的索引"""
+    cursor.execute('ALTER TABLE consultations ADD COLUMN created_date TEXT')
+    cursor.execute('UPDATE consultations SET created_date = substr(timestamp, 1, 10)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_consultations_stats
+        ON consultations (consultation_type, created_date, status)
+    ''')
+
+
+def _search_index(cursor):
+    """5: 姓名、联系方式、城市、咨询内容的全文索引（FTS5 trigram，触发器同步），并为已有数据建立索引"""
+    # 外部内容表：索引里不再保存一份原文，原文从 consultations 读取
+    cursor.execute('''
+        CREATE VIRTUAL TABLE consultations_fts USING fts5(
+            name, contact, city, message, content='consultations', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER consultations_fts_insert AFTER INSERT ON consultations BEGIN
+            INSERT INTO consultations_fts (rowid, name, contact, city, message)
+            VALUES (new.id, new.name, new.contact, new.city, new.message);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER consultations_fts_delete AFTER DELETE ON consultations BEGIN
+            INSERT INTO consultations_fts (consultations_fts, rowid, name, contact, city, message)
+            VALUES ('delete', old.id, old.name, old.contact, old.city, old.message);
+        END
+    ''')
+    # 只有搜索列变化时才更新索引，修改状态不触发
+    cursor.execute('''
+        CREATE TRIGGER consultations_fts_update AFTER UPDATE OF name, contact, city, message ON consultations BEGIN
+            INSERT INTO consultations_fts (consultations_fts, rowid, name, contact, city, message)
+            VALUES ('delete', old.id, old.name, old.contact, old.city, old.message);
+            INSERT INTO consultations_fts (rowid, name, contact, city, message)
+            VALUES (new.id, new.name, new.contact, new.city, new.message);
+        END
+    ''')
+    cursor.execute("INSERT INTO consultations_fts (consultations_fts) VALUES ('rebuild')")
+    # bm25 中各列的权重：姓名、联系方式命中比咨询内容命中更相关
+    cursor.execute("INSERT INTO consultations_fts (consultations_fts, rank) VALUES ('rank', 'bm25(4.0, 4.0, 2.0, 1.0)')")
+
+
+def _change_log(cursor):
+    """6: 咨询变更日志（触发器记录新增、修改、删除），后台按游标获取增量"""
+    cursor.execute('''
+        CREATE TABLE consultation_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            consultation_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER consultation_changes_insert AFTER INSERT ON consultations BEGIN
+            INSERT INTO consultation_changes (consultation_id, operation) VALUES (new.id, 'insert');
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER consultation_changes_update AFTER UPDATE ON consultations BEGIN
+            INSERT INTO consultation_changes (consultation_id, operation) VALUES (new.id, 'update');
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER consultation_changes_delete AFTER DELETE ON consultations BEGIN
+            INSERT INTO consultation_changes (consultation_id, operation) VALUES (old.id, 'delete');
+        END
+    ''')
+
+
+def _enrichment(cursor):
+    """7: 设备类型、操作系统、浏览器、国家/省份/城市列（由 User-Agent 与 IP 解析），并回填已有记录"""
+    for column in ('device_type', 'os_name', 'browser_name', 'geo_country', 'geo_region', 'geo_city'):
+        cursor.execute(f'ALTER TABLE consultations ADD COLUMN {column} TEXT')
+    # 回填不是用户操作，不记入变更日志：先删除 update 触发器，回填后按迁移 6 的定义重建
+    cursor.execute('DROP TRIGGER IF EXISTS consultation_changes_update')
+    enrichment.backfill(cursor)
+    cursor.execute('''
+        CREATE TRIGGER consultation_changes_update AFTER UPDATE ON consultations BEGIN
+            INSERT INTO consultation_changes (consultation_id, operation) VALUES (new.id, 'update');
+        END
+    ''')
+
+
+def _duration_seconds(cursor):
+    """8: 填写时长、浏览时长统一为整数秒（旧数据为 '12.3秒' 这样的文本），并建立时长统计的覆盖索引"""
+    cursor.execute('DROP TRIGGER IF EXISTS consultation_changes_update')
+    # 与写入时使用同一个解析函数
+    cursor.connection.create_function('parse_duration', 1, engagement.parse_duration, deterministic=True)
+    cursor.execute('''
+        UPDATE consultations
+        SET fill_duration = parse_duration(fill_duration), browse_duration = parse_duration(browse_duration)
+        WHERE typeof(fill_duration) != 'integer' OR typeof(browse_duration) != 'integer'
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_consultations_engagement
+        ON consultations (created_date, consultation_type, fill_duration, browse_duration)
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER consultation_changes_update AFTER UPDATE ON consultations BEGIN
+            INSERT INTO consultation_changes (consultation_id, operation) VALUES (new.id, 'update');
+        END
+    ''')
+
+
+def _rollups(cursor):
+    """9: 按小时/日/周/月 × 类型 × 状态汇总的数量表（触发器增量维护），按已有数据填充
+
+    时间段：小时 'YYYY-MM-DD HH:00'、日 'YYYY-MM-DD'、周为周一日期、月 'YYYY-MM'（北京时间，与 rollups.py 一致）
+    """
+    cursor.execute('''
+        CREATE TABLE consultation_rollups (
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            consultation_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (granularity, bucket, consultation_type, status)
+        ) WITHOUT ROWID
+    ''')
+
+    # 只扫描一次咨询表，日/周/月由小时汇总推出
+    cursor.execute('''
+        INSERT INTO consultation_rollups
+        SELECT 'hour', COALESCE(substr(timestamp, 1, 13) || ':00', ''),
+               COALESCE(consultation_type, ''), COALESCE(status, ''), COUNT(*)
+        FROM consultations GROUP BY 2, 3, 4
+    ''')
+    cursor.execute('''
+        INSERT INTO consultation_rollups
+        SELECT 'day', substr(bucket, 1, 10), consultation_type, status, SUM(count)
+        FROM consultation_rollups WHERE granularity = 'hour' GROUP BY 2, 3, 4
+    ''')
+    cursor.execute('''
+        INSERT INTO consultation_rollups
+        SELECT 'week', COALESCE(date(bucket, 'weekday 0', '-6 days'), ''), consultation_type, status, SUM(count)
+        FROM consultation_rollups WHERE granularity = 'hour' GROUP BY 2, 3, 4
+    ''')
+    cursor.execute('''
+        INSERT INTO consultation_rollups
+        SELECT 'month', substr(bucket, 1, 7), consultation_type, status, SUM(count)
+        FROM consultation_rollups WHERE granularity = 'hour' GROUP BY 2, 3, 4
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER consultation_rollups_insert AFTER INSERT ON consultations BEGIN
+            INSERT INTO consultation_rollups (granularity, bucket, consultation_type, status, count) VALUES
+                ('hour', COALESCE(substr(new.timestamp, 1, 13) || ':00', ''), COALESCE(new.consultation_type, ''), COALESCE(new.status, ''), 1),
+                ('day', COALESCE(substr(new.timestamp, 1, 10), ''), COALESCE(new.consultation_type, ''), COALESCE(new.status, ''), 1),
+                ('week', COALESCE(date(new.timestamp, 'weekday 0', '-6 days'), ''), COALESCE(new.consultation_type, ''), COALESCE(new.status, ''), 1),
+                ('month', COALESCE(substr(new.timestamp, 1, 7), ''), COALESCE(new.consultation_type, ''), COALESCE(new.status, ''), 1)
+            ON CONFLICT (granularity, bucket, consultation_type, status) DO UPDATE SET count = count + excluded.count;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER consultation_rollups_delete AFTER DELETE ON consultations BEGIN
+            INSERT INTO consultation_rollups (granularity, bucket, consultation_type, status, count) VALUES
+                ('hour', COALESCE(substr(old.timestamp, 1, 13) || ':00', ''), COALESCE(old.consultation_type, ''), COALESCE(old.status, ''), -1),
+                ('day', COALESCE(substr(old.timestamp, 1, 10), ''), COALESCE(old.consultation_type, ''), COALESCE(old.status, ''), -1),
+                ('week', COALESCE(date(old.timestamp, 'weekday 0', '-6 days'), ''), COALESCE(old.consultation_type, ''), COALESCE(old.status, ''), -1),
+                ('month', COALESCE(substr(old.timestamp, 1, 7), ''), COALESCE(old.consultation_type, ''), COALESCE(old.status, ''), -1)
+            ON CONFLICT (granularity, bucket, consultation_type, status) DO UPDATE SET count = count + excluded.count;
+        END
+    ''')
+    # 只修改其他列（如回填解析列）时不触发
+    cursor.execute('''
+        CREATE TRIGGER consultation_rollups_update AFTER UPDATE OF timestamp, consultation_type, status ON consultations
+        WHEN old.timestamp IS NOT new.timestamp OR old.consultation_type IS NOT new.consultation_type
+          OR old.status IS NOT new.status
+        BEGIN
+            INSERT INTO consultation_rollups (granularity, bucket, consultation_type, status, count) VALUES
+                ('hour', COALESCE(substr(old.timestamp, 1, 13) || ':00', ''), COALESCE(old.consultation_type, ''), COALESCE(old.status, ''), -1),
+                ('day', COALESCE(substr(old.timestamp, 1, 10), ''), COALESCE(old.consultation_type, ''), COALESCE(old.status, ''), -1),
+                ('week', COALESCE(date(old.timestamp, 'weekday 0', '-6 days'), ''), COALESCE(old.consultation_type, ''), COALESCE(old.status, ''), -1),
+                ('month', COALESCE(substr(old.timestamp, 1, 7), ''), COALESCE(old.consultation_type, ''), COALESCE(old.status, ''), -1)
+            ON CONFLICT (granularity, bucket, consultation_type, status) DO UPDATE SET count = count + excluded.count;
+            INSERT INTO consultation_rollups (granularity, bucket, consultation_type, status, count) VALUES
+                ('hour', COALESCE(substr(new.timestamp, 1, 13) || ':00', ''), COALESCE(new.consultation_type, ''), COALESCE(new.status, ''), 1),
+                ('day', COALESCE(substr(new.timestamp, 1, 10), ''), COALESCE(new.consultation_type, ''), COALESCE(new.status, ''), 1),
+                ('week', COALESCE(date(new.timestamp, 'weekday 0', '-6 days'), ''), COALESCE(new.consultation_type, ''), COALESCE(new.status, ''), 1),
+                ('month', COALESCE(substr(new.timestamp, 1, 7), ''), COALESCE(new.consultation_type, ''), COALESCE(new.status, ''), 1)
+            ON CONFLICT (granularity, bucket, consultation_type, status) DO UPDATE SET count = count + excluded.count;
+        END
+    ''')
+
+
+# 按顺序排列，只能在末尾追加，不要修改已发布的迁移
+MIGRATIONS = [
+    _baseline,
+    _email_outbox,
+    _list_indexes,
+    _created_date,
+    _search_index,
+    _change_log,
+    _enrichment,
+    _duration_seconds,
+    _rollups,
+]
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """执行所有未应用的迁移，每个迁移一个事务；返回执行的迁移数"""
+    if current_version(conn) >= LATEST_VERSION:
+        return 0
+
+    applied = 0
+    for version, migration in enumerate(MIGRATIONS, 1):
+        cursor = conn.cursor()
+        # 加写锁后再读版本号，避免多个进程同时启动时重复执行
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if current_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(cursor)
+            cursor.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"数据库已迁移到版本 {version}")
+        applied += 1
+    return applied
@@ -0,0 +1,171 @@
+"""
+邮件发件箱（Outbox）
+表单提交时只把通知写入 SQLite，由后台线程异步投递，失败自动退避重试
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+# 导入配置
+try:
+    from config import (OUTBOX_POLL_INTERVAL, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS,
+                        OUTBOX_BACKOFF_BASE, OUTBOX_BACKOFF_MAX, OUTBOX_LEASE_SECONDS)
+except ImportError:
+    OUTBOX_POLL_INTERVAL = 5      # 空闲时轮询间隔（秒）
+    OUTBOX_BATCH_SIZE = 20        # 每轮最多取出的通知数
+    OUTBOX_MAX_ATTEMPTS = 6       # 超过该次数标记为失败
+    OUTBOX_BACKOFF_BASE = 10      # 重试退避基数（秒），按 2 的指数增长
+    OUTBOX_BACKOFF_MAX = 1800     # 单次退避上限（秒）
+    OUTBOX_LEASE_SECONDS = 120    # 取出后的租约时长，进程崩溃后到期会被重新投递
+
+try:
+    from config import EMAIL_DIGEST_INTERVAL, EMAIL_DIGEST_MAX_ITEMS
+except ImportError:
+    EMAIL_DIGEST_INTERVAL = 0     # 摘要模式：每隔 N 秒把积压通知合并成一封邮件，0 表示逐封发送
+    EMAIL_DIGEST_MAX_ITEMS = 200  # 一封摘要邮件最多包含的通知数
+
+
+def enqueue(cursor, payload):
+    """写入一条待发送通知（与咨询记录在同一事务中提交）"""
+    now = time.time()
+    cursor.execute(
+        'INSERT INTO email_outbox (payload, next_attempt_at, created_at) VALUES (?, ?, ?)',
+        (json.dumps(payload, ensure_ascii=False), now, now)
+    )
+    return cursor.lastrowid
+
+
+class OutboxDispatcher:
+    """后台投递线程：取出到期通知、调用发送函数、记录结果
+
+    database 为 db.Database；send_batch 接收一组通知内容，返回与之一一对应的发送结果（True/False）
+    """
+
+    def __init__(self, database, send_batch, digest_interval=None):
+        self.database = database
+        self.send_batch = send_batch
+        self.digest_interval = EMAIL_DIGEST_INTERVAL if digest_interval is None else digest_interval
+        self.batch_size = EMAIL_DIGEST_MAX_ITEMS if self.digest_interval else OUTBOX_BATCH_SIZE
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._latencies = deque(maxlen=200)
+        self.sent_total = 0
+        self.failed_total = 0
+
+    def ensure_running(self):
+        """按需启动投递线程（每个进程一个）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+                self._thread.start()
+
+    def notify(self):
+        """有新通知入队时唤醒投递线程"""
+        self._wakeup.set()
+
+    def _run(self):
+        conn = self.database.connection()
+        while True:
+            try:
+                batch = self._claim(conn)
+                if batch:
+                    self._deliver(conn, batch)
+            except Exception as e:
+                print(f"邮件发件箱处理失败: {e}")
+                batch = []
+            if self.digest_interval:
+                # 摘要模式按固定间隔发送，不因新通知提前唤醒
+                time.sleep(self.digest_interval)
+            elif len(batch) < self.batch_size:
+                # 满批说明可能还有积压，立即继续
+                self._wakeup.wait(OUTBOX_POLL_INTERVAL)
+                self._wakeup.clear()
+
+    def _claim(self, conn):
+        """取出到期通知，并把下次尝试时间推后一个租约，避免多进程重复发送"""
+        now = time.time()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('''
+                SELECT id, payload, attempts FROM email_outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY id LIMIT ?
+            ''', (now, self.batch_size))
+            batch = cursor.fetchall()
+            cursor.executemany(
+                'UPDATE email_outbox SET next_attempt_at = ? WHERE id = ?',
+                [(now + OUTBOX_LEASE_SECONDS, row[0]) for row in batch]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return batch
+
+    def _deliver(self, conn, batch):
+        started = time.time()
+        try:
+            results = self.send_batch([json.loads(payload) for _, payload, _ in batch])
+            errors = [None if ok else '发送函数返回失败' for ok in results]
+        except Exception as e:
+            results, errors = [False] * len(batch), [str(e)] * len(batch)
+        finished = time.time()
+        self._latencies.append((finished - started) / len(batch))
+
+        for (outbox_id, _, attempts), ok, error in zip(batch, results, errors):
+            attempts += 1
+            if ok:
+                self.sent_total += 1
+                conn.execute(
+                    "UPDATE email_outbox SET status = 'sent', attempts = ?, sent_at = ?, last_error = NULL WHERE id = ?",
+                    (attempts, finished, outbox_id)
+                )
+            elif attempts >= OUTBOX_MAX_ATTEMPTS:
+                self.failed_total += 1
+                conn.execute(
+                    "UPDATE email_outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, error, outbox_id)
+                )
+            else:
+                delay = min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+                conn.execute(
+                    'UPDATE email_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                    (attempts, finished + delay, error, outbox_id)
+                )
+        conn.commit()
+
+    def stats(self, cursor):
+        """队列深度与发送耗时"""
+        cursor.execute('SELECT status, COUNT(*) FROM email_outbox GROUP BY status')
+        counts = dict(cursor.fetchall())
+        cursor.execute("SELECT MIN(created_at) FROM email_outbox WHERE status = 'pending'")
+        oldest = cursor.fetchone()[0]
+
+        latencies = sorted(self._latencies)
+        if latencies:
+            latency = {
+                'last': round(self._latencies[-1], 3),
+                'avg': round(sum(latencies) / len(latencies), 3),
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                'max': round(latencies[-1], 3),
+            }
+        else:
+            latency = {'last': None, 'avg': None, 'p95': None, 'max': None}
+
+        return {
+            'pending': counts.get('pending', 0),
+            'sent': counts.get('sent', 0),
+            'failed': counts.get('failed', 0),
+            'oldest_pending_age': round(time.time() - oldest, 1) if oldest else 0,
+            'send_latency': latency,
+            'sent_since_start': self.sent_total,
+            'failed_since_start': self.failed_total,
+            'dispatcher_running': self._thread is not None and self._thread.is_alive(),
+            'digest_interval': self.digest_interval,
+        }
@@ -0,0 +1,51 @@
+"""
+后台页面渲染缓存
+页面模板放在 templates/ 中，只是不含数据的外壳，数据由页面脚本通过接口分页加载，
+因此渲染结果与表中有多少条记录无关：第一次请求时渲染一次并缓存页面与 ETag，
+之后直接返回缓存（浏览器带 If-None-Match 时返回 304）；模板文件修改后自动重新渲染
+"""
+
+import hashlib
+import os
+import threading
+
+from flask import current_app, render_template, request
+
+# 导入配置
+try:
+    from config import PAGE_CACHE_ENABLED
+except ImportError:
+    PAGE_CACHE_ENABLED = True  # 关闭后每次请求都重新渲染（修改模板调试时）
+
+# (应用, 模板名) -> (模板修改时间, 页面字节串, ETag)
+_cache = {}
+_lock = threading.Lock()
+
+
+def template_mtime(name):
+    path = os.path.join(current_app.root_path, current_app.template_folder, name)
+    return os.path.getmtime(path)
+
+
+def rendered(name):
+    """返回 (页面字节串, ETag)，模板未修改时使用缓存"""
+    key = (current_app.import_name, name)
+    mtime = template_mtime(name)
+    entry = _cache.get(key)
+    if PAGE_CACHE_ENABLED and entry is not None and entry[0] == mtime:
+        return entry[1], entry[2]
+
+    body = render_template(name).encode('utf-8')
+    etag = hashlib.md5(body).hexdigest()
+    with _lock:
+        _cache[key] = (mtime, body, etag)
+    return body, etag
+
+
+def render_page(name):
+    """发送缓存的页面：每次按 ETag 重新验证，页面不含数据，可以由浏览器缓存"""
+    body, etag = rendered(name)
+    response = current_app.response_class(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
@@ -0,0 +1,31 @@
+"""
+反向代理之后的访客地址
+部署在 Render、nginx 等反向代理之后时，连接的对端是代理，访客的真实地址在 X-Forwarded-For 中。
+PROXY_TRUSTED_HOPS 为信任的代理层数，只取最后经过的这几层代理追加的地址；0 表示直接对外服务，不读取转发头（防止伪造）
+- Flask：init_app 用 werkzeug 的 ProxyFix 改写 request.remote_addr 与协议
+- asyncio 版本（asgi_server.py）：client_address 按相同的规则取地址
+限流（ratelimit.py）和地区解析（enrichment.py）都使用这个地址
+"""
+
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+# 导入配置
+try:
+    from config import PROXY_TRUSTED_HOPS
+except ImportError:
+    PROXY_TRUSTED_HOPS = 0  # 信任的反向代理层数，0 表示不读取 X-Forwarded-For
+
+
+def init_app(app):
+    """信任代理时用 ProxyFix 包装 WSGI 应用"""
+    if PROXY_TRUSTED_HOPS:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_TRUSTED_HOPS, x_proto=PROXY_TRUSTED_HOPS)
+
+
+def client_address(peer, forwarded_for):
+    """与 ProxyFix 一致：取 X-Forwarded-For 从右数第 PROXY_TRUSTED_HOPS 个地址，层数不够时用连接的对端地址"""
+    if PROXY_TRUSTED_HOPS and forwarded_for:
+        values = [value.strip() for value in forwarded_for.split(',')]
+        if len(values) >= PROXY_TRUSTED_HOPS:
+            return values[-PROXY_TRUSTED_HOPS]
+    return peer
@@ -0,0 +1,104 @@
+"""
+咨询列表查询：服务端筛选、排序与游标（keyset）分页
+按 (timestamp, id) 翻页，每页耗时与总数据量无关
+"""
+
+import base64
+import json
+from datetime import datetime
+
+# 每页默认条数与上限
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# 支持精确匹配的筛选字段
+EQUALITY_FILTERS = ('status', 'consultation_type', 'city', 'age_group')
+
+
+def build_filters(args, prefix=''):
+    """根据查询参数生成 WHERE 条件与参数
+
+    支持 status / consultation_type / city / age_group 精确匹配，
+    start_date / end_date（YYYY-MM-DD，含当天）按提交时间筛选；
+    与其他表联接查询时用 prefix（如 'consultations.'）限定列名
+    """
+    conditions = []
+    params = []
+
+    for field in EQUALITY_FILTERS:
+        value = args.get(field)
+        if value:
+            conditions.append(f'{prefix}{field} = ?')
+            params.append(value)
+
+    # 时间为北京时间字符串，直接按字符串区间比较，可以利用索引
+    start_date = args.get('start_date')
+    if start_date:
+        conditions.append(f'{prefix}timestamp >= ?')
+        params.append(_check_date(start_date))
+
+    end_date = args.get('end_date')
+    if end_date:
+        conditions.append(f'{prefix}timestamp <= ?')
+        params.append(_check_date(end_date) + ' 23:59:59')
+
+    return conditions, params
+
+
+def _check_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'无效的日期: {value}')
+
+
+def parse_page_size(args):
+    """解析每页条数"""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError('无效的limit参数')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def parse_order(args):
+    """解析排序方向，默认按时间倒序"""
+    order = (args.get('order') or 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError('无效的order参数')
+    return order
+
+
+def encode_cursor(timestamp, row_id):
+    """把最后一行的 (timestamp, id) 编码为游标"""
+    raw = json.dumps([timestamp, row_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """解析游标，返回 (timestamp, id)"""
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return timestamp, int(row_id)
+    except Exception:
+        raise ValueError('无效的分页游标')
+
+
+def build_page_query(args, columns='*'):
+    """生成分页查询 SQL 与参数，多取一行用于判断是否还有下一页"""
+    conditions, params = build_filters(args)
+    order = parse_order(args)
+    limit = parse_page_size(args)
+
+    cursor = args.get('cursor')
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        comparison = '<' if order == 'desc' else '>'
+        conditions.append(f'(timestamp, id) {comparison} (?, ?)')
+        params.extend([timestamp, row_id])
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    direction = order.upper()
+    sql = f'SELECT {columns} FROM consultations {where} ORDER BY timestamp {direction}, id {direction} LIMIT ?'
+    params.append(limit + 1)
+    return sql, params, limit
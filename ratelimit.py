@@ -0,0 +1,224 @@
+"""
+表单提交限流与重复提交去重
+- 令牌桶：按 IP、按联系方式（只保存哈希）各一个桶，桶空时返回 429，不写数据库也不发邮件
+- 幂等键：前端每次填写表单生成一个 Idempotency-Key 请求头，同一个键重复提交（重试、双击）时直接返回第一次的结果
+- 存储：默认为进程内 LRU（MemoryStore，gunicorn 多进程时各进程单独计数）；
+  RATELIMIT_STORAGE_URL 设为 redis://... 时使用 Redis（需要 pip install redis），所有进程共享计数。
+  其他共享存储只需实现 take_tokens / claim / put / delete 四个方法
+- 存储不可用时放行请求，限流失效但不影响正常提交
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# 导入配置
+try:
+    from config import (RATELIMIT_ENABLED, RATELIMIT_STORAGE_URL, RATELIMIT_IP_BURST, RATELIMIT_IP_PER_HOUR,
+                        RATELIMIT_CONTACT_BURST, RATELIMIT_CONTACT_PER_HOUR, RATELIMIT_MEMORY_MAX_KEYS,
+                        IDEMPOTENCY_TTL)
+except ImportError:
+    RATELIMIT_ENABLED = True            # 关闭后不限流、不去重
+    RATELIMIT_STORAGE_URL = ''          # 空为进程内存储；redis://host:6379/0 为多进程共享存储
+    RATELIMIT_IP_BURST = 10             # 同一 IP 连续提交的上限
+    RATELIMIT_IP_PER_HOUR = 30          # 同一 IP 每小时恢复的提交次数
+    RATELIMIT_CONTACT_BURST = 3         # 同一联系方式连续提交的上限
+    RATELIMIT_CONTACT_PER_HOUR = 5      # 同一联系方式每小时恢复的提交次数
+    RATELIMIT_MEMORY_MAX_KEYS = 100000  # 进程内存储最多保留的键数，超出时淘汰最久未使用的
+    IDEMPOTENCY_TTL = 24 * 3600         # 幂等键保留秒数
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+
+# 幂等键已占用、第一次请求还没有完成时保存的值
+PENDING = ''
+
+
+class MemoryStore:
+    """进程内存储，按最近使用顺序淘汰"""
+
+    def __init__(self, max_keys=RATELIMIT_MEMORY_MAX_KEYS):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _set(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+    def take_tokens(self, buckets, now):
+        """从每个令牌桶 (键, 容量, 每秒恢复数) 各取一个令牌：全部有令牌时才扣减并返回 0，
+        否则都不扣减，返回还需等待的秒数"""
+        with self._lock:
+            levels = []
+            wait = 0
+            for key, capacity, rate in buckets:
+                tokens, updated = self._entries.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                levels.append((key, tokens))
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+            if wait:
+                return wait
+            for key, tokens in levels:
+                self._set(key, (tokens - 1, now))
+            return 0
+
+    def claim(self, key, ttl, now):
+        """键不存在（或已过期）时占用并返回 None，否则返回已保存的值"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+            self._set(key, (PENDING, now + ttl))
+            return None
+
+    def put(self, key, value, ttl, now):
+        with self._lock:
+            self._set(key, (value, now + ttl))
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+# 多个令牌桶的读取、补充、检查、扣减在 Redis 中原子执行：全部有令牌时才扣减；
+# ARGV 为 now 之后每个桶的容量、每秒恢复数；返回字符串，避免 Lua 数字被截断为整数
+TOKEN_BUCKET_SCRIPT = '''
+local now = tonumber(ARGV[1])
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', levels[i] - 1, 'updated', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return '0'
+'''
+
+
+class RedisStore:
+    """Redis 存储，多个工作进程、多台服务器共享计数"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, decode_responses=True)
+        self.prefix = prefix
+        self._take = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take_tokens(self, buckets, now):
+        args = [now]
+        for key, capacity, rate in buckets:
+            args += [capacity, rate]
+        return float(self._take(keys=[self.prefix + key for key, capacity, rate in buckets], args=args))
+
+    def claim(self, key, ttl, now):
+        if self.client.set(self.prefix + key, PENDING, nx=True, ex=ttl):
+            return None
+        return self.client.get(self.prefix + key)
+
+    def put(self, key, value, ttl, now):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+def create_store(url=RATELIMIT_STORAGE_URL):
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        if redis is not None:
+            return RedisStore(url)
+        print("警告: 未安装 redis，限流改用进程内存储（pip install redis）")
+    return MemoryStore()
+
+
+store = create_store()
+
+
+def contact_hash(contact):
+    """联系方式去掉空格、横线并转小写后取哈希，存储中不保存原文"""
+    normalized = re.sub(r'[\s\-]', '', str(contact or '')).lower()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+
+
+def _retry_after(wait):
+    return {'Retry-After': str(max(1, int(wait + 0.999)))}
+
+
+def admit(ip_address, data, idempotency_key):
+    """提交前检查（必填字段验证之后调用）
+
+    放行时返回 None，否则返回 (状态码, 响应内容, 响应头)：
+    重复提交时为第一次的响应，第一次还在处理时为 409，超出频率时为 429
+    """
+    if not RATELIMIT_ENABLED:
+        return None
+    if idempotency_key is not None and len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return 400, {'success': False, 'message': '无效的Idempotency-Key'}, {}
+
+    now = time.time()
+    try:
+        if idempotency_key:
+            saved = store.claim('idem:' + idempotency_key, IDEMPOTENCY_TTL, now)
+            if saved == PENDING:
+                return 409, {'success': False, 'message': '相同的提交正在处理，请稍候'}, {}
+            if saved is not None:
+                return 200, json.loads(saved), {'Idempotent-Replayed': 'true'}
+
+        # 两个桶都有令牌时才同时扣减，被联系方式桶拒绝的提交不会消耗 IP 桶的令牌
+        wait = store.take_tokens([
+            ('ip:' + str(ip_address), RATELIMIT_IP_BURST, RATELIMIT_IP_PER_HOUR / 3600),
+            ('contact:' + contact_hash(data.get('text')), RATELIMIT_CONTACT_BURST, RATELIMIT_CONTACT_PER_HOUR / 3600),
+        ], now)
+        if wait:
+            if idempotency_key:
+                store.delete('idem:' + idempotency_key)
+            return 429, {'success': False, 'message': '提交过于频繁，请稍后再试'}, _retry_after(wait)
+    except Exception as e:
+        print(f"限流检查失败（已放行）: {e}")
+    return None
+
+
+def remember(idempotency_key, body):
+    """保存成功提交的响应内容，同一个键再次提交时原样返回"""
+    if not RATELIMIT_ENABLED or not idempotency_key:
+        return
+    try:
+        store.put('idem:' + idempotency_key, json.dumps(body, ensure_ascii=False), IDEMPOTENCY_TTL, time.time())
+    except Exception as e:
+        print(f"保存幂等键失败: {e}")
+
+
+def forget(idempotency_key):
+    """提交失败时释放幂等键，允许用同一个键重试"""
+    if not RATELIMIT_ENABLED or not idempotency_key:
+        return
+    try:
+        store.delete('idem:' + idempotency_key)
+    except Exception as e:
+        print(f"释放幂等键失败: {e}")
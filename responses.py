@@ -0,0 +1,207 @@
+"""
+接口响应的序列化与压缩
+- JSON：安装了 orjson 时用 orjson 编码，否则用标准库；中文不转义为 \\uXXXX，键排序、紧凑格式。
+  Flask 的 jsonify 与 asyncio 版本共用 encode_json，两边返回的字节完全一致
+- 压缩：JSON、CSV、NDJSON、HTML 等文本响应按 Accept-Encoding 选择 br（安装了 brotli 时）或 gzip；
+  已带 Content-Encoding 的响应（预压缩的静态文件）、直接发送的文件、gzip 导出和 SSE 不再压缩
+"""
+
+import json
+import zlib
+
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import parse_accept_header
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 导入配置
+try:
+    from config import COMPRESS_ENABLED, COMPRESS_MIN_SIZE, COMPRESS_LEVEL, COMPRESS_BROTLI_QUALITY
+except ImportError:
+    COMPRESS_ENABLED = True        # 关闭后接口响应不压缩（前面的反向代理负责压缩时）
+    COMPRESS_MIN_SIZE = 1024       # 小于该字节数的响应不压缩
+    COMPRESS_LEVEL = 3             # gzip 压缩级别（1~9），动态响应每次都要压缩，3 级以一半的耗时得到接近 6 级的压缩率
+    COMPRESS_BROTLI_QUALITY = 4    # brotli 压缩质量（0~11），动态响应用较低的质量换取速度
+
+# 需要压缩的响应类型
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'text/csv',
+    'text/html',
+    'text/plain',
+}
+
+if orjson is not None:
+    # datetime 交给 default 处理，与 Flask 默认的格式保持一致
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def encode_json(data):
+    """编码为 UTF-8 JSON 字节串"""
+    if orjson is not None:
+        return orjson.dumps(data, default=DefaultJSONProvider.default, option=_ORJSON_OPTIONS)
+    return json.dumps(data, default=DefaultJSONProvider.default, ensure_ascii=False, sort_keys=True,
+                      separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify 使用 encode_json，响应体末尾带换行（与 Flask 默认一致）"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return encode_json(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encode_json(obj) + b'\n', mimetype=self.mimetype)
+
+
+# ---- 压缩 ----
+
+class _BrotliCompressor:
+    """与 zlib 压缩对象相同的 compress/flush 接口"""
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def make_compressor(encoding):
+    if encoding == 'br':
+        return _BrotliCompressor()
+    return zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def choose_encoding(accept_encodings):
+    """按客户端的 Accept-Encoding（werkzeug Accept 对象）选择编码，同等优先时选 br；不接受压缩时返回 None"""
+    if not COMPRESS_ENABLED:
+        return None
+    candidates = (('br', 'gzip') if brotli is not None else ('gzip',))
+    best, best_quality = None, 0
+    for encoding in candidates:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(mimetype):
+    return (mimetype or '').split(';')[0].strip().lower() in COMPRESSIBLE_MIMETYPES
+
+
+def compress_bytes(data, encoding):
+    compressor = make_compressor(encoding)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """流式压缩，结束或客户端断开时关闭原始数据块生成器（释放导出游标）"""
+    compressor = make_compressor(encoding)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def init_app(app):
+    """使用 FastJSONProvider，并注册响应压缩钩子"""
+    app.json = FastJSONProvider(app)
+
+    @app.after_request
+    def compress_response(response):
+        if not is_compressible(response.mimetype):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if (encoding is None or response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < COMPRESS_MIN_SIZE:
+                return response
+            response.set_data(compress_bytes(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+
+        # 压缩后的内容与原文不同，强 ETag 改为弱 ETag（If-None-Match 按弱比较，仍能返回 304）
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+class ASGICompressor:
+    """包装 ASGI 的 send，压缩规则与 Flask 钩子相同：
+    单块响应体在小于 COMPRESS_MIN_SIZE 时原样发送，否则整体压缩并改写 Content-Length；流式响应逐块压缩"""
+
+    def __init__(self, send, accept_encoding):
+        self.send = send
+        self.encoding = choose_encoding(parse_accept_header(accept_encoding))
+        self.start = None
+        self.compressor = None
+
+    async def __call__(self, message):
+        if message['type'] == 'http.response.start':
+            headers = {name.lower(): value for name, value in message['headers']}
+            if not is_compressible(headers.get(b'content-type', b'').decode('latin-1')):
+                return await self.send(message)
+            if b'vary' not in headers:
+                message = dict(message, headers=message['headers'] + [(b'vary', b'Accept-Encoding')])
+            if self.encoding is None or message['status'] != 200 or b'content-encoding' in headers:
+                return await self.send(message)
+            # 等拿到第一块响应体再决定是否压缩
+            self.start = message
+            return
+
+        if message['type'] != 'http.response.body':
+            return await self.send(message)
+
+        body = message.get('body', b'')
+        more_body = message.get('more_body', False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            if not more_body and len(body) < COMPRESS_MIN_SIZE:
+                await self.send(start)
+                return await self.send(message)
+            headers = [(name, value) for name, value in start['headers'] if name.lower() != b'content-length']
+            headers.append((b'content-encoding', self.encoding.encode()))
+            if not more_body:
+                body = compress_bytes(body, self.encoding)
+                headers.append((b'content-length', str(len(body)).encode()))
+                await self.send(dict(start, headers=headers))
+                return await self.send({'type': 'http.response.body', 'body': body})
+            self.compressor = make_compressor(self.encoding)
+            await self.send(dict(start, headers=headers))
+
+        if self.compressor is not None:
+            body = self.compressor.compress(body)
+            if not more_body:
+                body += self.compressor.flush()
+            return await self.send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+        await self.send(message)
@@ -0,0 +1,129 @@
+"""
+按时间段汇总的咨询数量（小时 / 日 / 周 / 月 × 咨询类型 × 状态）
+- consultation_rollups 表由触发器随新增、修改（类型、状态、提交时间）、删除增量维护，不需要定时任务（建表与触发器见迁移 9）
+- 时间段按北京时间（提交时间本身就是北京时间字符串）：小时 'YYYY-MM-DD HH:00'、日 'YYYY-MM-DD'、
+  周为周一日期 'YYYY-MM-DD'、月 'YYYY-MM'；不同年份的同一周不会混在一起
+- GET /api/trends 只读汇总表，查询几年的数据也只需要读几百到几千行
+"""
+
+from datetime import datetime, timedelta
+
+from stats import beijing_tz
+
+# 导入配置
+try:
+    from config import TRENDS_MAX_BUCKETS
+except ImportError:
+    TRENDS_MAX_BUCKETS = 2000  # 一次趋势查询最多返回的时间段数
+
+# 时间段的格式，与迁移 9 中触发器算出的时间段一致
+BUCKET_FORMATS = {'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d', 'week': '%Y-%m-%d', 'month': '%Y-%m'}
+
+# 不指定时间范围时，返回截至当前时间段的最近多少个时间段
+DEFAULT_BUCKETS = {'hour': 48, 'day': 30, 'week': 26, 'month': 24}
+
+# 可以按其分组、筛选的维度
+DIMENSIONS = ('consultation_type', 'status')
+
+
+def _floor(granularity, moment):
+    """所在时间段的起点"""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    moment = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'week':
+        return moment - timedelta(days=moment.weekday())
+    if granularity == 'month':
+        return moment.replace(day=1)
+    return moment
+
+
+def _step(granularity, moment, count=1):
+    """向后（count 为负时向前）移动 count 个时间段"""
+    if granularity == 'hour':
+        return moment + timedelta(hours=count)
+    if granularity == 'day':
+        return moment + timedelta(days=count)
+    if granularity == 'week':
+        return moment + timedelta(weeks=count)
+    months = moment.year * 12 + moment.month - 1 + count
+    return moment.replace(year=months // 12, month=months % 12 + 1)
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'无效的日期: {value}')
+
+
+def bucket_range(granularity, start_date=None, end_date=None, now=None):
+    """start_date ~ end_date（含当天，北京时间）覆盖的全部时间段；不指定时为截至当前的最近几个时间段"""
+    if end_date:
+        last = _floor(granularity, _parse_date(end_date).replace(hour=23))
+    else:
+        now = now or datetime.now(beijing_tz)
+        last = _floor(granularity, now.astimezone(beijing_tz).replace(tzinfo=None))
+    if start_date:
+        first = _floor(granularity, _parse_date(start_date))
+    else:
+        first = _step(granularity, last, 1 - DEFAULT_BUCKETS[granularity])
+    if first > last:
+        raise ValueError('start_date不能晚于end_date')
+
+    buckets = []
+    moment = first
+    while moment <= last:
+        if len(buckets) >= TRENDS_MAX_BUCKETS:
+            raise ValueError(f'时间段过多（最多{TRENDS_MAX_BUCKETS}个），请缩小时间范围或改用更粗的粒度')
+        buckets.append(moment.strftime(BUCKET_FORMATS[granularity]))
+        moment = _step(granularity, moment)
+    return buckets
+
+
+def trends(cursor, args, now=None):
+    """按时间段计数
+
+    granularity 为 hour / day / week / month（默认 day），start_date / end_date 为日期范围（含当天），
+    by 为 consultation_type 或 status 时按该维度分别返回，consultation_type / status 可筛选；
+    没有提交的时间段计为 0
+    """
+    granularity = args.get('granularity') or 'day'
+    if granularity not in BUCKET_FORMATS:
+        raise ValueError(f"无效的granularity参数，可选: {', '.join(BUCKET_FORMATS)}")
+    by = args.get('by') or None
+    if by is not None and by not in DIMENSIONS:
+        raise ValueError(f"无效的by参数，可选: {', '.join(DIMENSIONS)}")
+    buckets = bucket_range(granularity, args.get('start_date'), args.get('end_date'), now)
+
+    conditions = ['granularity = ?', 'bucket BETWEEN ? AND ?']
+    params = [granularity, buckets[0], buckets[-1]]
+    for field in DIMENSIONS:
+        if args.get(field):
+            conditions.append(f'{field} = ?')
+            params.append(args[field])
+    group = by or "''"
+    cursor.execute(f'''
+        SELECT bucket, {group}, SUM(count) FROM consultation_rollups
+        WHERE {' AND '.join(conditions)}
+        GROUP BY bucket, {group}
+    ''', params)
+
+    positions = {bucket: position for position, bucket in enumerate(buckets)}
+    total = [0] * len(buckets)
+    series = {}
+    for bucket, name, count in cursor.fetchall():
+        if not count:
+            continue
+        position = positions.get(bucket)
+        if position is None:
+            continue
+        total[position] += count
+        if by is not None:
+            series.setdefault(name, [0] * len(buckets))[position] = count
+
+    result = {'granularity': granularity, 'buckets': buckets, 'total': total}
+    if by is not None:
+        result['by'] = by
+        result['series'] = series
+    return result
@@ -273,49 +273,12 @@ document.addEventListener('DOMContentLoaded', function() {
                         );
                     });
                     
+                    // 只记录坐标；IP 对应的国家、省份、城市由后端在写入时用离线数据库解析，不再调用第三方接口
                     const { latitude, longitude } = position.coords;
                     deviceInfo.location = `${latitude.toFixed(6)},${longitude.toFixed(6)}`;
                     console.log('获取到地理坐标:', deviceInfo.location);
-                    
-                    // 尝试将坐标转换为可读地址
-                    try {
-                        const response = await fetch(`https://nominatim.openstreetmap.org/reverse?format=json&lat=${latitude}&lon=${longitude}&zoom=18&addressdetails=1`);
-                        const data = await response.json();
-                        if (data && data.display_name) {
-                            deviceInfo.location = data.display_name;
-                            console.log('地址解析成功:', deviceInfo.location);
-                        }
-                    } catch (geoError) {
-                        console.log('无法转换坐标为地址:', geoError);
-                    }
                 } catch (error) {
                     console.log('无法获取地理位置:', error);
-                    // 尝试通过多个IP API获取大致位置
-                    const ipApis = [
-                        'https://ipapi.co/json/',
-                        'https://ip-api.com/json/',
-                        'https://ipinfo.io/json'
-                    ];
-                    
-                    for (const api of ipApis) {
-                        try {
-                            const response = await fetch(api);
-                            const data = await response.json();
-                            
-                            if (data) {
-                                if (data.city && data.country) {
-                                    const region = data.region || data.regionName || data.region_name || '';
-                                    const country = data.country_name || data.country || '';
-                                    deviceInfo.location = `${data.city}${region ? ', ' + region : ''}${country ? ', ' + country : ''}`;
-                                    console.log('通过IP获取位置成功:', deviceInfo.location);
-                                    break;
-                                }
-                            }
-                        } catch (ipError) {
-                            console.log(`尝试API ${api} 失败:`, ipError);
-                            continue;
-                        }
-                    }
                 }
             }
             
@@ -377,10 +340,17 @@ document.addEventListener('DOMContentLoaded', function() {
             const BACKEND_URL = isGitHubPages ? 'https://sml25-backend.onrender.com' : 'http://localhost:5002';
             
             if (!isGitHubPages) {
+                // 同一次填写重试或重复点击时沿用同一个幂等键，后端只保存一次
+                if (!form.dataset.idempotencyKey) {
+                    form.dataset.idempotencyKey = window.crypto && crypto.randomUUID
+                        ? crypto.randomUUID()
+                        : Date.now().toString(36) + Math.random().toString(36).slice(2);
+                }
                 fetch(`${BACKEND_URL}/submit_consultation`, {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
+                        'Idempotency-Key': form.dataset.idempotencyKey,
                     },
                     body: JSON.stringify(data)
                 })
@@ -389,6 +359,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     if (result.success) {
                         showNotification('您的提交已经成功！我们会尽快与您联系。也欢迎您加我们的客服微信：kaiwen251899，谢谢您！', 'success');
                         form.reset();
+                        delete form.dataset.idempotencyKey;
                     } else {
                         showNotification('提交失败: ' + result.message, 'error');
                     }
@@ -432,23 +403,8 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-// 获取IP地址
-async function getIPAddress() {
-    try {
-        const response = await fetch('https://api.ipify.org?format=json');
-        const data = await response.json();
-        return data.ip;
-    } catch (error) {
-        console.error('获取IP地址失败:', error);
-        return '';
-    }
-}
-
-// 初始化表单跟踪
+// 初始化表单跟踪（IP 地址由后端从请求中获取）
 async function initForms() {
-    // 获取IP地址
-    const ip = await getIPAddress();
-    
     // 为联系表单添加事件监听器
     if (contactForm) {
         trackFormFocus(contactForm, 'contactForm');
@@ -467,7 +423,6 @@ async function initForms() {
             try {
                 // 获取设备信息
                 const deviceInfo = await getDeviceInfo();
-                deviceInfo.ip_address = ip;
                 
                 const formData = new FormData(this);
                 const data = Object.fromEntries(formData);
@@ -530,7 +485,6 @@ async function initForms() {
             try {
                 // 获取设备信息
                 const deviceInfo = await getDeviceInfo();
-                deviceInfo.ip_address = ip;
                 
                 const formData = new FormData(this);
                 const data = Object.fromEntries(formData);
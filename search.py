@@ -0,0 +1,194 @@
+"""
+咨询全文搜索
+consultations_fts（FTS5，trigram 分词）由触发器与 consultations 表保持同步。
+trigram 按连续三个字符建索引，中文不需要分词词典，任意位置的子串都能命中；
+不足三个字的关键词（如两个字的姓名、城市）无法走索引，改用 LIKE 逐行匹配；
+含有这类关键词时，扫描超过 SEARCH_SCAN_TIMEOUT_MS 后中止并返回已找到的结果（truncated 为 true）
+"""
+
+import html
+import re
+import sqlite3
+import time
+
+import query
+from consultations import format_rows
+
+# 导入配置
+try:
+    from config import SEARCH_RANK_LIMIT
+except ImportError:
+    SEARCH_RANK_LIMIT = 5000  # 命中行数不超过该值时按相关度排序，否则按时间倒序（相关度需要为全部命中行打分）
+
+try:
+    from config import SEARCH_SCAN_TIMEOUT_MS
+except ImportError:
+    SEARCH_SCAN_TIMEOUT_MS = 200  # 含有不足三个字的关键词时，逐行扫描的最长时间
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_QUERY_LENGTH = 100
+
+# 参与搜索的列（全文索引、同步触发器与 bm25 权重见 migrations.py 的迁移 5）
+SEARCH_COLUMNS = ('name', 'contact', 'city', 'message')
+
+# trigram 能建索引的最短关键词长度
+MIN_INDEXED_LENGTH = 3
+
+# 咨询内容摘要的字数
+SNIPPET_CHARS = 60
+
+
+def parse_terms(args):
+    """解析搜索关键词（空格分隔，全部命中才返回），去重并保持顺序"""
+    text = (args.get('q') or '').strip()
+    if not text:
+        raise ValueError('缺少搜索关键词')
+    if len(text) > MAX_QUERY_LENGTH:
+        raise ValueError(f'搜索关键词不能超过{MAX_QUERY_LENGTH}个字')
+    return list(dict.fromkeys(text.split()))
+
+
+def parse_offset(args):
+    try:
+        return max(0, int(args.get('offset', 0)))
+    except (TypeError, ValueError):
+        raise ValueError('无效的offset参数')
+
+
+def parse_page_size(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError('无效的limit参数')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def match_expression(terms):
+    """每个关键词作为一个短语，用双引号包起来，避免被当作 FTS5 语法（AND、*、: 等）"""
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def like_condition(term, params):
+    """不足三个字的关键词：任一搜索列包含即可"""
+    pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    params.extend([pattern] * len(SEARCH_COLUMNS))
+    return '(' + ' OR '.join(f"consultations.{column} LIKE ? ESCAPE '\\'" for column in SEARCH_COLUMNS) + ')'
+
+
+def is_selective(cursor, expression):
+    """命中行数是否不超过 SEARCH_RANK_LIMIT（只数到上限为止）"""
+    cursor.execute('''
+        SELECT COUNT(*) FROM (
+            SELECT rowid FROM consultations_fts WHERE consultations_fts MATCH ? LIMIT ?
+        )
+    ''', (expression, SEARCH_RANK_LIMIT + 1))
+    return cursor.fetchone()[0] <= SEARCH_RANK_LIMIT
+
+
+def build_search_query(cursor, args):
+    """生成搜索 SQL，返回 (sql, 参数, 每页条数, 偏移量, 是否按相关度排序, 关键词)"""
+    terms = parse_terms(args)
+    limit = parse_page_size(args)
+    offset = parse_offset(args)
+    indexed = [term for term in terms if len(term) >= MIN_INDEXED_LENGTH]
+    short = [term for term in terms if len(term) < MIN_INDEXED_LENGTH]
+
+    conditions, params = query.build_filters(args, prefix='consultations.')
+    for term in short:
+        conditions.append(like_condition(term, params))
+
+    if indexed:
+        expression = match_expression(indexed)
+        ranked = is_selective(cursor, expression)
+        conditions.insert(0, 'consultations_fts MATCH ?')
+        params.insert(0, expression)
+        source = 'consultations_fts JOIN consultations ON consultations.id = consultations_fts.rowid'
+        order = 'consultations_fts.rank' if ranked else 'consultations_fts.rowid DESC'
+    else:
+        ranked = False
+        source = 'consultations'
+        order = 'consultations.timestamp DESC, consultations.id DESC'
+
+    sql = f"SELECT consultations.* FROM {source} WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ? OFFSET ?"
+    params.extend([limit + 1, offset])
+    return sql, params, limit, offset, ranked, terms
+
+
+def highlight(text, pattern):
+    """HTML 转义后用 <mark> 标出命中的关键词"""
+    if not text:
+        return ''
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return ''.join(parts)
+
+
+def snippet(text, pattern):
+    """截取第一个命中位置附近的一段文字"""
+    if not text or len(text) <= SNIPPET_CHARS:
+        return highlight(text, pattern)
+    match = pattern.search(text)
+    start = max(0, match.start() - SNIPPET_CHARS // 3) if match else 0
+    end = min(len(text), start + SNIPPET_CHARS)
+    start = max(0, end - SNIPPET_CHARS)
+    return ('…' if start else '') + highlight(text[start:end], pattern) + ('…' if end < len(text) else '')
+
+
+def fetch_with_deadline(conn, cursor, sql, params, limit):
+    """逐行扫描的查询：超时后中止，返回 (已找到的行, 是否中止)"""
+    deadline = time.monotonic() + SEARCH_SCAN_TIMEOUT_MS / 1000
+    conn.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+    rows = []
+    try:
+        cursor.execute(sql, params)
+        while len(rows) <= limit:
+            batch = cursor.fetchmany(limit + 1 - len(rows))
+            if not batch:
+                break
+            rows.extend(batch)
+        return rows, False
+    except sqlite3.OperationalError as e:
+        if 'interrupted' not in str(e):
+            raise
+        return rows, True
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def search(conn, args):
+    """全文搜索，返回 consultations（带 highlight）/ has_more / next_offset / ranked / truncated；
+    参数无效时抛出 ValueError"""
+    cursor = conn.cursor()
+    sql, params, limit, offset, ranked, terms = build_search_query(cursor, args)
+
+    if all(len(term) >= MIN_INDEXED_LENGTH for term in terms):
+        cursor.execute(sql, params)
+        rows, truncated = cursor.fetchall(), False
+    else:
+        rows, truncated = fetch_with_deadline(conn, cursor, sql, params, limit)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.I)
+    results = format_rows(cursor, rows)
+    for result in results:
+        result['highlight'] = {
+            'name': highlight(result['name'], pattern),
+            'contact': highlight(result['contact'], pattern),
+            'city': highlight(result['city'], pattern),
+            'message': snippet(result['message'], pattern),
+        }
+
+    return {
+        'consultations': results,
+        'has_more': has_more,
+        'next_offset': offset + limit if has_more else None,
+        'ranked': ranked,
+        'truncated': truncated,
+    }
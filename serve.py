@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+生产环境启动脚本
+Linux/macOS 使用 gunicorn 多进程；Windows 上没有 fork，使用 waitress 多线程
+
+用法: python serve.py
+工作进程数、线程数可用环境变量 WORKERS、THREADS 覆盖，默认值见 config.py 的 SERVER_*
+"""
+
+import os
+import sys
+
+# 导入配置
+try:
+    from config import SERVER_BIND, SERVER_THREADS
+except ImportError:
+    SERVER_BIND = "0.0.0.0:5002"
+    SERVER_THREADS = 4
+
+
+def serve_gunicorn():
+    """替换当前进程为 gunicorn 主进程，信号（HUP 重载、TERM 停止）直接发给它"""
+    os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'])
+
+
+def serve_waitress():
+    from waitress import serve
+    from wsgi import app
+
+    host, port = os.environ.get('BIND', SERVER_BIND).rsplit(':', 1)
+    serve(app, host=host, port=int(port), threads=int(os.environ.get('THREADS', SERVER_THREADS)) * 2)
+
+
+def main():
+    print("=" * 50)
+    print("生命力教育咨询 - 后台管理系统（生产模式）")
+    print("=" * 50)
+    print(f"🌐 监听地址: {os.environ.get('BIND', SERVER_BIND)}")
+    print("❤️  健康检查: /healthz   就绪检查: /readyz")
+
+    if os.name != 'nt':
+        try:
+            import gunicorn  # noqa: F401
+            serve_gunicorn()
+        except ImportError:
+            print("⚠️  未安装 gunicorn，改用 waitress（pip install gunicorn）")
+
+    try:
+        serve_waitress()
+    except ImportError:
+        print("❌ 请安装 gunicorn（Linux/macOS）或 waitress（Windows）:")
+        print("pip install -r requirements_backend.txt")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
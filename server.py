@@ -1,105 +1,82 @@
-from flask import Flask, request, jsonify, render_template_string, Response, send_from_directory
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import sqlite3
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 import pytz
+import outbox
+import ingest
+import ratelimit
+import consultations
+import changes
+import search
+import stats
+import engagement
+import rollups
+import migrations
+import export
+import metrics
+import responses
+import pages
+import proxy
+import analytics
+from static_assets import send_static, STATIC_USE_X_SENDFILE
+from db import Database
+from smtp_pool import SMTPPool
 
 # 设置北京时间时区
 beijing_tz = pytz.timezone('Asia/Shanghai')
 import os
 
-app = Flask(__name__, static_folder='.', static_url_path='/static')
+# 静态文件统一由 serve_static 发送，不启用 Flask 自带的 /static 目录路由
+app = Flask(__name__, static_folder=None)
+app.config['USE_X_SENDFILE'] = STATIC_USE_X_SENDFILE
 CORS(app)
 
-# 静态文件路由
+# 部署在反向代理之后时从 X-Forwarded-For 取访客地址（config.py 的 PROXY_TRUSTED_HOPS），限流与地区解析按访客区分
+proxy.init_app(app)
+
+# 请求计时与 /metrics 指标（config.py 的 METRICS_*）
+metrics.init_app(app)
+
+# JSON 编码（安装了 orjson 时使用）与响应压缩（config.py 的 COMPRESS_*）；
+# 在计时钩子之后注册、先于它执行，指标中的响应大小为压缩后的大小
+responses.init_app(app)
+
+# 静态文件路由（支持 Range、ETag/Last-Modified 条件请求与长期缓存）
 @app.route('/<path:filename>')
 def serve_static(filename):
-    # 特别处理视频文件
-    if filename.endswith(('.mov', '.mp4', '.gif')):
-        response = send_from_directory('.', filename)
-        response.headers['Content-Type'] = 'video/quicktime' if filename.endswith('.mov') else 'video/mp4' if filename.endswith('.mp4') else 'image/gif'
-        return response
-    return send_from_directory('.', filename)
+    return send_static(filename)
 
 # 数据库配置
 DATABASE = 'consultations.db'
 
+# 每个线程复用一个已配置好的连接（WAL、缓存、忙等待等见 config.py 的 DB_*）
+database = Database(DATABASE, on_query=metrics.observe_query if metrics.METRICS_ENABLED else None)
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    database.release()
+
 def init_db():
-    """初始化数据库"""
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    # 检查表是否存在
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='consultations'")
-    table_exists = cursor.fetchone()
-    
-    if not table_exists:
-        # 创建新表
-        cursor.execute('''
-            CREATE TABLE consultations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                contact TEXT NOT NULL,
-                email TEXT,
-                city TEXT,
-                age_group TEXT,
-                consultation_type TEXT NOT NULL,
-                message TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                status TEXT DEFAULT '新提交',
-                device_model TEXT,
-                ip_address TEXT,
-                location TEXT,
-                browser TEXT,
-                fill_duration INTEGER,
-                browse_duration INTEGER
-            )
-        ''')
-    else:
-        # 检查是否需要更新表结构
-        cursor.execute("PRAGMA table_info(consultations)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        # 重命名phone列为contact
-        if 'phone' in columns and 'contact' not in columns:
-            cursor.execute('ALTER TABLE consultations RENAME COLUMN phone TO contact')
-            columns.remove('phone')
-            columns.append('contact')
-
-        # 添加缺少的列
-        required_columns = [
-            ('city', 'TEXT'),
-            ('age_group', 'TEXT'),
-            ('device_model', 'TEXT'),
-            ('ip_address', 'TEXT'),
-            ('location', 'TEXT'),
-            ('browser', 'TEXT'),
-            ('fill_duration', 'INTEGER'),
-            ('browse_duration', 'INTEGER')
-        ]
-        
-        for column_name, column_type in required_columns:
-            if column_name not in columns:
-                cursor.execute(f'ALTER TABLE consultations ADD COLUMN {column_name} {column_type}')
-    
-    conn.commit()
+    """初始化数据库（执行未应用的迁移，已是最新版本时只检查版本号）"""
+    conn = database.connect()
+    migrations.migrate(conn)
     conn.close()
 
-def send_email(consultation_data):
-    """发送邮件到指定邮箱"""
-    try:
-        # 邮件配置
-        sender_email = "kaiwen0151@163.com"  # 163邮箱
-        sender_password = "DTWUdNmQnLvNPYJC"   # 163邮箱授权码
-        receiver_email = "kaiwen0151@163.com"
-        
-        # 创建邮件内容
-        subject = f"新的咨询表单 - {consultation_data['name']}"
-        
-        body = f"""
+# 邮件配置
+SENDER_EMAIL = "kaiwen0151@163.com"  # 163邮箱
+SENDER_PASSWORD = "DTWUdNmQnLvNPYJC"   # 163邮箱授权码
+RECEIVER_EMAIL = "kaiwen0151@163.com"
+
+# 保持已登录的SMTP会话，多封邮件复用同一连接 - 使用163邮箱SMTP服务器
+smtp_pool = SMTPPool('smtp.163.com', 25, SENDER_EMAIL, SENDER_PASSWORD, observer=metrics.observe_smtp)
+
+def build_email(consultation_data):
+    """生成单条咨询的通知邮件"""
+    subject = f"新的咨询表单 - {consultation_data['name']}"
+    
+    body = f"""
         新的咨询表单提交：
         
         姓名: {consultation_data['name']}
@@ -109,158 +86,258 @@ def send_email(consultation_data):
         年龄段: {consultation_data.get('age_group', '未提供')}
         咨询类型: {consultation_data['consultation_type']}
         咨询内容: {consultation_data.get('description', '无')}
-        提交时间: {datetime.now(beijing_tz).strftime('%Y-%m-%d %H:%M:%S')}
+        提交时间: {consultation_data.get('submitted_at') or datetime.now(beijing_tz).strftime('%Y-%m-%d %H:%M:%S')}
         """
-        
-        # 创建邮件对象
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = receiver_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain', 'utf-8'))
-        
-        # 发送邮件 - 使用163邮箱SMTP服务器
-        server = smtplib.SMTP('smtp.163.com', 25)
-        server.starttls()
-        server.login(sender_email, sender_password)
-        text = msg.as_string()
-        server.sendmail(sender_email, receiver_email, text)
-        server.quit()
-        
-        return True
+    
+    # 创建邮件对象
+    msg = MIMEMultipart()
+    msg['From'] = SENDER_EMAIL
+    msg['To'] = RECEIVER_EMAIL
+    msg['Subject'] = subject
+    
+    msg.attach(MIMEText(body, 'plain', 'utf-8'))
+    return msg
+
+def build_digest_email(consultations):
+    """把多条咨询合并成一封摘要邮件"""
+    sections = []
+    for index, consultation_data in enumerate(consultations, 1):
+        sections.append(f"""
+        [{index}] {consultation_data['name']}（{consultation_data['consultation_type']}）
+        城市: {consultation_data.get('city', '未提供')}
+        联系方式: {consultation_data['text']}
+        邮箱: {consultation_data.get('email', '未提供')}
+        年龄段: {consultation_data.get('age_group', '未提供')}
+        咨询内容: {consultation_data.get('description', '无')}
+        提交时间: {consultation_data.get('submitted_at', '未知')}
+        """)
+    
+    msg = MIMEMultipart()
+    msg['From'] = SENDER_EMAIL
+    msg['To'] = RECEIVER_EMAIL
+    msg['Subject'] = f"新的咨询表单汇总 - 共{len(consultations)}条"
+    
+    msg.attach(MIMEText(f"新的咨询表单提交（共{len(consultations)}条）：\n" + ''.join(sections), 'plain', 'utf-8'))
+    return msg
+
+def send_email(consultation_data):
+    """发送邮件到指定邮箱"""
+    try:
+        return smtp_pool.send(SENDER_EMAIL, RECEIVER_EMAIL, build_email(consultation_data))
     except Exception as e:
         print(f"发送邮件失败: {e}")
         return False
 
+def send_email_batch(consultations):
+    """批量发送通知，摘要模式下合并成一封"""
+    try:
+        if outbox_dispatcher.digest_interval and len(consultations) > 1:
+            ok = smtp_pool.send(SENDER_EMAIL, RECEIVER_EMAIL, build_digest_email(consultations))
+            return [ok] * len(consultations)
+        messages = [build_email(consultation_data) for consultation_data in consultations]
+        return smtp_pool.send_many(SENDER_EMAIL, RECEIVER_EMAIL, messages)
+    except Exception as e:
+        print(f"发送邮件失败: {e}")
+        return [False] * len(consultations)
+
+# 统计数据缓存
+stats_cache = stats.StatsCache()
+
+# 邮件异步投递（每个进程一个后台线程）
+outbox_dispatcher = outbox.OutboxDispatcher(database, send_email_batch)
+
+@app.before_request
+def ensure_outbox_dispatcher():
+    outbox_dispatcher.ensure_running()
+
+# 表单提交的组提交写入线程（config.py 的 INGEST_*，默认关闭）
+ingest_writer = ingest.IngestWriter(database) if ingest.INGEST_ENABLED else None
+
+metrics.add_file_size_gauge(DATABASE)
+metrics.add_gauge('email_outbox_pending', '待发送的通知邮件数',
+                  lambda: outbox_dispatcher.stats(database.connection().cursor())['pending'])
+if ingest_writer is not None:
+    metrics.add_gauge('ingest_queue_depth', '等待批量写入的表单提交数', ingest_writer.depth)
+
 @app.route('/submit_consultation', methods=['POST'])
 def submit_consultation():
     """处理咨询表单提交"""
+    idempotency_key = request.headers.get('Idempotency-Key')
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': '请求内容必须是JSON对象'}), 400
+    
+    # 只有 admit() 占用了幂等键之后，失败时才释放；否则会删掉其他请求保存的结果
+    claimed = False
     try:
-        data = request.get_json()
-        
         # 验证必填字段（与前端表单一致）
-        required_fields = ['name', 'city', 'text', 'consultation_type', 'age_group', 'description']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'success': False, 'message': f'缺少必填字段: {field}'}), 400
-        
-        # 保存到数据库
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        # 获取客户端信息
-        ip_address = request.remote_addr
-        browser = request.user_agent.string
-        device_model = data.get('device_model', '')
-        location = data.get('location', '')
-        fill_duration = data.get('fill_duration', 0)
-        browse_duration = data.get('browse_duration', 0)
-
-        cursor.execute('''
-            INSERT INTO consultations (
-                name, contact, email, city, age_group, consultation_type, message, timestamp, 
-                device_model, ip_address, location, browser, fill_duration, browse_duration
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data['name'],
-            data['text'],  # 使用text字段作为联系方式
-            data.get('email', ''),
-            data.get('city', ''),
-            data.get('age_group', ''),
-            data['consultation_type'],
-            data.get('description', ''),  # 使用description字段作为咨询内容
-            datetime.now(beijing_tz).strftime('%Y-%m-%d %H:%M:%S'),
-            device_model,
-            ip_address,
-            location,
-            browser,
-            fill_duration,
-            browse_duration
-        ))
-        conn.commit()
-        conn.close()
-        
-        # 发送邮件通知
-        send_email(data)
-        
-        return jsonify({'success': True, 'message': '咨询表单提交成功！'})
+        field = consultations.missing_field(data)
+        if field:
+            return jsonify({'success': False, 'message': f'缺少必填字段: {field}'}), 400
+        
+        # 限流与重复提交检查，被拦下的请求不写数据库、不发邮件
+        rejected = ratelimit.admit(request.remote_addr, data, idempotency_key)
+        if rejected:
+            status, body, headers = rejected
+            return jsonify(body), status, headers
+        claimed = True
+        
+        # 保存到数据库（同时写入邮件发件箱）；开启组提交时由写入线程批量提交，提交后才返回
+        if ingest_writer is not None:
+            ingest_writer.write(data, request.remote_addr, request.user_agent.string)
+        else:
+            consultations.create(database.connection(), data, request.remote_addr, request.user_agent.string)
+        stats_cache.invalidate()
+        changes.notify_changed()
+        outbox_dispatcher.notify()
+        
+        body = {'success': True, 'message': '咨询表单提交成功！'}
+        ratelimit.remember(idempotency_key, body)
+        return jsonify(body)
         
     except Exception as e:
+        if claimed:
+            ratelimit.forget(idempotency_key)
         return jsonify({'success': False, 'message': f'提交失败: {str(e)}'}), 500
 
 @app.route('/api/consultations', methods=['GET'])
 def get_consultations():
-    """获取所有咨询数据"""
+    """分页获取咨询数据（支持筛选与游标翻页）"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
+        conn = database.connection()
+        try:
+            page = consultations.fetch_page(conn, request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        # 获取统计数据（单次扫描，短时间缓存）
+        stats, _ = stats_cache.get(conn.cursor())
+        
+        return jsonify({'success': True, **page, **stats})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'}), 500
+
+@app.route('/api/consultations/search', methods=['GET'])
+def search_consultations():
+    """全文搜索咨询（q=关键词，空格分隔；筛选参数同列表接口；offset/limit 翻页）"""
+    try:
+        try:
+            result = search.search(database.connection(), request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        return jsonify({'success': True, **result})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'搜索失败: {str(e)}'}), 500
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """增量获取咨询变更（since=上次返回的 cursor；不带 since 时只返回当前 cursor）"""
+    try:
+        try:
+            since = changes.parse_since(request.args.get('since'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        conn = database.connection()
+        changes.prune(conn)
+        return jsonify({'success': True, **changes.fetch_changes(conn, since)})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'}), 500
+
+@app.route('/api/changes/stream', methods=['GET'])
+def stream_changes():
+    """以 Server-Sent Events 推送咨询变更（断线重连时从 Last-Event-ID 继续）"""
+    try:
+        since = changes.parse_since(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    # 每个推送连接占用一个工作线程，名额已满时返回 503，后台页面改为轮询 /api/changes
+    if not changes.acquire_stream_slot():
+        return jsonify({'success': False, 'message': '推送连接已满，请改用轮询'}), 503, {'Retry-After': '60'}
+    try:
+        response = Response(
+            stream_with_context(changes.stream_events(database.connection(), since)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except Exception:
+        changes.release_stream_slot()
+        raise
+    # 连接结束（包括客户端断开）时由 WSGI 服务器调用 close()，归还名额
+    response.call_on_close(changes.release_stream_slot)
+    return response
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """存活检查：进程能处理请求即可"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """就绪检查：数据库可访问且已迁移到最新版本"""
+    try:
+        version = migrations.current_version(database.connection())
+        if version < migrations.LATEST_VERSION:
+            return jsonify({'status': 'migrating', 'schema_version': version}), 503
+        return jsonify({'status': 'ready', 'schema_version': version})
+    except Exception as e:
+        return jsonify({'status': 'unavailable', 'message': str(e)}), 503
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """获取统计数据（支持 ETag 条件请求）"""
+    try:
+        conn = database.connection()
         cursor = conn.cursor()
+        stats, etag = stats_cache.get(cursor)
+        
+        response = jsonify({'success': True, **stats})
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = stats_cache.ttl
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'}), 500
+
+@app.route('/api/engagement', methods=['GET'])
+def get_engagement():
+    """填写时长、浏览时长统计（整体、按类型、按日；支持 ETag 条件请求）"""
+    if not engagement.available():
+        return jsonify({'success': False, 'message': '未安装numpy，无法计算时长统计'}), 503
+    try:
+        result, etag = engagement.engagement_cache.get(database.connection().cursor())
         
-        # 获取所有咨询
-        cursor.execute('SELECT * FROM consultations ORDER BY timestamp DESC')
-        consultations = cursor.fetchall()
-        
-        # 获取统计数据
-        cursor.execute('SELECT COUNT(*) FROM consultations')
-        total = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM consultations WHERE DATE(timestamp) = DATE(datetime("now", "+8 hours"))')
-        today = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM consultations WHERE status = "新提交"')
-        pending = cursor.fetchone()[0]
-        
-        # 获取本周咨询数
-        cursor.execute('SELECT COUNT(*) FROM consultations WHERE strftime("%W", timestamp) = strftime("%W", datetime("now", "+8 hours"))')
-        this_week = cursor.fetchone()[0]
-        
-        # 获取本月咨询数
-        cursor.execute('SELECT COUNT(*) FROM consultations WHERE strftime("%Y-%m", timestamp) = strftime("%Y-%m", datetime("now", "+8 hours"))')
-        this_month = cursor.fetchone()[0]
-        
-        # 获取咨询类型统计
-        cursor.execute('SELECT consultation_type, COUNT(*) FROM consultations GROUP BY consultation_type')
-        type_stats = dict(cursor.fetchall())
-        
-        conn.close()
-        
-        # 格式化数据（基于列名，避免列顺序问题）
-        consultations_data = []
-        for row in consultations:
-            consultations_data.append({
-                'id': row['id'],
-                'name': row['name'],
-                'contact': row['contact'],
-                'email': row['email'],
-                'city': row['city'] if 'city' in row.keys() else '',
-                'age_group': row['age_group'] if 'age_group' in row.keys() else '',
-                'consultation_type': row['consultation_type'],
-                'message': row['message'],
-                'timestamp': row['timestamp'],
-                'status': row['status'],
-                'device_model': row['device_model'] if 'device_model' in row.keys() else '',
-                'ip_address': row['ip_address'] if 'ip_address' in row.keys() else '',
-                'location': row['location'] if 'location' in row.keys() else '',
-                'browser': row['browser'] if 'browser' in row.keys() else '',
-                'fill_duration': row['fill_duration'] if 'fill_duration' in row.keys() else 0,
-                'browse_duration': row['browse_duration'] if 'browse_duration' in row.keys() else 0
-            })
-        
-        return jsonify({
-            'success': True,
-            'consultations': consultations_data,
-            'total': total,
-            'today': today,
-            'pending': pending,
-            'this_week': this_week,
-            'this_month': this_month,
-            'type_stats': type_stats
-        })
+        response = jsonify({'success': True, **result})
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.max_age = engagement.engagement_cache.ttl
+        return response.make_conditional(request)
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'}), 500
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 指标"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/outbox', methods=['GET'])
+def get_outbox_stats():
+    """邮件发件箱队列深度与发送耗时"""
+    try:
+        conn = database.connection()
+        cursor = conn.cursor()
+        stats = outbox_dispatcher.stats(cursor)
+        return jsonify({'success': True, **stats})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取数据失败: {str(e)}'}), 500
+
 @app.route('/api/consultations/<int:consultation_id>', methods=['PUT'])
 def update_consultation_status(consultation_id):
     """更新咨询状态"""
@@ -271,11 +348,9 @@ def update_consultation_status(consultation_id):
         if not new_status:
             return jsonify({'success': False, 'message': '缺少状态参数'}), 400
         
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE consultations SET status = ? WHERE id = ?', (new_status, consultation_id))
-        conn.commit()
-        conn.close()
+        consultations.update_status(database.connection(), consultation_id, new_status)
+        stats_cache.invalidate()
+        changes.notify_changed()
         
         return jsonify({'success': True, 'message': '状态更新成功'})
         
@@ -286,695 +361,133 @@ def update_consultation_status(consultation_id):
 def delete_consultation(consultation_id):
     """删除咨询记录"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM consultations WHERE id = ?', (consultation_id,))
-        conn.commit()
-        conn.close()
+        consultations.delete(database.connection(), consultation_id)
+        stats_cache.invalidate()
+        changes.notify_changed()
         
         return jsonify({'success': True, 'message': '删除成功'})
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'删除失败: {str(e)}'}), 500
 
+@app.route('/api/consultations/bulk/status', methods=['POST'])
+def bulk_update_consultation_status():
+    """批量更新咨询状态（ids 或 filter 指定记录，一个事务内完成，返回每个 id 的结果）"""
+    try:
+        data = request.get_json()
+        new_status = data.get('status')
+        
+        if not new_status:
+            return jsonify({'success': False, 'message': '缺少状态参数'}), 400
+        
+        try:
+            result = consultations.bulk_update_status(database.connection(), data, new_status)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        stats_cache.invalidate()
+        changes.notify_changed()
+        
+        return jsonify({'success': True, 'message': f"已更新{result['succeeded']}条记录", **result})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'更新失败: {str(e)}'}), 500
+
+@app.route('/api/consultations/bulk/delete', methods=['POST'])
+def bulk_delete_consultations():
+    """批量删除咨询记录（ids 或 filter 指定记录，一个事务内完成，返回每个 id 的结果）"""
+    try:
+        data = request.get_json()
+        
+        try:
+            result = consultations.bulk_delete(database.connection(), data)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        stats_cache.invalidate()
+        changes.notify_changed()
+        
+        return jsonify({'success': True, 'message': f"已删除{result['succeeded']}条记录", **result})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'删除失败: {str(e)}'}), 500
+
 @app.route('/api/export', methods=['GET'])
 def export_consultations():
-    """导出咨询数据"""
+    """流式导出咨询数据（format=csv|ndjson，compress=gzip，筛选参数同列表接口）"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM consultations ORDER BY timestamp DESC')
-        consultations = cursor.fetchall()
-        conn.close()
-        
-        # 生成CSV格式数据（基于列名，避免列顺序问题）
-        csv_data = "ID,姓名,联系方式,邮箱,城市,年龄段,咨询类型,咨询内容,提交时间,状态\n"
-        for row in consultations:
-            city = row['city'] if 'city' in row.keys() else ''
-            age_group = row['age_group'] if 'age_group' in row.keys() else ''
-            csv_data += f"{row['id']},{row['name']},{row['contact']},{row['email']},{city},{age_group},{row['consultation_type']},{row['message']},{row['timestamp']},{row['status']}\n"
+        try:
+            chunks, mimetype, filename = export.export_stream(database.connection(), request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
         return Response(
-            csv_data,
-            mimetype='text/csv',
-            headers={'Content-Disposition': 'attachment; filename=consultations.csv'}
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
         )
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'导出失败: {str(e)}'}), 500
 
+@app.route('/api/trends', methods=['GET'])
+def get_trends():
+    """按小时/日/周/月的提交数量趋势（granularity、start_date、end_date、by、consultation_type、status），读汇总表"""
+    try:
+        try:
+            result = rollups.trends(database.connection().cursor(), request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        
+        return jsonify({'success': True, **result})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取趋势失败: {str(e)}'}), 500
+
+@app.route('/api/reports/snapshot', methods=['POST'])
+def build_analytics_snapshot():
+    """生成或更新分析快照（full=1 时全部重写）"""
+    if not analytics.available():
+        return jsonify({'success': False, 'message': '未安装pyarrow/numpy，无法生成分析快照'}), 503
+    try:
+        result = analytics.build_snapshot(database.connection(), full=request.args.get('full') == '1')
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'生成快照失败: {str(e)}'}), 500
+
+@app.route('/api/reports/counts', methods=['GET'])
+def report_counts():
+    """按时间段和维度计数（by=维度，period=day|week|month，筛选参数同列表接口），只读分析快照"""
+    return _report(analytics.count_by)
+
+@app.route('/api/reports/durations', methods=['GET'])
+def report_durations():
+    """填写时长/浏览时长的均值与分位数（column、percentiles=50,90,99、by 可选），只读分析快照"""
+    return _report(analytics.duration_percentiles)
+
+def _report(query_report):
+    if not analytics.available():
+        return jsonify({'success': False, 'message': '未安装pyarrow/numpy，无法查询分析快照'}), 503
+    try:
+        try:
+            result = query_report(request.args)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        except RuntimeError as e:
+            # 还没有生成快照
+            return jsonify({'success': False, 'message': str(e)}), 503
+        
+        return jsonify({'success': True, **result})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'查询报表失败: {str(e)}'}), 500
+
 @app.route('/admin')
 def admin():
-    """后台管理页面"""
-    return render_template_string('''
-    <!DOCTYPE html>
-    <html lang="zh-CN">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>后台管理系统 - 生命力教育咨询</title>
-        <style>
-            * {
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }
-
-            body {
-                font-family: 'Arial', sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            }
-
-            .login-container {
-                background: rgba(255, 255, 255, 0.95);
-                backdrop-filter: blur(10px);
-                padding: 40px;
-                border-radius: 15px;
-                box-shadow: 0 20px 40px rgba(0, 0, 0, 0.1);
-                width: 100%;
-                max-width: 400px;
-            }
-
-            .login-header {
-                text-align: center;
-                margin-bottom: 30px;
-            }
-
-            .login-header h1 {
-                color: #333;
-                font-size: 24px;
-                margin-bottom: 10px;
-            }
-
-            .login-header p {
-                color: #666;
-                font-size: 14px;
-            }
-
-            .form-group {
-                margin-bottom: 20px;
-            }
-
-            .form-group label {
-                display: block;
-                margin-bottom: 8px;
-                color: #333;
-                font-weight: 600;
-            }
-
-            .form-group input {
-                width: 100%;
-                padding: 12px 15px;
-                border: 2px solid #e1e5e9;
-                border-radius: 8px;
-                font-size: 16px;
-                transition: border-color 0.3s ease;
-            }
-
-            .form-group input:focus {
-                outline: none;
-                border-color: #667eea;
-            }
-
-            .login-btn {
-                width: 100%;
-                padding: 12px;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                border: none;
-                border-radius: 8px;
-                font-size: 16px;
-                font-weight: 600;
-                cursor: pointer;
-                transition: transform 0.2s ease;
-            }
-
-            .login-btn:hover {
-                transform: translateY(-2px);
-            }
-
-            .error-message {
-                color: #e74c3c;
-                text-align: center;
-                margin-top: 15px;
-                font-size: 14px;
-                display: none;
-            }
-
-            .dashboard {
-                display: none;
-                background: rgba(255, 255, 255, 0.95);
-                backdrop-filter: blur(10px);
-                padding: 30px;
-                border-radius: 15px;
-                box-shadow: 0 20px 40px rgba(0, 0, 0, 0.1);
-                width: 100%;
-                max-width: 1200px;
-                max-height: 80vh;
-                overflow-y: auto;
-            }
-
-            .dashboard-header {
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                margin-bottom: 30px;
-                padding-bottom: 20px;
-                border-bottom: 2px solid #e1e5e9;
-            }
-
-            .dashboard-header h1 {
-                color: #333;
-                font-size: 28px;
-            }
-
-            .logout-btn {
-                padding: 10px 20px;
-                background: #e74c3c;
-                color: white;
-                border: none;
-                border-radius: 6px;
-                cursor: pointer;
-                font-weight: 600;
-            }
-
-            .stats-grid {
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(250px, 1fr));
-                gap: 20px;
-                margin-bottom: 30px;
-            }
-
-            .stat-card {
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 20px;
-                border-radius: 10px;
-                text-align: center;
-            }
-
-            .stat-card h3 {
-                font-size: 24px;
-                margin-bottom: 10px;
-            }
-
-            .stat-card p {
-                font-size: 14px;
-                opacity: 0.9;
-            }
-
-            .consultations-table {
-                width: 100%;
-                border-collapse: collapse;
-                margin-top: 20px;
-            }
-
-            .consultations-table th,
-            .consultations-table td {
-                padding: 12px;
-                text-align: left;
-                border-bottom: 1px solid #e1e5e9;
-            }
-
-            .consultations-table th {
-                background: #f8f9fa;
-                font-weight: 600;
-                color: #333;
-            }
-
-            .consultations-table tr:hover {
-                background: #f8f9fa;
-            }
-
-            .refresh-btn {
-                padding: 10px 20px;
-                background: #27ae60;
-                color: white;
-                border: none;
-                border-radius: 6px;
-                cursor: pointer;
-                font-weight: 600;
-                margin-bottom: 20px;
-            }
-
-            .no-data {
-                text-align: center;
-                color: #666;
-                padding: 40px;
-                font-size: 16px;
-            }
-            
-            .action-buttons {
-                display: flex;
-                gap: 15px;
-                margin-bottom: 20px;
-                flex-wrap: wrap;
-            }
-            
-            .action-btn {
-                padding: 10px 20px;
-                border: none;
-                border-radius: 6px;
-                cursor: pointer;
-                font-weight: 600;
-                transition: all 0.3s ease;
-            }
-            
-            .export-btn {
-                background: #27ae60;
-                color: white;
-            }
-            
-            .refresh-btn {
-                background: #3498db;
-                color: white;
-            }
-            
-            .filter-btn {
-                background: #f39c12;
-                color: white;
-            }
-            
-            .action-btn:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 4px 8px rgba(0,0,0,0.2);
-            }
-            
-            .filters-panel {
-                background: #f8f9fa;
-                padding: 20px;
-                border-radius: 8px;
-                margin-bottom: 20px;
-                border: 1px solid #e1e5e9;
-            }
-            
-            .filter-group {
-                display: inline-block;
-                margin-right: 20px;
-                margin-bottom: 10px;
-            }
-            
-            .filter-group label {
-                display: block;
-                margin-bottom: 5px;
-                font-weight: 600;
-                color: #333;
-            }
-            
-            .filter-group select,
-            .filter-group input {
-                padding: 8px 12px;
-                border: 1px solid #ddd;
-                border-radius: 4px;
-                font-size: 14px;
-            }
-            
-            .status-badge {
-                padding: 4px 8px;
-                border-radius: 12px;
-                font-size: 12px;
-                font-weight: 600;
-                text-align: center;
-            }
-            
-            .status-new {
-                background: #e74c3c;
-                color: white;
-            }
-            
-            .status-contacted {
-                background: #f39c12;
-                color: white;
-            }
-            
-            .status-processed {
-                background: #27ae60;
-                color: white;
-            }
-            
-            .status-closed {
-                background: #95a5a6;
-                color: white;
-            }
-            
-            .action-cell {
-                display: flex;
-                gap: 5px;
-            }
-            
-            .action-cell button {
-                padding: 4px 8px;
-                border: none;
-                border-radius: 4px;
-                cursor: pointer;
-                font-size: 12px;
-                transition: all 0.2s ease;
-            }
-            
-            .btn-edit {
-                background: #3498db;
-                color: white;
-            }
-            
-            .btn-delete {
-                background: #e74c3c;
-                color: white;
-            }
-            
-            .btn-edit:hover,
-            .btn-delete:hover {
-                opacity: 0.8;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="login-container" id="loginForm">
-            <div class="login-header">
-                <h1>后台管理系统</h1>
-                <p>生命力教育咨询工作室</p>
-            </div>
-            <form id="loginFormElement">
-                <div class="form-group">
-                    <label for="username">用户名</label>
-                    <input type="text" id="username" name="username" required>
-                </div>
-                <div class="form-group">
-                    <label for="password">密码</label>
-                    <input type="password" id="password" name="password" required>
-                </div>
-                <button type="submit" class="login-btn">登录</button>
-            </form>
-            <div class="error-message" id="errorMessage"></div>
-        </div>
-
-        <div class="dashboard" id="dashboard">
-            <div class="dashboard-header">
-                <h1>咨询表单管理</h1>
-                <button class="logout-btn" onclick="logout()">退出登录</button>
-            </div>
-            
-            <div class="stats-grid">
-                <div class="stat-card">
-                    <h3 id="totalConsultations">0</h3>
-                    <p>总咨询数</p>
-                </div>
-                <div class="stat-card">
-                    <h3 id="todayConsultations">0</h3>
-                    <p>今日咨询</p>
-                </div>
-                <div class="stat-card">
-                    <h3 id="pendingConsultations">0</h3>
-                    <p>待处理</p>
-                </div>
-                <div class="stat-card">
-                    <h3 id="thisWeekConsultations">0</h3>
-                    <p>本周咨询</p>
-                </div>
-                <div class="stat-card">
-                    <h3 id="thisMonthConsultations">0</h3>
-                    <p>本月咨询</p>
-                </div>
-            </div>
-            
-            <div class="action-buttons">
-                <button class="action-btn export-btn" onclick="exportData()">导出数据</button>
-                <button class="action-btn refresh-btn" onclick="loadConsultations()">刷新数据</button>
-                <button class="action-btn filter-btn" onclick="toggleFilters()">筛选</button>
-            </div>
-            
-            <div class="filters-panel" id="filtersPanel" style="display: none;">
-                <div class="filter-group">
-                    <label>状态筛选:</label>
-                    <select id="statusFilter" onchange="filterConsultations()">
-                        <option value="">全部状态</option>
-                        <option value="新提交">新提交</option>
-                        <option value="已联系">已联系</option>
-                        <option value="已处理">已处理</option>
-                        <option value="已关闭">已关闭</option>
-                    </select>
-                </div>
-                <div class="filter-group">
-                    <label>类型筛选:</label>
-                    <select id="typeFilter" onchange="filterConsultations()">
-                        <option value="">全部类型</option>
-                        <option value="学生咨询">学生咨询</option>
-                        <option value="家长咨询">家长咨询</option>
-                        <option value="职业咨询">职业咨询</option>
-                        <option value="其他咨询">其他咨询</option>
-                    </select>
-                </div>
-                <div class="filter-group">
-                    <label>时间范围:</label>
-                    <input type="date" id="startDate" onchange="filterConsultations()">
-                    <input type="date" id="endDate" onchange="filterConsultations()">
-                </div>
-            </div>
-
-            <button class="refresh-btn" onclick="loadConsultations()">刷新数据</button>
-            
-            <div id="consultationsContainer">
-                <table class="consultations-table" id="consultationsTable" style="display: none;">
-                    <thead>
-                        <tr>
-                            <th>时间</th>
-                            <th>姓名</th>
-                            <th>联系方式</th>
-                            <th>邮箱</th>
-                            <th>咨询类型</th>
-                            <th>城市</th>
-                            <th>年龄段</th>
-                            <th>咨询内容</th>
-                            <th>来源设备型号</th>
-                            <th>来自IP</th>
-                            <th>来自地点</th>
-                            <th>来自浏览器</th>
-                            <th>填写时长</th>
-                            <th>状态</th>
-                            <th>操作</th>
-                        </tr>
-                    </thead>
-                    <tbody id="consultationsTableBody">
-                    </tbody>
-                </table>
-                <div class="no-data" id="noData">暂无咨询数据</div>
-            </div>
-        </div>
-
-        <script>
-            // 登录验证
-            document.getElementById('loginFormElement').addEventListener('submit', function(e) {
-                e.preventDefault();
-                
-                const username = document.getElementById('username').value;
-                const password = document.getElementById('password').value;
-                
-                if (username === 'kaiwen' && password === '11112222') {
-                    // 登录成功
-                    localStorage.setItem('adminLoggedIn', 'true');
-                    showDashboard();
-                    loadConsultations();
-                } else {
-                    // 登录失败
-                    showError('用户名或密码错误');
-                }
-            });
-
-            // 显示错误信息
-            function showError(message) {
-                const errorElement = document.getElementById('errorMessage');
-                errorElement.textContent = message;
-                errorElement.style.display = 'block';
-                
-                setTimeout(() => {
-                    errorElement.style.display = 'none';
-                }, 3000);
-            }
-
-            // 显示仪表板
-            function showDashboard() {
-                document.getElementById('loginForm').style.display = 'none';
-                document.getElementById('dashboard').style.display = 'block';
-            }
-
-            // 退出登录
-            function logout() {
-                localStorage.removeItem('adminLoggedIn');
-                document.getElementById('loginForm').style.display = 'block';
-                document.getElementById('dashboard').style.display = 'none';
-                document.getElementById('username').value = '';
-                document.getElementById('password').value = '';
-            }
-
-            // 加载咨询数据
-            async function loadConsultations() {
-                try {
-                    const response = await fetch('/api/consultations');
-                    const data = await response.json();
-                    
-                    updateStats(data);
-                    updateConsultationsTable(data.consultations);
-                } catch (error) {
-                    console.error('加载数据失败:', error);
-                    showError('加载数据失败，请检查网络连接');
-                }
-            }
-
-            // 更新统计信息
-            function updateStats(data) {
-                document.getElementById('totalConsultations').textContent = data.total || 0;
-                document.getElementById('todayConsultations').textContent = data.today || 0;
-                document.getElementById('pendingConsultations').textContent = data.pending || 0;
-                document.getElementById('thisWeekConsultations').textContent = data.this_week || 0;
-                document.getElementById('thisMonthConsultations').textContent = data.this_month || 0;
-            }
-
-            // 更新咨询表格
-            function updateConsultationsTable(consultations) {
-                const table = document.getElementById('consultationsTable');
-                const tableBody = document.getElementById('consultationsTableBody');
-                const noData = document.getElementById('noData');
-                
-                if (consultations && consultations.length > 0) {
-                    table.style.display = 'table';
-                    noData.style.display = 'none';
-                    
-                    tableBody.innerHTML = '';
-                    consultations.forEach(consultation => {
-                        const statusClass = getStatusClass(consultation.status);
-                        const row = document.createElement('tr');
-                        row.innerHTML = `
-                            <td>${new Date(consultation.timestamp).toLocaleString()}</td>
-                            <td>${consultation.name}</td>
-                            <td>${consultation.contact}</td>
-                            <td>${consultation.email}</td>
-                            <td>${consultation.consultation_type}</td>
-                            <td>${consultation.city || '-'}</td>
-                            <td>${consultation.age_group || '-'}</td>
-                            <td>${consultation.message}</td>
-                            <td>${consultation.device_model || '-'}</td>
-                            <td>${consultation.ip_address || '-'}</td>
-                            <td>${consultation.location || '-'}</td>
-                            <td>${consultation.browser || '-'}</td>
-                            <td>${consultation.fill_duration ? consultation.fill_duration + '秒' : '-'}</td>
-                            <td><span class="status-badge ${statusClass}">${consultation.status || '新提交'}</span></td>
-                            <td class="action-cell">
-                                <button class="btn-edit" onclick="editStatus(${consultation.id})">编辑</button>
-                                <button class="btn-delete" onclick="deleteConsultation(${consultation.id})">删除</button>
-                            </td>
-                        `;
-                        tableBody.appendChild(row);
-                    });
-                } else {
-                    table.style.display = 'none';
-                    noData.style.display = 'block';
-                }
-            }
-            
-            // 获取状态样式类
-            function getStatusClass(status) {
-                switch(status) {
-                    case '新提交': return 'status-new';
-                    case '已联系': return 'status-contacted';
-                    case '已处理': return 'status-processed';
-                    case '已关闭': return 'status-closed';
-                    default: return 'status-new';
-                }
-            }
-            
-            // 编辑状态
-            function editStatus(id) {
-                const newStatus = prompt('请输入新状态 (新提交/已联系/已处理/已关闭):');
-                if (newStatus) {
-                    fetch(`/api/consultations/${id}`, {
-                        method: 'PUT',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify({status: newStatus})
-                    })
-                    .then(response => response.json())
-                    .then(result => {
-                        if (result.success) {
-                            alert('状态更新成功！');
-                            loadConsultations();
-                        } else {
-                            alert('更新失败: ' + result.message);
-                        }
-                    })
-                    .catch(error => {
-                        console.error('Error:', error);
-                        alert('更新失败，请检查网络连接');
-                    });
-                }
-            }
-            
-            // 删除咨询
-            function deleteConsultation(id) {
-                if (confirm('确定要删除这条咨询记录吗？')) {
-                    fetch(`/api/consultations/${id}`, {
-                        method: 'DELETE'
-                    })
-                    .then(response => response.json())
-                    .then(result => {
-                        if (result.success) {
-                            alert('删除成功！');
-                            loadConsultations();
-                        } else {
-                            alert('删除失败: ' + result.message);
-                        }
-                    })
-                    .catch(error => {
-                        console.error('Error:', error);
-                        alert('删除失败，请检查网络连接');
-                    });
-                }
-            }
-            
-            // 导出数据
-            function exportData() {
-                window.open('/api/export', '_blank');
-            }
-            
-            // 切换筛选面板
-            function toggleFilters() {
-                const panel = document.getElementById('filtersPanel');
-                panel.style.display = panel.style.display === 'none' ? 'block' : 'none';
-            }
-            
-            // 筛选咨询
-            function filterConsultations() {
-                const statusFilter = document.getElementById('statusFilter').value;
-                const typeFilter = document.getElementById('typeFilter').value;
-                const startDate = document.getElementById('startDate').value;
-                const endDate = document.getElementById('endDate').value;
-                
-                // 这里可以实现更复杂的筛选逻辑
-                loadConsultations(); // 暂时重新加载所有数据
-            }
-
-            // 检查登录状态
-            function checkLoginStatus() {
-                if (localStorage.getItem('adminLoggedIn') === 'true') {
-                    showDashboard();
-                    loadConsultations();
-                }
-            }
-
-            // 页面加载时检查登录状态
-            checkLoginStatus();
-        </script>
-    </body>
-    </html>
-    ''')
+    """后台管理页面（只有页面外壳，数据由页面脚本分页加载）"""
+    return pages.render_page('admin.html')
 
 @app.route('/')
 def index():
-    return send_from_directory('.', 'index.html')
+    return send_static('index.html')
 
 if __name__ == '__main__':
     # 初始化数据库
@@ -0,0 +1,312 @@
+"""
+SMTP 连接池
+保持已登录的 SMTP 会话，多封邮件复用同一连接，空闲超时或断开后自动重连；
+AsyncSMTPClient 是供 asyncio 服务（asgi_server.py）使用的异步版本，需要 aiosmtplib
+"""
+
+import asyncio
+import smtplib
+import threading
+import time
+
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+# 导入配置
+try:
+    from config import SMTP_POOL_SIZE, SMTP_IDLE_TIMEOUT, SMTP_MAX_MESSAGES_PER_SESSION
+except ImportError:
+    SMTP_POOL_SIZE = 2                  # 最多同时保持的会话数
+    SMTP_IDLE_TIMEOUT = 60              # 会话空闲超过该秒数后关闭重建（163 约 60~120 秒断开）
+    SMTP_MAX_MESSAGES_PER_SESSION = 50  # 单个会话最多发送的邮件数，达到后重建
+
+# 会话空闲超过该秒数，复用前先发 NOOP 确认连接仍然可用
+NOOP_CHECK_AFTER = 10
+
+# 服务器拒绝了这一封邮件（收件人、发件人、内容），会话仍然可用；
+# smtplib 的异常都继承自 OSError，必须先于 RECONNECT_ERRORS 捕获
+REJECTED_ERRORS = (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+# 这些异常说明连接已失效，换新连接重试一次
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class _Session:
+    """一个已登录的 SMTP 连接"""
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+
+
+class SMTPPool:
+    """线程安全的 SMTP 会话池
+
+    observer(秒数, 是否成功) 在每封邮件发送后调用，用于统计发送耗时与失败次数
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 size=None, idle_timeout=None, max_messages=None, timeout=30, observer=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size or SMTP_POOL_SIZE
+        self.idle_timeout = SMTP_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.max_messages = max_messages or SMTP_MAX_MESSAGES_PER_SESSION
+        self.timeout = timeout
+        self.observer = observer
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self.connects_total = 0
+
+    def _connect(self):
+        """建立连接：EHLO、STARTTLS、登录"""
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            smtp.ehlo()
+            if self.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.connects_total += 1
+        return _Session(smtp)
+
+    def _is_expired(self, session):
+        """空闲超时或发送数达到上限的会话不再复用"""
+        idle = time.monotonic() - session.last_used
+        return idle > self.idle_timeout or session.sent >= self.max_messages
+
+    def _is_alive(self, session):
+        """空闲较久的会话发 NOOP 确认连接仍然可用（网络往返，不能持有锁调用）"""
+        if time.monotonic() - session.last_used <= NOOP_CHECK_AFTER:
+            return True
+        try:
+            return session.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self):
+        while True:
+            with self._cond:
+                while not self._idle and self._open >= self.size:
+                    self._cond.wait()
+                if not self._idle:
+                    self._open += 1
+                    break
+                session = self._idle.pop()
+            # 取出的会话只属于当前线程，释放锁后再检查（NOOP 是网络往返），其他线程不用等待
+            if not self._is_expired(session) and self._is_alive(session):
+                return session
+            self._release(session, broken=True)
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, session, broken=False):
+        with self._cond:
+            if broken:
+                self._open -= 1
+            else:
+                session.last_used = time.monotonic()
+                self._idle.append(session)
+            self._cond.notify()
+        if broken:
+            # QUIT 同样是网络往返，在锁外关闭
+            session.close()
+
+    def send_many(self, from_addr, to_addrs, messages):
+        """用一个会话发送多封邮件，返回每封邮件是否成功"""
+        results = []
+        pending = list(messages)
+        retried = False
+        while pending:
+            session = self._acquire()
+            try:
+                while pending:
+                    started = time.perf_counter()
+                    session.smtp.sendmail(from_addr, to_addrs, pending[0].as_string())
+                    self._observe(started, True)
+                    session.sent += 1
+                    pending.pop(0)
+                    results.append(True)
+            except REJECTED_ERRORS as e:
+                # 单封邮件被拒绝，会话仍然可用
+                self._observe(started, False)
+                print(f"邮件发送失败: {e}")
+                pending.pop(0)
+                results.append(False)
+                self._release(session)
+                continue
+            except RECONNECT_ERRORS as e:
+                self._observe(started, False)
+                self._release(session, broken=True)
+                # 连接在发送途中失效：换新连接重试一次
+                if retried:
+                    print(f"SMTP连接失效，发送失败: {e}")
+                    results.extend(False for _ in pending)
+                    break
+                retried = True
+                continue
+            except smtplib.SMTPException as e:
+                # 其他 SMTP 错误（如服务器不支持的扩展）只算这一封失败
+                self._observe(started, False)
+                print(f"邮件发送失败: {e}")
+                pending.pop(0)
+                results.append(False)
+                self._release(session)
+                continue
+            self._release(session)
+        return results
+
+    def _observe(self, started, ok):
+        if self.observer:
+            self.observer(time.perf_counter() - started, ok)
+
+    def send(self, from_addr, to_addrs, message):
+        """发送一封邮件"""
+        return self.send_many(from_addr, to_addrs, [message])[0]
+
+    def close(self):
+        """关闭所有空闲会话"""
+        with self._cond:
+            while self._idle:
+                self._open -= 1
+                self._idle.pop().close()
+
+
+class AsyncSMTPClient:
+    """asyncio 版本：在事件循环中保持一个已登录的会话，发送时不占用线程
+
+    事件循环本身是单线程的，一个会话按顺序发送即可，不需要连接池
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 idle_timeout=None, max_messages=None, timeout=30, observer=None):
+        if aiosmtplib is None:
+            raise RuntimeError('需要安装 aiosmtplib: pip install aiosmtplib')
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.idle_timeout = SMTP_IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.max_messages = max_messages or SMTP_MAX_MESSAGES_PER_SESSION
+        self.timeout = timeout
+        self.observer = observer
+        self._session = None
+        self._lock = asyncio.Lock()
+        self.connects_total = 0
+
+    async def _connect(self):
+        """建立连接：EHLO、STARTTLS、登录"""
+        smtp = aiosmtplib.SMTP(hostname=self.host, port=self.port, timeout=self.timeout,
+                               start_tls=self.starttls)
+        await smtp.connect()
+        try:
+            if self.username:
+                await smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.connects_total += 1
+        return _Session(smtp)
+
+    async def _is_alive(self, session):
+        idle = time.monotonic() - session.last_used
+        if idle > self.idle_timeout or session.sent >= self.max_messages:
+            return False
+        if idle > NOOP_CHECK_AFTER:
+            try:
+                return (await session.smtp.noop()).code == 250
+            except Exception:
+                return False
+        return session.smtp.is_connected
+
+    async def _acquire(self):
+        session = self._session
+        if session is not None and await self._is_alive(session):
+            return session
+        self._session = None
+        if session is not None:
+            await self._discard(session)
+        self._session = await self._connect()
+        return self._session
+
+    async def _discard(self, session):
+        if self._session is session:
+            self._session = None
+        try:
+            await session.smtp.quit()
+        except Exception:
+            session.smtp.close()
+
+    async def send_many(self, from_addr, to_addrs, messages):
+        """用一个会话发送多封邮件，返回每封邮件是否成功"""
+        async with self._lock:
+            results = []
+            pending = list(messages)
+            retried = False
+            while pending:
+                session = await self._acquire()
+                try:
+                    while pending:
+                        started = time.perf_counter()
+                        await session.smtp.sendmail(from_addr, to_addrs, pending[0].as_string())
+                        self._observe(started, True)
+                        session.sent += 1
+                        session.last_used = time.monotonic()
+                        pending.pop(0)
+                        results.append(True)
+                except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError,
+                        aiosmtplib.SMTPTimeoutError, ConnectionError, OSError) as e:
+                    self._observe(started, False)
+                    await self._discard(session)
+                    # 连接在发送途中失效：换新连接重试一次
+                    if retried:
+                        print(f"SMTP连接失效，发送失败: {e}")
+                        results.extend(False for _ in pending)
+                        break
+                    retried = True
+                except aiosmtplib.SMTPException as e:
+                    # 单封邮件被拒绝，会话仍然可用
+                    self._observe(started, False)
+                    print(f"邮件发送失败: {e}")
+                    pending.pop(0)
+                    results.append(False)
+            return results
+
+    def _observe(self, started, ok):
+        if self.observer:
+            self.observer(time.perf_counter() - started, ok)
+
+    async def send(self, from_addr, to_addrs, message):
+        """发送一封邮件"""
+        return (await self.send_many(from_addr, to_addrs, [message]))[0]
+
+    async def close(self):
+        async with self._lock:
+            if self._session is not None:
+                await self._discard(self._session)
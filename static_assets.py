@@ -0,0 +1,160 @@
+"""
+静态资源发送
+支持 Range 分段请求（视频拖动/边下边播）、强 ETag 与 Last-Modified 条件请求（304），
+按文件类型设置缓存时间；文件体通过 wsgi.file_wrapper 发送，gunicorn 等服务器会用 sendfile 零拷贝。
+运行过 build_assets.py 后优先发送 dist/ 中的构建结果，并按 Accept-Encoding 选择预压缩的 .br/.gz 文件；
+运行过 build_images.py 后，图片按 Accept 头选择 AVIF/WebP，按 ?w= 选择宽度
+"""
+
+import json
+import mimetypes
+import os
+import re
+
+from flask import abort, request, send_from_directory
+from werkzeug.utils import safe_join
+
+# 导入配置
+try:
+    from config import STATIC_MEDIA_MAX_AGE, STATIC_USE_X_SENDFILE
+except ImportError:
+    STATIC_MEDIA_MAX_AGE = 7 * 24 * 3600  # 图片、视频的缓存秒数，过期后按 ETag 重新验证
+    STATIC_USE_X_SENDFILE = False         # 前面有支持 X-Sendfile 的反向代理时开启，由代理直接发送文件
+
+try:
+    from config import SNAPSHOT_DIR
+except ImportError:
+    SNAPSHOT_DIR = 'snapshots'  # 与 analytics.py 的默认值一致
+
+# 带内容哈希的文件名（例如 styles.3f2a9c1b.css）内容不会变化，可以永久缓存
+FINGERPRINTED_MAX_AGE = 365 * 24 * 3600
+FINGERPRINT_PATTERN = re.compile(r'\.[0-9a-f]{8,}\.[A-Za-z0-9]+$')
+
+# 页面、脚本、样式每次按 ETag 重新验证
+REVALIDATE_EXTENSIONS = {'.html', '.css', '.js', '.json', '.webmanifest'}
+
+MEDIA_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp', '.avif',
+    '.mp4', '.mov', '.webm',
+    '.woff', '.woff2', '.ttf',
+}
+
+# 只发送这些类型，数据库、源码、配置等文件不会被下载
+STATIC_EXTENSIONS = REVALIDATE_EXTENSIONS | MEDIA_EXTENSIONS
+
+# 依次查找的目录：构建输出优先，其次是项目根目录
+STATIC_ROOTS = ('dist', '.')
+
+# 不对外发送的目录（分析快照中的清单是 .json，在允许的扩展名之内）
+PRIVATE_DIRS = {os.path.normpath(SNAPSHOT_DIR)}
+
+# 可能存在预压缩文件的类型，按优先顺序尝试的编码
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.json', '.svg'}
+PRECOMPRESSED_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# build_images.py 生成的图片清单，文件变化后自动重新加载
+IMAGE_MANIFEST = os.path.join('dist', 'images', 'manifest.json')
+MODERN_IMAGE_FORMATS = (('avif', 'image/avif'), ('webp', 'image/webp'))
+_image_manifest = {'mtime': None, 'entries': {}}
+
+
+def cache_max_age(filename):
+    """按文件名决定缓存时间"""
+    if FINGERPRINT_PATTERN.search(filename):
+        return FINGERPRINTED_MAX_AGE
+    if os.path.splitext(filename)[1].lower() in MEDIA_EXTENSIONS:
+        return STATIC_MEDIA_MAX_AGE
+    return 0
+
+
+def find_static(filename):
+    """返回包含该文件的目录，找不到或在不对外发送的目录中时返回 None"""
+    if os.path.normpath(filename).split(os.sep)[0] in PRIVATE_DIRS:
+        return None
+    for root in STATIC_ROOTS:
+        path = safe_join(root, filename)
+        if path and os.path.isfile(path):
+            return root
+    return None
+
+
+def precompressed_variant(root, filename):
+    """客户端接受且已预先生成的压缩文件，返回 (文件名, 编码)"""
+    for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+        if request.accept_encodings[encoding] and os.path.isfile(safe_join(root, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
+
+
+def load_image_manifest():
+    try:
+        mtime = os.path.getmtime(IMAGE_MANIFEST)
+    except OSError:
+        return {}
+    if mtime != _image_manifest['mtime']:
+        with open(IMAGE_MANIFEST, encoding='utf-8') as f:
+            _image_manifest['entries'] = json.load(f)
+        _image_manifest['mtime'] = mtime
+    return _image_manifest['entries']
+
+
+def accepts_explicitly(mimetype):
+    """只认 Accept 中明确列出的类型，image/* 或 */* 不算（旧浏览器会这样发但不支持 WebP）"""
+    return any(value == mimetype and quality > 0 for value, quality in request.accept_mimetypes)
+
+
+def image_variant(filename):
+    """按请求宽度和 Accept 头选择图片版本，返回 dist/ 下的相对路径；没有构建版本时返回 None"""
+    entry = load_image_manifest().get(filename)
+    if not entry:
+        return None
+
+    widths = sorted(int(width) for width in entry['variants'])
+    requested = request.args.get('w', type=int)
+    width = next((w for w in widths if w >= requested), widths[-1]) if requested else widths[-1]
+    options = entry['variants'][str(width)]
+
+    for image_format, mimetype in MODERN_IMAGE_FORMATS:
+        if image_format in options and accepts_explicitly(mimetype):
+            return options[image_format]['file']
+    # 只构建了 AVIF/WebP 版本时，不支持的浏览器使用原图
+    fallback = next((name for name in options if name not in dict(MODERN_IMAGE_FORMATS)), None)
+    return options[fallback]['file'] if fallback else None
+
+
+def send_static(filename):
+    """发送静态文件（自动处理 Range、If-None-Match、If-Modified-Since）"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in STATIC_EXTENSIONS:
+        abort(404)
+    variant = image_variant(filename) if extension in MEDIA_EXTENSIONS else None
+    if variant:
+        response = send_from_directory('dist', variant, mimetype=mimetypes.guess_type(variant)[0],
+                                       max_age=STATIC_MEDIA_MAX_AGE, conditional=True)
+        response.vary.add('Accept')
+        response.cache_control.public = True
+        return response
+
+    root = find_static(filename)
+    if root is None:
+        abort(404)
+
+    served, encoding = filename, None
+    if extension in COMPRESSIBLE_EXTENSIONS:
+        served, encoding = precompressed_variant(root, filename)
+
+    mimetype = mimetypes.guess_type(filename)[0]
+    max_age = cache_max_age(filename)
+    response = send_from_directory(root, served, mimetype=mimetype, max_age=max_age, conditional=True)
+
+    if extension in COMPRESSIBLE_EXTENSIONS:
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.content_encoding = encoding
+
+    response.cache_control.public = True
+    if max_age == FINGERPRINTED_MAX_AGE:
+        response.cache_control.immutable = True
+    elif max_age == 0:
+        response.cache_control.no_cache = True
+    return response
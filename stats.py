@@ -0,0 +1,98 @@
+"""
+后台统计数据
+从按时间段汇总的数量表一次算出总数/今日/待处理/本周/本月/类型分布，结果短时间缓存
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+# 导入配置
+try:
+    from config import STATS_CACHE_TTL
+except ImportError:
+    STATS_CACHE_TTL = 10  # 统计结果缓存秒数
+
+beijing_tz = pytz.timezone('Asia/Shanghai')
+
+
+def period_starts(now=None):
+    """今日、本周（周一起）、本月的起始时间，北京时间字符串"""
+    now = now or datetime.now(beijing_tz)
+    today = now.date()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    return today.strftime('%Y-%m-%d'), week_start.strftime('%Y-%m-%d'), month_start.strftime('%Y-%m-%d')
+
+
+def compute_stats(cursor, now=None):
+    """单次查询计算全部统计数据
+
+    读 consultation_rollups 汇总表（见 rollups.py）：总数与待处理来自各月汇总，今日/本周/本月来自对应时间段，
+    只读几百行，与咨询总数无关
+    """
+    today, week_start, month_start = period_starts(now)
+    cursor.execute('''
+        SELECT consultation_type,
+               SUM(CASE WHEN granularity = 'month' THEN count END),
+               SUM(CASE WHEN granularity = 'day' THEN count END),
+               SUM(CASE WHEN granularity = 'month' AND status = '新提交' THEN count END),
+               SUM(CASE WHEN granularity = 'week' THEN count END),
+               SUM(CASE WHEN granularity = 'month' AND bucket = ? THEN count END)
+        FROM consultation_rollups
+        WHERE granularity = 'month' OR (granularity = 'day' AND bucket = ?) OR (granularity = 'week' AND bucket = ?)
+        GROUP BY consultation_type
+        HAVING SUM(CASE WHEN granularity = 'month' THEN count END) > 0
+    ''', (month_start[:7], today, week_start))
+
+    result = {'total': 0, 'today': 0, 'pending': 0, 'this_week': 0, 'this_month': 0, 'type_stats': {}}
+    for consultation_type, total, today_count, pending, this_week, this_month in cursor.fetchall():
+        result['total'] += total
+        result['today'] += today_count or 0
+        result['pending'] += pending or 0
+        result['this_week'] += this_week or 0
+        result['this_month'] += this_month or 0
+        result['type_stats'][consultation_type] = total
+    return result
+
+
+class StatsCache:
+    """统计结果缓存：过期、跨天或数据变更后重新计算；compute 为计算函数，参数是游标"""
+
+    def __init__(self, ttl=None, compute=compute_stats):
+        self.ttl = STATS_CACHE_TTL if ttl is None else ttl
+        self.compute = compute
+        self._lock = threading.Lock()
+        self._stats = None
+        self._etag = None
+        self._expires = 0
+        self._day = None
+        self._generation = 0
+
+    def get(self, cursor):
+        """返回 (统计数据, ETag)"""
+        day = datetime.now(beijing_tz).strftime('%Y-%m-%d')
+        with self._lock:
+            if self._stats is not None and time.monotonic() < self._expires and day == self._day:
+                return self._stats, self._etag
+            generation = self._generation
+
+        stats = self.compute(cursor)
+        etag = hashlib.md5(json.dumps(stats, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        with self._lock:
+            # 计算期间数据又有变更时不写入缓存
+            if generation == self._generation:
+                self._stats, self._etag = stats, etag
+                self._expires = time.monotonic() + self.ttl
+                self._day = day
+        return stats, etag
+
+    def invalidate(self):
+        """数据变更后调用"""
+        with self._lock:
+            self._stats = None
+            self._generation += 1
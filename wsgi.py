@@ -0,0 +1,9 @@
+"""
+WSGI 入口（生产环境）
+gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from server import app, init_db
+
+# 导入时执行迁移；已是最新版本时只检查版本号
+init_db()